@@ -0,0 +1,202 @@
+"""字幕广播的扇出延迟：10 / 100 / 1000 个本地客户端
+
+本进程运行 SubtitleBroadcastServer，按 --rate 次/秒发布一条逐渐变长、每隔几次结束的句子（模拟局部结果）。
+客户端在另一个进程中（单个 asyncio 循环，最小化的 WebSocket / SSE 客户端），按协议还原每条轨道的文本，
+记录每条消息从服务器编码（消息中的 ts）到客户端收到的延迟。另有 --slow 个只连接不读取的 SSE 客户端，
+用来确认慢客户端只会被重新同步或断开，不影响其他客户端（流量较小时内核缓冲区就能装下，
+加大 --rate，例如 1000，才能看到 resyncs / dropped）。
+
+结束时每个客户端还原出的文本应与最后发布的整句一致（consistent）。
+
+用法: python -m benchmark.bench_broadcast [--clients 10 100 1000] [--seconds 10] [--rate 20] [--slow 5]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+END_LANE = 'bench/end'
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+class LaneState:
+    def __init__(self):
+        self.lanes = {}
+
+    def apply(self, message: dict):
+        if message['t'] == 'c':
+            self.lanes = {}
+            return
+        for key, sentence_id, keep, suffix, final in message['d']:
+            previous = self.lanes.get(key, (None, ''))
+            text = previous[1] if previous[0] == sentence_id else ''
+            self.lanes[key] = (sentence_id, text[:keep] + suffix)
+
+
+async def ws_client(port: int, latencies: list, results: list):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=1 << 20)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(f'GET /ws HTTP/1.1\r\nHost: 127.0.0.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                 f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n'.encode())
+    await reader.readuntil(b'\r\n\r\n')
+    state = LaneState()
+    while END_LANE not in state.lanes:
+        head = await reader.readexactly(2)
+        length = head[1] & 0x7f
+        if length == 126:
+            length = int.from_bytes(await reader.readexactly(2), 'big')
+        elif length == 127:
+            length = int.from_bytes(await reader.readexactly(8), 'big')
+        message = json.loads(await reader.readexactly(length))
+        if 'ts' in message:
+            latencies.append(time.time() * 1000 - message['ts'])
+        state.apply(message)
+    results.append(state.lanes)
+    writer.close()
+
+
+async def sse_client(port: int, latencies: list, results: list):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=1 << 20)
+    writer.write(b'GET /events HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n')
+    await reader.readuntil(b'\r\n\r\n')
+    state = LaneState()
+    while END_LANE not in state.lanes:
+        line = await reader.readuntil(b'\n\n')
+        message = json.loads(line[len(b'data: '):-2])
+        if 'ts' in message:
+            latencies.append(time.time() * 1000 - message['ts'])
+        state.apply(message)
+    results.append(state.lanes)
+    writer.close()
+
+
+async def slow_client(port: int, stop: asyncio.Event):
+    # 接收缓冲区设得很小，服务器一侧的发送缓冲区才会很快写满
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, ('127.0.0.1', port))
+    reader, writer = await asyncio.open_connection(sock=sock)
+    writer.write(b'GET /events HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n')
+    # 只连接不读取，服务器的发送缓冲区很快写满
+    await stop.wait()
+    writer.close()
+
+
+async def run_clients(port: int, clients: int, slow: int, sse_every: int):
+    latencies, results = [], []
+    stop = asyncio.Event()
+    slow_tasks = [asyncio.ensure_future(slow_client(port, stop)) for _ in range(slow)]
+    tasks = [asyncio.ensure_future((sse_client if sse_every and i % sse_every == 0 else ws_client)(
+        port, latencies, results)) for i in range(clients)]
+    done = await asyncio.gather(*tasks, return_exceptions=True)
+    stop.set()
+    await asyncio.gather(*slow_tasks, return_exceptions=True)
+    errors = [str(item) for item in done if isinstance(item, BaseException)]
+    return latencies, results, errors
+
+
+def client_main(args):
+    raise_fd_limit()
+    latencies, results, errors = asyncio.run(run_clients(args.port, args.client_count, args.slow, args.sse_every))
+    print(json.dumps({'latencies': latencies, 'results': results, 'errors': errors[:5]}))
+
+
+def bench(clients: int, args) -> dict:
+    from model.event import TranslationEvent
+    from service.subtitle_broadcast import SubtitleBroadcastServer
+
+    server = SubtitleBroadcastServer(port=0, client_queue=args.client_queue, stall_timeout=2.0)
+    server.start()
+    process = subprocess.Popen([sys.executable, '-m', 'benchmark.bench_broadcast', '--client-mode',
+                                '--port', str(server.port), '--client-count', str(clients),
+                                '--slow', str(args.slow), '--sse-every', str(args.sse_every)],
+                               env={**os.environ, 'PYTHONPATH': os.getcwd()}, stdout=subprocess.PIPE)
+    deadline = time.monotonic() + 30
+    while server.stats()['clients'] < clients + args.slow and time.monotonic() < deadline:
+        time.sleep(0.05)
+    connected = server.stats()['clients']
+
+    def publish(lane: str, sentence_id: int, text: str, final: bool):
+        event = TranslationEvent()
+        event.source, event.target_language = lane.split('/')
+        event.sentence_id = sentence_id
+        event.sentence = text
+        event.is_sentence_ended = final
+        server.on_events([event])
+
+    cpu = time.process_time()
+    started = time.perf_counter()
+    sentence_id, words, last_text = 1, [], ''
+    for i in range(int(args.seconds * args.rate)):
+        words.append(f'word{i}')
+        final = len(words) >= 8
+        last_text = ' '.join(words)
+        publish('loopback/zh', sentence_id, last_text, final)
+        if final:
+            sentence_id, words = sentence_id + 1, []
+        delay = started + (i + 1) / args.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    publish(END_LANE, 1, 'end', True)
+    output, _ = process.communicate(timeout=60)
+    cpu = time.process_time() - cpu
+    stats = server.stats()
+    server.stop()
+    summary = json.loads(output)
+    latencies = summary['latencies']
+    expected = [sentence_id, last_text] if words else None
+    consistent = sum(1 for lanes in summary['results']
+                     if expected is None or lanes.get('loopback/zh') == expected)
+    return {'connected': connected, 'latencies': latencies, 'consistent': consistent,
+            'finished': len(summary['results']), 'errors': summary['errors'], 'cpu': cpu, **stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rate', type=float, default=20, help='updates published per second')
+    parser.add_argument('--slow', type=int, default=5, help='clients that never read')
+    parser.add_argument('--sse-every', type=int, default=10, help='every n-th client uses SSE, 0 for none')
+    parser.add_argument('--client-queue', type=int, default=64)
+    parser.add_argument('--client-mode', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument('--client-count', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.client_mode:
+        client_main(args)
+        return
+    from loguru import logger
+
+    logger.remove()
+    raise_fd_limit()
+    sys.path.insert(0, os.getcwd())
+    print(f'{args.rate:g} updates/s for {args.seconds:g}s, {args.slow} slow clients')
+    print(f'{"clients":>7} {"p50 ms":>7} {"p95 ms":>7} {"p99 ms":>7} {"max ms":>7} {"server cpu":>10} '
+          f'{"resyncs":>7} {"dropped":>7} {"consistent":>10}')
+    for clients in args.clients:
+        result = bench(clients, args)
+        latencies = result['latencies'] or [float('nan')]
+        print(f'{clients:>7} {np.percentile(latencies, 50):>7.1f} {np.percentile(latencies, 95):>7.1f} '
+              f'{np.percentile(latencies, 99):>7.1f} {np.max(latencies):>7.1f} '
+              f'{result["cpu"] / args.seconds:>10.1%} {result["resyncs"]:>7} {result["dropped_clients"]:>7} '
+              f'{result["consistent"]:>5}/{clients:<4}')
+        if result['connected'] < clients + args.slow or result['errors']:
+            print(f'    connected {result["connected"]}, errors: {result["errors"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""发送块大小扫描：延迟与 CPU 的权衡
+
+用 SyntheticSource 实时产生 3s 语音 + 1s 静音的音频，经 QwenTranslator 发送到本地替身服务器
+（单独的子进程，不计入本进程 CPU），对每种发送块时长统计：
+    cpu ms/s     本进程每秒音频消耗的 CPU 时间（重采样、静音检测、编码和发送）
+    sends/s      每秒音频的发送次数
+    latency ms   语音结束到收到整句结果的平均时间（包含替身服务器 400ms 的断句等待）
+
+用法: python -m benchmark.bench_chunk_size [--seconds 12] [--frame-ms 20] [--latency 0.1]
+"""
+import argparse
+import socket
+import subprocess
+import sys
+import time
+
+from loguru import logger
+
+from service.audio_source import SyntheticSource
+from service.audio_translate_service import AudioTranslateService, SourcePipeline
+from translator.qwen_translator import QwenTranslator
+
+SPEECH_SEC = 3.0
+SILENCE_SEC = 1.0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run(url: str, send_ms, frame_ms: float, seconds: float) -> dict:
+    done_times = {}
+
+    def on_event(event):
+        if event.is_sentence_ended:
+            done_times.setdefault(event.sentence_id, time.perf_counter())
+
+    translator = QwenTranslator(api_key='benchmark', ws_url=url)
+    translator.register_callback(on_event)
+    translator.start()
+    service = AudioTranslateService()
+    service.continuous_silence_cnt_threshold = max(1, round(service.silence_timeout * 1000 / frame_ms))
+    pipeline = SourcePipeline('bench')
+    pipeline.add_translator('zh', translator, send_ms)
+    chunker = pipeline.chunkers['zh']
+    source = SyntheticSource(frame_ms=frame_ms, speech_sec=SPEECH_SEC, silence_sec=SILENCE_SEC, duration=seconds)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    source.start(lambda data, capture_time: service.process(pipeline, data, source.channels, source.rate,
+                                                            capture_time))
+    source.finished.wait(seconds * 2)
+    time.sleep(1.0)
+    cpu = time.process_time() - cpu_start
+    translator.close()
+
+    period = SPEECH_SEC + SILENCE_SEC
+    latencies = []
+    for sentence_id, done in done_times.items():
+        speech_end = (sentence_id - 1) * period + SPEECH_SEC
+        if speech_end <= seconds:
+            latencies.append(done - wall_start - speech_end)
+    return {
+        'send_ms': chunker.send_ms,
+        'cpu_ms_per_s': cpu / seconds * 1000,
+        'sends_per_s': chunker.send_count / seconds,
+        'latency_ms': sum(latencies) / len(latencies) * 1000 if latencies else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=12)
+    parser.add_argument('--frame-ms', type=float, default=20, help='capture callback duration')
+    parser.add_argument('--latency', type=float, default=0.1, help='stand-in server response latency')
+    parser.add_argument('--sizes', nargs='+', default=['20', '40', '100', '200', '400', 'auto'])
+    args = parser.parse_args()
+    logger.remove()
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-m', 'benchmark.mock_qwen_server', '--port', str(port),
+                               '--latency', str(args.latency)])
+    try:
+        time.sleep(1.0)
+        print(f'{"send ms":>8} {"cpu ms/s":>9} {"sends/s":>8} {"latency ms":>11}')
+        for size in args.sizes:
+            send_ms = None if size == 'auto' else float(size)
+            result = run(f'ws://127.0.0.1:{port}', send_ms, args.frame_ms, args.seconds)
+            label = f'auto={result["send_ms"]:.0f}' if send_ms is None else size
+            print(f'{label:>8} {result["cpu_ms_per_s"]:>9.3f} {result["sends_per_s"]:>8.1f} '
+                  f'{result["latency_ms"]:>11.1f}')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
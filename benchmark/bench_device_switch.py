@@ -0,0 +1,120 @@
+"""默认设备切换：迁移耗时与翻译会话连续性
+
+用模拟声卡的 SwitchableSource 代替 WASAPI 环回采集，运行过程中按计划切换“系统默认设备”
+（采样率和声道数都会变化，打开设备有 open_ms 的延迟），AudioTranslateService 自带的 DeviceMonitor
+检测到后在新设备上重新打开采集。翻译器连接本地替身服务器（单独的子进程），统计：
+    detect ms    切换发生到被检测到的时间（取决于轮询间隔）
+    switch ms    检测到后直到新设备送来第一块音频的时间
+并检查切换前后翻译会话是同一个对象、sentence_id 连续递增。
+
+用法: python -m benchmark.bench_device_switch [--seconds 16] [--switch-every 5]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from loguru import logger
+
+# 模拟的设备：(名称, 采样率, 声道数)
+DEVICES = [('speakers', 48000, 2), ('hdmi-5.1', 44100, 6), ('headset', 16000, 1)]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_source(frame_ms: float, open_ms: float):
+    from service.audio_source import SyntheticSource
+
+    class SwitchableSource(SyntheticSource):
+        """系统默认设备可切换的合成音频源，重新打开时采用当前默认设备的采样率和声道数"""
+
+        def __init__(self):
+            super().__init__('loopback', frame_ms=frame_ms)
+            self.system_default = DEVICES[0][0]
+            self.switched_at = None
+
+        def switch(self, name: str):
+            self.system_default = name
+            self.switched_at = time.perf_counter()
+
+        def default_device_key(self):
+            return self.system_default
+
+        def start(self, callback):
+            time.sleep(open_ms / 1000)
+            _, rate, channels = next(device for device in DEVICES if device[0] == self.system_default)
+            # 换算采样位置，保持合成信号的时间轴连续
+            self.position = int(self.position * rate / self.rate)
+            self.rate = rate
+            self.channels = channels
+            self.device_key = self.system_default
+            super().start(callback)
+
+    return SwitchableSource()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=16)
+    parser.add_argument('--switch-every', type=float, default=5)
+    parser.add_argument('--frame-ms', type=float, default=20)
+    parser.add_argument('--open-ms', type=float, default=50, help='simulated device open latency')
+    args = parser.parse_args()
+    logger.remove()
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-m', 'benchmark.mock_qwen_server', '--port', str(port)],
+                              env={**os.environ, 'PYTHONPATH': os.getcwd()})
+    # Config 从当前目录读取 .config.yaml，切到临时目录使用基准专用配置
+    sys.path.insert(0, os.getcwd())
+    workdir = tempfile.mkdtemp(prefix='bench_device_switch_')
+    with open(os.path.join(workdir, '.config.yaml'), 'w', encoding='utf-8') as f:
+        f.write(f'translator:\n  model: qwen\n  api_key: benchmark\n  target_language: zh\n'
+                f'  ws_url: ws://127.0.0.1:{port}\naudio:\n  frame_ms: {args.frame_ms}\n')
+    os.chdir(workdir)
+    from service.audio_translate_service import AudioTranslateService
+
+    try:
+        time.sleep(1.0)
+        events = []
+        service = AudioTranslateService()
+        service.register_callback(events.append)
+        source = make_source(args.frame_ms, args.open_ms)
+        service.start([source])
+        translators = list(service.pipelines['loopback'].translators.values())
+        detect_delays = []
+        started = time.perf_counter()
+        for i in range(1, int(args.seconds // args.switch_every) + 1):
+            time.sleep(max(0.0, started + i * args.switch_every - time.perf_counter()))
+            switches = len(service.device_monitor.switches)
+            source.switch(DEVICES[i % len(DEVICES)][0])
+            while len(service.device_monitor.switches) == switches:
+                time.sleep(0.01)
+            detect_delays.append(service.device_monitor.switches[-1].detected - source.switched_at)
+        time.sleep(max(0.0, started + args.seconds - time.perf_counter()))
+        switches = service.device_monitor.switches
+        same_session = translators == list(service.pipelines['loopback'].translators.values())
+        service.stop()
+
+        finals = [event.sentence_id for event in events if event.is_sentence_ended]
+        print(f'{"switch":>6} {"device":>10} {"detect ms":>10} {"switch ms":>10}')
+        for i, (switch, delay) in enumerate(zip(switches, detect_delays), 1):
+            switch_time = switch.switch_time()
+            print(f'{i:>6} {DEVICES[i % len(DEVICES)][0]:>10} {delay * 1000:>10.0f} '
+                  f'{switch_time * 1000 if switch_time is not None else float("nan"):>10.0f}')
+        print(f'same translator session: {same_session}')
+        print(f'final sentence ids: {finals} (monotonic: {finals == sorted(set(finals))})')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""本地端点检测的效果：说完话到字幕结束（开始消失）的时间
+
+合成音频按 --speech 秒说话、--silence 秒静音交替实时输出，翻译器连接本地替身服务器（单独的子进程），
+替身服务器连续静音 --server-silence-ms 后才给出整句结果，相当于服务端断句较慢。
+同一段音频分三种方式运行：
+    off          不做本地端点检测，等服务端断句
+    speculative  本地检测到停顿后把句子标记为提前结束（界面开始计时），不通知服务端
+    commit       同时向服务端发送 input_audio_buffer.commit，让服务端立即给出整句结果
+比较：
+    finals       整句数，应等于说话的段数
+    final p50/p90  说话结束到整句结果的时间
+    end p50      说话结束到句子结束（提前结束标记或整句结果中较早的一个）的时间，即界面开始让字幕消失的时间
+    speech s     各整句语音时长（替身服务器在译文中给出）之和，三种方式应相同，commit 不应截断句子
+
+用法: python -m benchmark.bench_endpoint [--cycles 6] [--speech 2] [--silence 1.5] [--server-silence-ms 1000]
+                                          [--pause-ms 500]
+"""
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from loguru import logger
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, p: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else None
+
+
+def run(args, mode: str) -> dict:
+    from config import Config
+    from service.audio_source import SyntheticSource
+    from service.audio_translate_service import AudioTranslateService
+
+    config = Config()
+    config.override('endpoint.enabled', mode != 'off')
+    config.override('endpoint.commit', mode == 'commit')
+    service = AudioTranslateService()
+    finals = {}
+    ends = {}
+    lock = threading.Lock()
+
+    def on_events(events):
+        with lock:
+            for event in events:
+                if event.is_sentence_ended:
+                    finals[event.sentence_id] = event
+                if event.is_sentence_ended or event.speculative_end:
+                    ends.setdefault(event.sentence_id, event.create_time)
+
+    service.event_bus.subscribe(on_events, window=0.0, name='bench')
+    duration = args.cycles * (args.speech + args.silence)
+    source = SyntheticSource('bench', speech_sec=args.speech, silence_sec=args.silence, speed=1.0,
+                             duration=duration)
+    service.start([source])
+    source.finished.wait(duration + 30)
+    time.sleep(args.server_silence_ms / 1000 + 1.0)
+    service.stop()
+    service.event_bus.close()
+    final_latency = [event.latency() for event in finals.values() if event.latency() is not None]
+    end_latency = [ends[sentence_id] - event.audio_end for sentence_id, event in finals.items()
+                   if event.audio_end is not None and sentence_id in ends]
+    # 替身服务器的译文为 "sentence <n> <语音时长>s"
+    lengths = [float(found[0]) for found in (re.findall(r'([\d.]+)s$', event.sentence) for event in finals.values())
+               if found]
+    return {'finals': len(finals), 'final_p50': percentile(final_latency, 0.5),
+            'final_p90': percentile(final_latency, 0.9), 'end_p50': percentile(end_latency, 0.5),
+            'speech': sum(lengths)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cycles', type=int, default=6, help='speech/silence cycles')
+    parser.add_argument('--speech', type=float, default=2.0)
+    parser.add_argument('--silence', type=float, default=1.5)
+    parser.add_argument('--server-silence-ms', type=int, default=1000, help='pause before the server ends a sentence')
+    parser.add_argument('--pause-ms', type=float, default=500, help='endpoint.pause_ms')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-m', 'benchmark.mock_qwen_server', '--port', str(port),
+                               '--silence-ms', str(args.server_silence_ms)],
+                              env={**os.environ, 'PYTHONPATH': os.getcwd()}, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    workdir = tempfile.mkdtemp(prefix='bench_endpoint_')
+    with open(os.path.join(workdir, '.config.yaml'), 'w', encoding='utf-8') as f:
+        f.write(f'translator:\n  model: qwen\n  api_key: benchmark\n  target_language: zh\n'
+                f'  ws_url: ws://127.0.0.1:{port}\nendpoint:\n  pause_ms: {args.pause_ms}\n')
+    os.chdir(workdir)
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+
+    def ms(value):
+        return '-' if value is None else f'{value * 1000:.0f}ms'
+
+    try:
+        time.sleep(1.0)
+        print(f'{args.cycles} x ({args.speech:g}s speech + {args.silence:g}s silence), server ends sentences after '
+              f'{args.server_silence_ms}ms of silence, endpoint.pause_ms {args.pause_ms:g}')
+        print(f'{"mode":>11} {"finals":>6} {"final p50":>9} {"final p90":>9} {"end p50":>8} {"speech s":>8}')
+        for mode in ('off', 'speculative', 'commit'):
+            stats = run(args, mode)
+            print(f'{mode:>11} {stats["finals"]:>6} {ms(stats["final_p50"]):>9} {ms(stats["final_p90"]):>9} '
+                  f'{ms(stats["end_p50"]):>8} {stats["speech"]:>8.1f}')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
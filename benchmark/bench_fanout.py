@@ -0,0 +1,108 @@
+"""多目标语言分发基准测试
+
+对比两种方式处理同一路 48kHz 立体声音频时的 CPU 开销：
+    shared   一个 AudioTranslateService 采集/重采样/静音检测一次，分发给 N 个会话
+    separate N 个独立的 AudioTranslateService，各自重采样后发给自己的会话
+
+会话使用与 QwenTranslator 相同的 base64 + json 编码，但不发网络请求。
+
+用法: python -m benchmark.bench_fanout [--seconds 60] [--sessions 1 2 4 8]
+"""
+import argparse
+import base64
+import json
+import time
+from typing import Optional
+
+import numpy as np
+
+from service.audio_translate_service import AudioTranslateService, SourcePipeline, CHUNK_SIZE
+from translator.base import ITranslator
+
+INPUT_RATE = 48000
+INPUT_CHANNELS = 2
+
+
+class EncodingTranslator(ITranslator):
+    """只做发送前编码的翻译器，用来模拟每个会话的发送开销"""
+
+    def __init__(self):
+        self.sent_bytes = 0
+
+    def send_data(self, data: bytes, capture_time: Optional[float] = None):
+        audio_event = {
+            "event_id": f"event_{int(time.time() * 1000)}",
+            "type": "input_audio_buffer.append",
+            "audio": base64.b64encode(data).decode('utf-8'),
+        }
+        self.sent_bytes += len(json.dumps(audio_event))
+
+    def close(self):
+        pass
+
+    def register_callback(self, cb):
+        pass
+
+
+def make_chunks(seconds: float):
+    rng = np.random.default_rng(0)
+    n_chunks = int(seconds * INPUT_RATE / CHUNK_SIZE)
+    t = np.arange(CHUNK_SIZE * n_chunks) / INPUT_RATE
+    voice = 8000 * np.sin(2 * np.pi * 220 * t) + rng.normal(0, 500, t.shape)
+    frames = np.repeat(voice[:, np.newaxis], INPUT_CHANNELS, axis=1).astype(np.int16)
+    return [frames[i * CHUNK_SIZE:(i + 1) * CHUNK_SIZE].tobytes() for i in range(n_chunks)]
+
+
+def make_pipeline(n_sessions: int) -> SourcePipeline:
+    pipeline = SourcePipeline('bench')
+    for i in range(n_sessions):
+        pipeline.add_translator(f'lang{i}', EncodingTranslator())
+    return pipeline
+
+
+def run_shared(chunks, n_sessions):
+    service = AudioTranslateService()
+    pipeline = make_pipeline(n_sessions)
+    start = time.process_time()
+    for chunk in chunks:
+        service.process(pipeline, chunk, INPUT_CHANNELS, INPUT_RATE)
+    return time.process_time() - start
+
+
+def run_separate(chunks, n_sessions):
+    services = [(AudioTranslateService(), make_pipeline(1)) for _ in range(n_sessions)]
+    start = time.process_time()
+    for chunk in chunks:
+        for service, pipeline in services:
+            service.process(pipeline, chunk, INPUT_CHANNELS, INPUT_RATE)
+    return time.process_time() - start
+
+
+def run_capture_only(chunks):
+    return run_shared(chunks, 0)
+
+
+def best_of(fn, *args, repeat=3):
+    return min(fn(*args) for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.seconds)
+    audio_seconds = len(chunks) * CHUNK_SIZE / INPUT_RATE
+    capture = best_of(run_capture_only, chunks)
+    print(f'audio: {audio_seconds:.1f}s, capture only: {capture / audio_seconds * 1000:.3f} ms cpu/audio-s')
+    print(f'{"sessions":>8} {"shared ms/s":>12} {"separate ms/s":>14} {"shared/session":>15}')
+    for n in args.sessions:
+        shared = best_of(run_shared, chunks, n) / audio_seconds * 1000
+        separate = best_of(run_separate, chunks, n) / audio_seconds * 1000
+        per_session = (shared - capture / audio_seconds * 1000) / n
+        print(f'{n:>8} {shared:>12.3f} {separate:>14.3f} {per_session:>15.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""对冲翻译：两个延迟不同、偶有尖峰的替身服务器，比较显示出来的整句延迟
+
+启动两个本地 Qwen 替身服务器（各自一个子进程），fast 平时延迟低但尖峰更频繁，steady 平时慢一些但稳定。
+translator.model 设为 hedged，合成音频按实时速度同时发给两者，统计：
+    各 provider 自己的整句延迟（音频结束到整句结果到达）
+    实际显示的整句延迟（HedgedTranslator 取先到的）
+    每个 provider 先给出结果 / 先给出整句的次数，以及被替换成 prefer 译文的次数
+并检查显示的 sentence_id 单调递增、没有重复显示同一句。
+
+用法: python -m benchmark.bench_hedge [--seconds 40] [--prefer steady]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from loguru import logger
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, latency: float, spike_prob: float, spike_latency: float, seed: int):
+    return subprocess.Popen([sys.executable, '-m', 'benchmark.mock_qwen_server', '--port', str(port),
+                             '--latency', str(latency), '--spike-prob', str(spike_prob),
+                             '--spike-latency', str(spike_latency), '--seed', str(seed)],
+                            env={**os.environ, 'PYTHONPATH': os.getcwd()}, stdout=subprocess.DEVNULL)
+
+
+def percentiles(values) -> str:
+    if not values:
+        return '-'
+    return f'p50 {np.percentile(values, 50) * 1000:.0f}ms  p95 {np.percentile(values, 95) * 1000:.0f}ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=40)
+    parser.add_argument('--prefer', default='', help='provider whose final text replaces an earlier winner')
+    parser.add_argument('--spike-latency', type=float, default=1.5)
+    args = parser.parse_args()
+    logger.remove()
+
+    ports = [free_port(), free_port()]
+    servers = [start_server(ports[0], 0.1, 0.3, args.spike_latency, 1),
+               start_server(ports[1], 0.3, 0.05, args.spike_latency, 2)]
+    # Config 从当前目录读取 .config.yaml，切到临时目录使用基准专用配置
+    sys.path.insert(0, os.getcwd())
+    workdir = tempfile.mkdtemp(prefix='bench_hedge_')
+    with open(os.path.join(workdir, '.config.yaml'), 'w', encoding='utf-8') as f:
+        f.write('translator:\n  model: hedged\n  api_key: benchmark\n  target_language: zh\n  hedge:\n'
+                f'    providers:\n'
+                f'      - {{model: qwen, name: fast, ws_url: "ws://127.0.0.1:{ports[0]}"}}\n'
+                f'      - {{model: qwen, name: steady, ws_url: "ws://127.0.0.1:{ports[1]}"}}\n'
+                + (f'    prefer: {args.prefer}\n' if args.prefer else '') +
+                'audio:\n  device_monitor: false\n')
+    os.chdir(workdir)
+    from service.audio_source import SyntheticSource
+    from service.audio_translate_service import AudioTranslateService
+
+    try:
+        time.sleep(1.0)
+        events = []
+        service = AudioTranslateService()
+        service.register_callback(events.append)
+        service.start([SyntheticSource('loopback', frame_ms=200, speed=1.0)])
+        hedged = service.pipelines['loopback'].translators['zh']
+        time.sleep(args.seconds)
+        # 先取出各 provider 的统计，close 之后会清空
+        providers = {provider.name: list(provider.latencies) for provider in hedged.providers}
+        service.stop()
+        stats = hedged.stats()
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+    finals = [event for event in events if event.is_sentence_ended]
+    first_finals = {}
+    for event in finals:
+        first_finals.setdefault(event.sentence_id, event)
+    shown = [event.latency() for event in first_finals.values() if event.latency() is not None]
+    for name, latencies in providers.items():
+        print(f'{name:<8} final latency {percentiles(latencies)}  first {stats[name]["first"]:>3}  '
+              f'final {stats[name]["final"]:>3}')
+    print(f'{"shown":<8} final latency {percentiles(shown)}')
+    ids = list(first_finals)
+    print(f'sentences {len(ids)}, upgrades {stats["upgrades"]}, takeovers {stats["takeovers"]}, '
+          f'suppressed {stats["suppressed"]}, monotonic ids: {ids == sorted(ids)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""空闲管理的效果：长时间静音时关闭翻译会话能省多少 CPU 和连接时间，恢复后是否丢字
+
+合成音频按 --speech 秒说话、--silence 秒静音交替，按 --speed 倍速输出，翻译器连接本地替身服务器
+（单独的子进程）。同一段音频分别在关闭和开启 idle 时运行一次，比较：
+    cpu        本进程的 CPU 时间（采集回调、重采样、发送、WebSocket 线程等全部计入）
+    conn s     翻译会话保持连接的秒数（音频时间）
+    finals     整句数，两次应相同
+    resumed    空闲后第一句的语音时长（替身服务器在译文中给出），等于 --speech 说明预卷补上了唤醒前的音频
+    reconnect  从检测到声音到重新连上的平均耗时
+
+用法: python -m benchmark.bench_idle [--cycles 4] [--speech 3] [--silence 30] [--timeout 10] [--speed 4]
+"""
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from loguru import logger
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run(args, idle: bool) -> dict:
+    from config import Config
+    from service.audio_source import SyntheticSource
+    from service.audio_translate_service import AudioTranslateService
+
+    Config().override('idle.enabled', idle)
+    service = AudioTranslateService()
+    finals = []
+    lock = threading.Lock()
+
+    def on_events(events):
+        with lock:
+            finals.extend(event.sentence for event in events if event.is_sentence_ended)
+
+    service.event_bus.subscribe(on_events, window=0.05, name='bench')
+    period = args.speech + args.silence
+    # 最后多留一段静音，让最后一句结束
+    duration = args.cycles * period
+    source = SyntheticSource('bench', speech_sec=args.speech, silence_sec=args.silence, speed=args.speed,
+                             duration=duration)
+    cpu = time.process_time()
+    started = time.perf_counter()
+    service.start([source])
+    source.finished.wait(duration / args.speed + 30)
+    time.sleep(1.0)
+    cpu = time.process_time() - cpu
+    elapsed = time.perf_counter() - started
+    manager = service.pipelines['bench'].idle
+    stats = {'cpu': cpu, 'elapsed': elapsed, 'finals': list(finals), 'periods': 0, 'saved': 0.0, 'reconnect': 0.0}
+    if manager:
+        stats.update(periods=manager.idle_periods, saved=manager.connection_seconds_saved * args.speed,
+                     reconnect=manager.reconnect_seconds / max(manager.idle_periods, 1),
+                     cpu_saved=manager.cpu_seconds_saved)
+    service.stop()
+    service.event_bus.close()
+    stats['connected'] = elapsed * args.speed - stats['saved']
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cycles', type=int, default=4, help='speech/silence cycles')
+    parser.add_argument('--speech', type=float, default=3.0)
+    parser.add_argument('--silence', type=float, default=30.0)
+    parser.add_argument('--timeout', type=float, default=10.0, help='idle.timeout in audio seconds')
+    parser.add_argument('--speed', type=float, default=4.0, help='audio speed relative to real time')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-m', 'benchmark.mock_qwen_server', '--port', str(port)],
+                              env={**os.environ, 'PYTHONPATH': os.getcwd()}, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    workdir = tempfile.mkdtemp(prefix='bench_idle_')
+    with open(os.path.join(workdir, '.config.yaml'), 'w', encoding='utf-8') as f:
+        f.write(f'translator:\n  model: qwen\n  api_key: benchmark\n  target_language: zh\n'
+                f'  ws_url: ws://127.0.0.1:{port}\nidle:\n  timeout: {args.timeout}\n')
+    os.chdir(workdir)
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    try:
+        time.sleep(1.0)
+        print(f'{args.cycles} x ({args.speech:g}s speech + {args.silence:g}s silence) at {args.speed:g}x, '
+              f'idle after {args.timeout:g}s')
+        print(f'{"idle":>5} {"cpu s":>7} {"conn s":>7} {"finals":>6} {"resumed":>24} {"reconnect":>9}')
+        for idle in (False, True):
+            stats = run(args, idle)
+            # 替身服务器的译文为 "sentence <n> <语音时长>s"
+            lengths = [re.findall(r'([\d.]+)s$', text) for text in stats['finals']]
+            resumed = ' '.join(found[0] for found in lengths[1:] if found) or '-'
+            reconnect = f'{stats["reconnect"] * 1000:.0f}ms' if stats['periods'] else '-'
+            print(f'{"on" if idle else "off":>5} {stats["cpu"]:>7.2f} {stats["connected"]:>7.0f} '
+                  f'{len(stats["finals"]):>6} {resumed:>24} {reconnect:>9}')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
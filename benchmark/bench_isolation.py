@@ -0,0 +1,130 @@
+"""采集回调抖动：进程内运行 vs 独立翻译进程
+
+主进程中用一个线程模拟界面负载（每 16ms 做一次纯 Python 的逐像素计算和大 JSON 解析，持有 GIL），
+SyntheticSource 以 frame_ms 的间隔实时回调，分别接入：
+    thread   AudioTranslateService，重采样、编码发送和收包都在主进程
+    process  ProcessTranslateService，回调只把 PCM 拷进共享内存，其余在工作进程
+对每种方式统计回调相对理想时刻的延迟（late）和回调本身的耗时（callback），
+翻译器连接本地替身服务器（单独的子进程）。
+
+用法: python -m benchmark.bench_isolation [--seconds 10] [--frame-ms 10] [--no-load]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from loguru import logger
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def ui_load(stopped: threading.Event):
+    """模拟界面线程：重绘时逐像素处理、解析一大段 JSON"""
+    payload = json.dumps([{'type': 'response.text.text', 'text': 'x' * 64, 'item_id': i} for i in range(300)])
+    while not stopped.is_set():
+        pixels = 0
+        for y in range(60):
+            for x in range(400):
+                pixels += (x * y) & 0xff
+        json.loads(payload)
+        stopped.wait(0.016)
+
+
+def run(mode: str, frame_ms: float, seconds: float, load: bool) -> dict:
+    from service.audio_source import SyntheticSource
+    from service.audio_translate_service import AudioTranslateService
+    from service.process_translate_service import ProcessTranslateService
+
+    service = ProcessTranslateService(log_level='ERROR') if mode == 'process' else AudioTranslateService()
+    events = []
+    service.register_callback(events.append)
+    source = SyntheticSource('bench', frame_ms=frame_ms, duration=seconds)
+    interval = source.frames_per_buffer / source.rate
+    lateness = []
+    durations = []
+
+    # 包装音频源的回调，记录每次回调的时刻和耗时
+    original_start = source.start
+
+    def timed_start(callback):
+        state = {'started': None, 'n': 0}
+
+        def timed(data, capture_time):
+            now = time.perf_counter()
+            if state['started'] is None:
+                state['started'] = now
+            lateness.append(now - state['started'] - state['n'] * interval)
+            state['n'] += 1
+            callback(data, capture_time)
+            durations.append(time.perf_counter() - now)
+        original_start(timed)
+
+    source.start = timed_start
+    stopped = threading.Event()
+    load_thread = threading.Thread(target=ui_load, args=(stopped,), daemon=True)
+    service.start([source])
+    if load:
+        load_thread.start()
+    source.finished.wait(seconds * 2)
+    stopped.set()
+    time.sleep(1.0)
+    service.stop()
+
+    # SyntheticSource 按理想时刻排程，落后后会立即补发，因此每次的落后量就是该次回调的延迟
+    late = np.maximum(np.array(lateness), 0) * 1000
+    durations = np.array(durations) * 1000
+    return {
+        'late_p50': float(np.percentile(late, 50)),
+        'late_p99': float(np.percentile(late, 99)),
+        'late_max': float(late.max()),
+        'callback_p50': float(np.percentile(durations, 50)),
+        'callback_p99': float(np.percentile(durations, 99)),
+        'sentences': sum(1 for event in events if event.is_sentence_ended),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--frame-ms', type=float, default=10, help='capture callback duration')
+    parser.add_argument('--no-load', action='store_true', help='run without the simulated UI load')
+    parser.add_argument('--modes', nargs='+', default=['thread', 'process'])
+    args = parser.parse_args()
+    logger.remove()
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-m', 'benchmark.mock_qwen_server', '--port', str(port)],
+                              env={**os.environ, 'PYTHONPATH': os.getcwd()})
+    # Config 从当前目录读取 .config.yaml，切到临时目录使用基准专用配置，工作进程会继承当前目录
+    sys.path.insert(0, os.getcwd())
+    workdir = tempfile.mkdtemp(prefix='bench_isolation_')
+    with open(os.path.join(workdir, '.config.yaml'), 'w', encoding='utf-8') as f:
+        f.write(f'translator:\n  model: qwen\n  api_key: benchmark\n  target_language: zh\n'
+                f'  ws_url: ws://127.0.0.1:{port}\naudio:\n  frame_ms: {args.frame_ms}\n')
+    os.chdir(workdir)
+    try:
+        time.sleep(1.0)
+        print(f'{"mode":>8} {"late p50":>9} {"late p99":>9} {"late max":>9} {"cb p50":>8} {"cb p99":>8} '
+              f'{"sentences":>9}   (ms)')
+        for mode in args.modes:
+            result = run(mode, args.frame_ms, args.seconds, not args.no_load)
+            print(f'{mode:>8} {result["late_p50"]:>9.2f} {result["late_p99"]:>9.2f} {result["late_max"]:>9.2f} '
+                  f'{result["callback_p50"]:>8.3f} {result["callback_p99"]:>8.3f} {result["sentences"]:>9}')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Opus 上行压缩：带宽、编码 CPU 开销和解码往返校验
+
+按实时采集的块大小（默认 200ms）把 16kHz 单声道音频交给 OpusUplink，统计实际码率、相对 PCM 节省的带宽、
+编码器的 CPU 时间。本地替身接收端模拟服务端：检查每次发送的数据都由完整的 Ogg 页组成（校验 CRC，
+收到即可解析，不需要等后续数据），最后用 PyAV 解码整条流，与原始音频对齐后比较时长和信噪比。
+往返校验失败时以退出码 1 结束。
+
+用法: python -m benchmark.bench_opus_uplink [--seconds 20] [--bitrate 16000 24000 32000] [--frame-ms 10 20 40]
+                                            [--input speech.wav]
+"""
+import argparse
+import io
+import os
+import struct
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+RATE = 16000
+
+
+def load_input(path: str, seconds: float) -> bytes:
+    sys.path.insert(0, os.getcwd())
+    from service.audio_source import SyntheticSource
+    from service.audio_translate_service import AudioTranslateService
+
+    service = AudioTranslateService()
+    if path:
+        from service.offline_subtitle_service import OfflineSubtitleService
+
+        data, rate, channels = OfflineSubtitleService.load_audio(path)
+        data = data[:int(seconds * rate) * channels * 2]
+    else:
+        source = SyntheticSource(rate=48000, channels=2)
+        rate, channels = source.rate, source.channels
+        data = source.generate(int(seconds * rate))
+    return service.resample_audio(data, input_channels=channels, input_rate=rate, output_rate=RATE)
+
+
+class StandInReceiver:
+    """替身接收端：逐次接收发送的数据，检查都是完整的 Ogg 页，结束后解码"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.errors: List[str] = []
+
+    def receive(self, data: bytes):
+        from translator.opus_uplink import ogg_crc
+
+        offset = 0
+        while offset < len(data):
+            if data[offset:offset + 4] != b'OggS' or offset + 27 > len(data):
+                self.errors.append(f'chunk {len(self.chunks)}: no page at offset {offset}')
+                break
+            n_segments = data[offset + 26]
+            size = 27 + n_segments + sum(data[offset + 27:offset + 27 + n_segments])
+            page = bytearray(data[offset:offset + size])
+            crc, = struct.unpack_from('<I', page, 22)
+            struct.pack_into('<I', page, 22, 0)
+            if len(page) < size or ogg_crc(page) != crc:
+                self.errors.append(f'chunk {len(self.chunks)}: bad page at offset {offset}')
+                break
+            offset += size
+        self.chunks.append(data)
+
+    def decode(self) -> np.ndarray:
+        import av
+
+        with av.open(io.BytesIO(b''.join(self.chunks)), format='ogg') as container:
+            resampler = av.AudioResampler(format='s16', layout='mono', rate=RATE)
+            pcm = []
+            for frame in container.decode(audio=0):
+                pcm.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(frame))
+            pcm.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(None))
+        return np.concatenate(pcm) if pcm else np.zeros(0, dtype=np.int16)
+
+
+def snr_db(reference: np.ndarray, decoded: np.ndarray, max_lag: int = RATE // 50) -> float:
+    """在 ±max_lag 个样本内找最佳对齐后的信噪比"""
+    reference = reference.astype(np.float64)
+    decoded = decoded.astype(np.float64)
+    best = -np.inf
+    for lag in range(-max_lag, max_lag + 1):
+        a = reference[max(0, -lag):]
+        b = decoded[max(0, lag):]
+        n = min(len(a), len(b))
+        noise = np.sum((a[:n] - b[:n]) ** 2)
+        best = max(best, 10 * np.log10(np.sum(a[:n] ** 2) / max(noise, 1e-9)))
+    return best
+
+
+def run(audio: bytes, bitrate: int, frame_ms: float, chunk_ms: float):
+    from translator.opus_uplink import OpusUplink
+
+    uplink = OpusUplink(RATE, bitrate, frame_ms)
+    receiver = StandInReceiver()
+    chunk_bytes = int(RATE * chunk_ms / 1000) * 2
+    timings = []
+    for offset in range(0, len(audio), chunk_bytes):
+        start = time.perf_counter()
+        out = uplink.encode(audio[offset:offset + chunk_bytes])
+        timings.append(time.perf_counter() - start)
+        if out:
+            receiver.receive(out)
+    receiver.receive(uplink.flush())
+    decoded = receiver.decode()
+    reference = np.frombuffer(audio, dtype=np.int16)
+    return uplink, receiver, timings, decoded, reference
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--bitrate', type=int, nargs='+', default=[16000, 24000, 32000])
+    parser.add_argument('--frame-ms', type=float, nargs='+', default=[10, 20, 40])
+    parser.add_argument('--chunk-ms', type=float, default=200, help='audio per send_data call')
+    parser.add_argument('--input', default='', help='audio file to encode instead of synthetic speech')
+    parser.add_argument('--min-snr', type=float, default=5.0, help='fail below this round-trip SNR (dB)')
+    args = parser.parse_args()
+
+    audio = load_input(args.input, args.seconds)
+    seconds = len(audio) / 2 / RATE
+    print(f'{seconds:.1f}s of {RATE}Hz mono, PCM {RATE * 16 / 1000:.0f} kbit/s, {args.chunk_ms:.0f}ms per send')
+    print(f'{"bitrate":>8} {"frame":>6} {"kbit/s":>7} {"saved":>6} {"cpu":>6} {"us/send":>8} {"p99":>7} '
+          f'{"snr dB":>7} {"length":>7}')
+    failed = False
+    for bitrate in args.bitrate:
+        for frame_ms in args.frame_ms:
+            uplink, receiver, timings, decoded, reference = run(audio, bitrate, frame_ms, args.chunk_ms)
+            snr = snr_db(reference, decoded)
+            # 解码长度包含编码器补齐的最后一帧，差值不应超过一帧加重采样的余量
+            length_ok = abs(len(decoded) - len(reference)) <= int(RATE * frame_ms / 1000) + RATE // 100
+            ok = not receiver.errors and length_ok and snr >= args.min_snr
+            failed |= not ok
+            print(f'{bitrate:>8} {frame_ms:>4g}ms {uplink.sent_bytes * 8 / seconds / 1000:>7.1f} '
+                  f'{1 - uplink.sent_bytes / uplink.pcm_bytes:>6.1%} {uplink.encode_seconds / seconds:>6.2%} '
+                  f'{np.mean(timings) * 1e6:>8.0f} {np.percentile(timings, 99) * 1e6:>7.0f} {snr:>7.1f} '
+                  f'{"ok" if length_ok else "bad":>7}' + ('' if ok else '  FAILED'))
+            for error in receiver.errors[:3]:
+                print(f'    {error}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""翻译会话轮换的效果：服务端按时长上限断开会话时，先连后断的轮换能否做到字幕不中断
+
+合成音频按 --speech 秒说话、--silence 秒静音交替，按 --speed 倍速输出，翻译器连接本地替身服务器
+（单独的子进程），服务端每个连接 --max-session 秒后主动断开。同一段音频分别在关闭和开启
+translator.rotation 时运行一次（轮换间隔 --interval 秒，小于服务端上限），比较：
+    finals     整句数，应等于说话的段数
+    short      语音时长（替身服务器在译文中给出）短于 --speech 的整句数，即丢了音频的句子
+    stuck      只有局部结果、没有整句结果的句子数，会一直留在屏幕上
+    reused     与之前的整句重复的 sentence_id 数
+    rotations  轮换次数（括号内为强制切换的次数）
+
+用法: python -m benchmark.bench_rotation [--cycles 12] [--speech 2] [--silence 1.5] [--speed 2]
+                                          [--max-session 8] [--interval 5]
+"""
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from loguru import logger
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run(args, rotation: bool) -> dict:
+    from config import Config
+    from service.audio_source import SyntheticSource
+    from service.audio_translate_service import AudioTranslateService
+
+    Config().override('translator.rotation.enabled', rotation)
+    service = AudioTranslateService()
+    finals = []
+    partial_ids = set()
+    lock = threading.Lock()
+
+    def on_events(events):
+        with lock:
+            for event in events:
+                if event.is_sentence_ended:
+                    finals.append((event.sentence_id, event.sentence))
+                else:
+                    partial_ids.add(event.sentence_id)
+
+    service.event_bus.subscribe(on_events, window=0.05, name='bench')
+    duration = args.cycles * (args.speech + args.silence)
+    source = SyntheticSource('bench', speech_sec=args.speech, silence_sec=args.silence, speed=args.speed,
+                             duration=duration)
+    service.start([source])
+    source.finished.wait(duration / args.speed + 30)
+    time.sleep(1.5)
+    translator = service.pipelines['bench'].translators['zh']
+    rotations = f'{translator.rotations} ({translator.forced})' if rotation else '-'
+    service.stop()
+    service.event_bus.close()
+    ids = [sentence_id for sentence_id, _ in finals]
+    # 替身服务器的译文为 "sentence <n> <语音时长>s"
+    lengths = [float(found[0]) for found in (re.findall(r'([\d.]+)s$', text) for _, text in finals) if found]
+    return {'finals': len(finals), 'short': sum(length < args.speech - 0.05 for length in lengths),
+            'stuck': len(partial_ids - set(ids)), 'reused': len(ids) - len(set(ids)), 'rotations': rotations}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cycles', type=int, default=12, help='speech/silence cycles')
+    parser.add_argument('--speech', type=float, default=2.0)
+    parser.add_argument('--silence', type=float, default=1.5)
+    parser.add_argument('--speed', type=float, default=2.0, help='audio speed relative to real time')
+    parser.add_argument('--max-session', type=float, default=8.0, help='server closes sessions after these seconds')
+    parser.add_argument('--interval', type=float, default=5.0, help='translator.rotation.interval in seconds')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-m', 'benchmark.mock_qwen_server', '--port', str(port),
+                               '--max-session', str(args.max_session)],
+                              env={**os.environ, 'PYTHONPATH': os.getcwd()}, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    workdir = tempfile.mkdtemp(prefix='bench_rotation_')
+    with open(os.path.join(workdir, '.config.yaml'), 'w', encoding='utf-8') as f:
+        f.write(f'translator:\n  model: qwen\n  api_key: benchmark\n  target_language: zh\n'
+                f'  ws_url: ws://127.0.0.1:{port}\n  rotation:\n    interval: {args.interval}\n')
+    os.chdir(workdir)
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    try:
+        time.sleep(1.0)
+        print(f'{args.cycles} x ({args.speech:g}s speech + {args.silence:g}s silence) at {args.speed:g}x, '
+              f'server closes sessions after {args.max_session:g}s, rotation every {args.interval:g}s')
+        print(f'{"rotation":>8} {"finals":>6} {"short":>5} {"stuck":>5} {"reused":>6} {"rotations":>9}')
+        for rotation in (False, True):
+            stats = run(args, rotation)
+            print(f'{"on" if rotation else "off":>8} {stats["finals"]:>6} {stats["short"]:>5} {stats["stuck"]:>5} '
+                  f'{stats["reused"]:>6} {stats["rotations"]:>9}')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""语音判别（speech_gate）的效果：分类准确率、CPU 开销，以及在混合内容上少发送多少音频
+
+全部离线运行，不需要网络和声卡。测试信号由 benchmark/synthetic_signals.py 生成，
+种子与调权重用的种子（0~2）不同。
+
+第一部分逐个信号按 200ms 一块送入 SpeechDiscriminator（跳过第一个窗口），比较：
+    speech        语音块判为语音的比例（召回率），应接近 1，漏判会丢字
+    music / noise 非语音块判为非语音的比例（拒绝率）
+    speech_music  有背景音乐的语音块判为语音的比例
+    cpu/s         每秒音频的判别耗时
+
+第二部分把几种信号拼成一段"视频"（对白、配乐、有配乐的对白、环境噪声、静音），
+按 200ms 一块交给 AudioTranslateService.dispatch，翻译会话只统计收到的音频，比较关闭和开启 speech_gate 时：
+    sent s        发送给翻译后端的音频秒数
+    speech sent   标注为语音的块中被发送的比例，两者应接近
+
+用法: python -m benchmark.bench_speech_gate [--seconds 30] [--rate 16000]
+"""
+import argparse
+import os
+import sys
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+CHUNK_MS = 200
+SEEDS = (5, 6, 7)
+# "视频"的分段：(信号, 秒数)
+SCENE = [('speech', 20), ('music', 30), ('speech_music', 20), ('noise', 15), ('silence', 5), ('speech', 10),
+         ('music', 20)]
+
+
+def chunks(pcm: np.ndarray, labels: np.ndarray, rate: int):
+    size = rate * CHUNK_MS // 1000
+    for i in range(0, len(pcm) - size + 1, size):
+        yield pcm[i:i + size].tobytes(), bool(labels[i:i + size].mean() > 0.5)
+
+
+def classify(args) -> None:
+    from benchmark.synthetic_signals import SIGNALS
+    from service.speech_discriminator import SpeechDiscriminator
+
+    print(f'{args.seconds:g}s per signal, seeds {SEEDS}, {args.rate} Hz, {CHUNK_MS}ms chunks')
+    print(f'{"signal":>12} {"metric":>10} {"value":>6} {"cpu/s":>8}')
+    for name, generate in SIGNALS.items():
+        hits, total, cpu, seconds = 0, 0, 0.0, 0.0
+        for seed in SEEDS:
+            pcm, labels = generate(args.seconds, args.rate, seed)
+            discriminator = SpeechDiscriminator(args.rate)
+            for i, (data, label) in enumerate(chunks(pcm, labels, args.rate)):
+                speech = discriminator.feed(data)
+                if i * CHUNK_MS < 1000:
+                    continue
+                if name == 'speech' and not label:
+                    # 句间停顿交给静音检测，不计入
+                    continue
+                total += 1
+                hits += speech if name in ('speech', 'speech_music') else not speech
+            cpu += discriminator.cpu_seconds
+            seconds += discriminator.seconds
+        metric = 'recall' if name in ('speech', 'speech_music') else 'rejection'
+        print(f'{name:>12} {metric:>10} {hits / max(total, 1):>6.2f} {cpu / seconds * 1e6:>6.0f}us')
+
+
+class CountingTranslator:
+    """只统计收到的音频，capture_time 为块序号"""
+
+    def __init__(self):
+        self.chunks = set()
+        self.bytes = 0
+
+    def send_data(self, data: bytes, capture_time: Optional[float] = None):
+        self.chunks.add(capture_time)
+        self.bytes += len(data)
+
+    def commit(self) -> bool:
+        return False
+
+
+def scene(rate: int):
+    from benchmark.synthetic_signals import SIGNALS
+
+    pieces, labels = [], []
+    for i, (name, seconds) in enumerate(SCENE):
+        if name == 'silence':
+            pcm = np.zeros(int(seconds * rate), dtype=np.int16)
+            label = np.zeros(len(pcm), dtype=bool)
+        else:
+            pcm, label = SIGNALS[name](seconds, rate, 100 + i)
+        pieces.append(pcm)
+        labels.append(label)
+    return np.concatenate(pieces), np.concatenate(labels)
+
+
+def uplink(rate: int, enabled: bool, pcm: np.ndarray, labels: np.ndarray) -> dict:
+    from config import Config
+    from service.audio_translate_service import AudioTranslateService, SourcePipeline
+
+    Config().override('speech_gate.enabled', enabled)
+    service = AudioTranslateService()
+    pipeline = SourcePipeline('bench', rate)
+    translator = CountingTranslator()
+    pipeline.add_translator('zh', translator, send_ms=0)
+    speech_chunks = set()
+    for index, (data, label) in enumerate(chunks(pcm, labels, rate)):
+        if label:
+            speech_chunks.add(index)
+        service.dispatch(pipeline, data, index)
+    stats = {'sent': translator.bytes / 2 / rate,
+             'speech_sent': len(speech_chunks & translator.chunks) / max(len(speech_chunks), 1), 'cpu': None}
+    if pipeline.discriminator:
+        stats['cpu'] = pipeline.discriminator.cpu_seconds
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=30, help='seconds per test signal')
+    parser.add_argument('--rate', type=int, default=16000, help='sample rate of the uplink')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    classify(args)
+
+    pcm, labels = scene(args.rate)
+    print()
+    print('scene: ' + ', '.join(f'{name} {seconds}s' for name, seconds in SCENE))
+    print(f'{"speech_gate":>11} {"sent s":>7} {"speech sent":>11} {"cpu":>7}')
+    for enabled in (False, True):
+        stats = uplink(args.rate, enabled, pcm, labels)
+        cpu = '-' if stats['cpu'] is None else f'{stats["cpu"] * 1000:.0f}ms'
+        print(f'{"on" if enabled else "off":>11} {stats["sent"]:>7.1f} {stats["speech_sent"]:>11.2f} {cpu:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,406 @@
+"""热点路径的微基准与性能回归检查
+
+覆盖重采样、静音检测、多声道转换、Qwen 音频编码与消息解析、SubTitleData 并发读写、
+字幕折行、alpha 处理、字形图集拼行、音频归档写入、端点检测、语音判别和 span 记录，全部不依赖声卡、网络、Qt 和 Windows，可在 Linux 下运行。
+
+每个用例先估算迭代次数使单轮约 20ms，重复多轮取最快一轮的单次耗时，减少调度噪声的影响。
+保存和对比时都会测一个固定的校准负载，按校准耗时换算，抵消 CPU 频率变化等整机速度波动；
+超过阈值的用例会重新测量，仍然超过才算回归。基线与机器相关，换机器后先用 run --save 重新生成。
+
+用法:
+    python -m benchmark.microbench run [-k resample] [--save benchmark/baseline.json]
+    python -m benchmark.microbench compare [--baseline benchmark/baseline.json] [--threshold 0.25]
+compare 中任一用例比基线慢超过 threshold 时以退出码 1 结束。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from loguru import logger
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+TARGET_ROUND_SEC = 0.02
+ROUNDS = 7
+
+# 用例名 -> 创建被测函数的工厂，工厂中完成准备工作，被测函数不带参数
+CASES: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def case(name: str):
+    def register(factory):
+        CASES[name] = factory
+        return factory
+    return register
+
+
+def pcm(rate: int, channels: int, ms: float, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    frames = int(rate * ms / 1000)
+    return rng.integers(-8000, 8000, size=frames * channels, dtype=np.int16).tobytes()
+
+
+def _resample_case(rate: int, channels: int, output_rate: int = 16000):
+    def factory():
+        from service.audio_translate_service import AudioTranslateService
+
+        service = AudioTranslateService()
+        data = pcm(rate, channels, 200)
+        return lambda: service.resample_audio(data, channels, rate, output_rate)
+    return factory
+
+
+for _rate in (48000, 44100, 16000):
+    for _channels in (1, 2, 6):
+        case(f'resample/{_rate}x{_channels}')(_resample_case(_rate, _channels))
+# 翻译后端接受采集采样率时只转单声道
+case('resample/48000x2_native')(_resample_case(48000, 2, 48000))
+
+
+def _downmix_case(mode: str):
+    def factory():
+        from service.channel_processor import ChannelProcessor
+
+        processor = ChannelProcessor(mode)
+        audio = np.frombuffer(pcm(48000, 6, 200), dtype=np.int16)
+        return lambda: processor.process(audio, 6)
+    return factory
+
+
+for _mode in ('average', 'center', 'weighted'):
+    case(f'downmix/{_mode}_6ch')(_downmix_case(_mode))
+
+
+def _silence_case(ms: float):
+    def factory():
+        from service.audio_translate_service import AudioTranslateService
+
+        service = AudioTranslateService()
+        data = pcm(16000, 1, ms)
+        return lambda: service.is_silence(data)
+    return factory
+
+
+case('is_silence/200ms')(_silence_case(200))
+case('is_silence/20ms')(_silence_case(20))
+
+
+class NullWebSocket:
+    def send(self, message):
+        pass
+
+
+def make_qwen():
+    from translator.qwen_translator import QwenTranslator
+
+    translator = QwenTranslator(api_key='benchmark')
+    translator.is_running = True
+    translator.ws = NullWebSocket()
+    translator.register_callback(lambda event: None)
+    return translator
+
+
+def _encode_case(ms: float):
+    def factory():
+        translator = make_qwen()
+        data = pcm(16000, 1, ms)
+        return lambda: translator.send_data(data, time.time())
+    return factory
+
+
+case('qwen/encode_200ms')(_encode_case(200))
+case('qwen/encode_20ms')(_encode_case(20))
+
+
+@case('qwen/parse_partial')
+def _parse_partial():
+    translator = make_qwen()
+    message = json.dumps({'type': 'response.text.text', 'item_id': 'item_1',
+                          'text': '这是一句正在翻译中的字幕，长度和真实的中间结果差不多', 'stash': '还有'})
+    return lambda: translator._on_message(None, message)
+
+
+@case('qwen/parse_done')
+def _parse_done():
+    translator = make_qwen()
+    messages = [json.dumps({'type': 'response.text.done', 'item_id': f'item_{i}',
+                            'text': '这是一句已经翻译完成的字幕，长度和真实的整句结果差不多'}) for i in range(2)]
+    state = {'i': 0}
+
+    def run():
+        state['i'] ^= 1
+        translator._on_message(None, messages[state['i']])
+    return run
+
+
+@case('subtitle_data/set_get_4threads')
+def _subtitle_data():
+    from model.subtitle_data import SubTitleData
+
+    data = SubTitleData()
+    texts = [f'subtitle text {i}' * 3 for i in range(8)]
+
+    def worker(offset: int):
+        # 翻译回调不断更新中间结果，界面定时读取
+        for i in range(200):
+            data.set(offset + i % 8, texts[i % 8])
+            if i % 10 == 0:
+                data.get_list()
+
+    def run():
+        threads = [threading.Thread(target=worker, args=(offset * 100,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return run
+
+
+def _wrap_case(text: str):
+    def factory():
+        from view.subtitle_layout import wrap_text
+
+        return lambda: wrap_text(text, 1820, 12, 24, 10)
+    return factory
+
+
+case('wrap_text/zh_120')(_wrap_case('这是一段用来测试折行性能的中文字幕，包含标点符号、数字123和English words。' * 3))
+case('wrap_text/en_400')(_wrap_case('The quick brown fox jumps over the lazy dog, again and again. ' * 7))
+
+
+@case('alpha/1820x120')
+def _alpha():
+    from view.subtitle_layout import BUTTON_ALPHA, TEXT_ALPHA, apply_alpha
+
+    width, height = 1820, 120
+    rng = np.random.default_rng(0)
+    source = np.where(rng.random(width * height) < 0.2, 0x00FFFFFF, 0).astype(np.uint32)
+    pixels = source.copy()
+    rects = [(0, 0, width, 48, TEXT_ALPHA), (100, 48, width - 100, 96, TEXT_ALPHA),
+             (880, 96, 940, 120, BUTTON_ALPHA)]
+
+    def run():
+        pixels[:] = source
+        apply_alpha(pixels, width, rects)
+    return run
+
+
+@case('atlas/compose_3_lines')
+def _atlas():
+    from view.glyph_atlas import GlyphAtlas
+
+    height = 32
+    rng = np.random.default_rng(0)
+    glyphs = {}
+
+    def render(char):
+        # 合成字形，代替 GDI 渲染
+        if char not in glyphs:
+            glyphs[char] = ((rng.random((height, 16 if ord(char) < 128 else 32)) < 0.3) * 255).astype(np.uint8)
+        return glyphs[char]
+
+    atlas = GlyphAtlas(render, height, 64)
+    texts = ['这是一段用来测试字形图集拼接性能的中文字幕，包含标点符号、数字123。',
+             '第二行字幕同样很长，电影对白翻译成中文以后常常占满整个屏幕的宽度。',
+             'The quick brown fox jumps over the lazy dog while subtitles update.']
+    image = np.zeros((42 * len(texts), 1820), dtype=np.uint32)
+
+    def run():
+        for n, text in enumerate(texts):
+            atlas.draw_line(image, (0, n * 42, atlas.measure(text) + 20, (n + 1) * 42), text)
+    return run
+
+
+@case('archive/write_200ms')
+def _archive_write():
+    import tempfile
+
+    from service.audio_archive import AudioArchive
+
+    directory = tempfile.TemporaryDirectory(prefix='microbench_')
+    archive = AudioArchive(os.path.join(directory.name, 'archive.pcm'), seconds=60)
+    data = pcm(16000, 1, 200)
+    state = {'t': 0.0}
+
+    def run():
+        state['t'] += 0.2
+        archive.write(data, state['t'])
+
+    def cleanup():
+        archive.close()
+        directory.cleanup()
+    # 测完丢弃 run 后关闭归档并删除 60 秒的映射文件
+    weakref.finalize(run, cleanup)
+    return run
+
+
+@case('endpoint/feed_200ms')
+def _endpoint_feed():
+    from service.endpoint_detector import EndpointDetector
+
+    detector = EndpointDetector(16000)
+    data = pcm(16000, 1, 200)
+    state = {'t': 0.0}
+
+    def run():
+        state['t'] += 0.2
+        detector.feed(data, state['t'])
+    return run
+
+
+@case('speech_gate/feed_200ms')
+def _speech_gate_feed():
+    from service.speech_discriminator import SpeechDiscriminator
+
+    discriminator = SpeechDiscriminator(16000)
+    data = pcm(16000, 1, 200)
+
+    def run():
+        discriminator.feed(data)
+    return run
+
+
+def _tracer_case(enabled: bool):
+    def factory():
+        from service.span_tracer import SpanTracer
+
+        tracer = SpanTracer(capacity=4096)
+        if enabled:
+            tracer.enable()
+
+        def run():
+            with tracer.span('bench.span'):
+                pass
+        return run
+    return factory
+
+
+case('tracer/span_disabled')(_tracer_case(False))
+case('tracer/span_enabled')(_tracer_case(True))
+
+
+def measure(func: Callable[[], object]) -> float:
+    """返回单次调用的耗时（纳秒）"""
+    func()
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= TARGET_ROUND_SEC / 4 or iterations >= 1 << 20:
+            break
+        iterations *= 4
+    iterations = max(1, int(iterations * TARGET_ROUND_SEC / max(elapsed, 1e-9)))
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = min(best, (time.perf_counter() - start) / iterations)
+    return best * 1e9
+
+
+def calibration():
+    """固定的校准负载：一段纯 Python 循环加一次 NumPy 运算，与被测用例的构成接近"""
+    values = np.arange(4096, dtype=np.float32)
+
+    def run():
+        total = 0
+        for i in range(2000):
+            total += i & 0xff
+        return total + float(np.dot(values, values))
+    return run
+
+
+def run_cases(pattern: str = '') -> Dict[str, float]:
+    results = {}
+    for name, factory in CASES.items():
+        if pattern and pattern not in name:
+            continue
+        results[name] = measure(factory())
+        print(f'{name:<36} {format_ns(results[name]):>12}')
+    return results
+
+
+def format_ns(ns: float) -> str:
+    if ns >= 1e6:
+        return f'{ns / 1e6:.2f} ms'
+    if ns >= 1e3:
+        return f'{ns / 1e3:.2f} us'
+    return f'{ns:.0f} ns'
+
+
+def compare(results: Dict[str, float], baseline: dict, threshold: float, retries: int = 2) -> List[Tuple[str, float]]:
+    """打印对比结果，返回超过阈值的回归 [(用例名, 变化比例)]
+
+    当前耗时先按校准负载换算到基线机器状态，超过阈值的用例最多重测 retries 次取最快值。
+    """
+    cases = baseline['cases']
+    scale = baseline['calibration'] / measure(calibration())
+    print(f'\ncalibration scale {scale:.2f}')
+    regressions = []
+    print(f'\n{"case":<36} {"baseline":>12} {"current":>12} {"change":>8}')
+    for name, current in results.items():
+        if name not in cases:
+            print(f'{name:<36} {"-":>12} {format_ns(current * scale):>12} {"new":>8}')
+            continue
+        change = current * scale / cases[name] - 1
+        for _ in range(retries):
+            if change <= threshold:
+                break
+            current = min(current, measure(CASES[name]()))
+            change = current * scale / cases[name] - 1
+        flag = '  REGRESSION' if change > threshold else ''
+        print(f'{name:<36} {format_ns(cases[name]):>12} {format_ns(current * scale):>12} {change:>+8.1%}{flag}')
+        if change > threshold:
+            regressions.append((name, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['run', 'compare', 'list'])
+    parser.add_argument('-k', '--filter', default='', help='only run cases whose name contains this')
+    parser.add_argument('--save', help='write results to this baseline file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown ratio before failing')
+    args = parser.parse_args()
+    logger.remove()
+
+    if args.command == 'list':
+        print('\n'.join(CASES))
+        return
+    results = run_cases(args.filter)
+    if args.save:
+        baseline = {'cases': {}}
+        if os.path.exists(args.save):
+            with open(args.save, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        # 保存时把已有用例换算到本次的校准值下，部分更新也保持一致
+        calibration_ns = measure(calibration())
+        scale = calibration_ns / baseline.get('calibration', calibration_ns)
+        baseline['cases'] = {name: round(ns * scale, 1) for name, ns in baseline['cases'].items()}
+        baseline['cases'].update({name: round(ns, 1) for name, ns in results.items()})
+        baseline['calibration'] = round(calibration_ns, 1)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'saved {len(results)} results to {args.save}')
+    if args.command == 'compare':
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) beyond {args.threshold:.0%}')
+            sys.exit(1)
+        print('\nno regressions')
+
+
+if __name__ == '__main__':
+    main()
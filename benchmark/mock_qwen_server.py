@@ -0,0 +1,206 @@
+"""本地 Qwen 实时翻译协议的替身服务器
+
+按 qwen3-livetranslate-flash-realtime 的事件格式应答，不需要网络和 API Key：
+    - 收到音频后按能量做简单的断句：有声音时每 partial_every 个包推送一次 response.text.text，
+      连续静音超过 silence_ms 后推送 response.text.done
+    - 断句时推送 input_audio_buffer.speech_started / speech_stopped，带会话内的音频毫秒偏移
+    - 所有应答都延迟 latency 秒发送，用来模拟不同的服务端延迟；每句话有 spike_prob 的概率再多延迟
+      spike_latency 秒，模拟偶发的延迟尖峰。应答按顺序发出，尖峰会拖慢其后的应答，与真实连接一致
+    - 译文为 "sentence <n> <语音时长>"，便于断言
+    - 收到 input_audio_buffer.commit 时立即结束当前句子，不等 silence_ms
+    - max_session 大于 0 时连接 max_session 秒后由服务端关闭，模拟真实服务的会话时长上限
+
+把 .config.yaml 中的 translator.ws_url 指向 ws://127.0.0.1:<port> 即可让 QwenTranslator 连接本服务器。
+
+用法: python -m benchmark.mock_qwen_server [--port 8765] [--latency 0.2] [--spike-prob 0.2 --spike-latency 1.5]
+                                           [--max-session 600]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import threading
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+from websockets.asyncio.server import serve
+
+SAMPLE_RATE = 16000
+
+
+class MockSession:
+    def __init__(self, server: 'MockQwenServer', websocket):
+        self.server = server
+        self.websocket = websocket
+        self.item_count = 0
+        self.item_id: Optional[str] = None
+        self.voiced_samples = 0
+        self.silent_samples = 0
+        self.packets = 0
+        self.session_samples = 0
+        self.extra_latency = 0.0
+        self.last_send_at = 0.0
+        self.outbox: Optional[asyncio.Queue] = None
+
+    def send_later(self, message: dict):
+        loop = asyncio.get_running_loop()
+        send_at = max(loop.time() + self.server.latency + self.extra_latency, self.last_send_at)
+        self.last_send_at = send_at
+        self.outbox.put_nowait((send_at, message))
+
+    async def _sender(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            send_at, message = await self.outbox.get()
+            await asyncio.sleep(max(0.0, send_at - loop.time()))
+            try:
+                await self.websocket.send(json.dumps(message))
+            except Exception:
+                return
+
+    def text(self) -> str:
+        return f'sentence {self.item_count} {self.voiced_samples / SAMPLE_RATE:.1f}s'
+
+    def on_audio(self, audio: bytes):
+        samples = np.frombuffer(audio, dtype=np.int16)
+        self.server.received_samples += len(samples)
+        offset_ms = self.session_samples * 1000 // SAMPLE_RATE
+        self.session_samples += len(samples)
+        rms = np.sqrt(np.mean(samples.astype(np.float32) ** 2)) / 32767.0 if len(samples) else 0
+        if rms >= 0.001:
+            if self.item_id is None:
+                self.extra_latency = (self.server.spike_latency
+                                      if self.server.random.random() < self.server.spike_prob else 0.0)
+                self.item_count += 1
+                self.item_id = f'item_{self.item_count}'
+                self.send_later({'type': 'input_audio_buffer.speech_started', 'item_id': self.item_id,
+                                 'audio_start_ms': offset_ms})
+            self.voiced_samples += len(samples)
+            self.silent_samples = 0
+            self.packets += 1
+            if self.packets % self.server.partial_every == 0:
+                self.send_later({'type': 'response.text.text', 'item_id': self.item_id, 'text': self.text()})
+        elif self.item_id is not None:
+            if self.silent_samples == 0:
+                self.send_later({'type': 'input_audio_buffer.speech_stopped', 'item_id': self.item_id,
+                                 'audio_end_ms': offset_ms})
+            self.silent_samples += len(samples)
+            if self.silent_samples >= self.server.silence_ms * SAMPLE_RATE / 1000:
+                self.finish()
+
+    def finish(self):
+        self.send_later({'type': 'response.text.done', 'item_id': self.item_id, 'text': self.text()})
+        self.item_id = None
+        self.voiced_samples = 0
+        self.packets = 0
+
+    def on_commit(self):
+        if self.item_id is None:
+            return
+        if self.silent_samples == 0:
+            self.send_later({'type': 'input_audio_buffer.speech_stopped', 'item_id': self.item_id,
+                             'audio_end_ms': self.session_samples * 1000 // SAMPLE_RATE})
+        self.finish()
+
+    async def _expire(self):
+        await asyncio.sleep(self.server.max_session)
+        await self.websocket.close(1000, 'session expired')
+
+    async def handle(self):
+        self.outbox = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        sender = loop.create_task(self._sender())
+        expire = loop.create_task(self._expire()) if self.server.max_session else None
+        await self.websocket.send(json.dumps({'type': 'session.created'}))
+        try:
+            async for message in self.websocket:
+                data = json.loads(message)
+                event_type = data.get('type')
+                if event_type == 'session.update':
+                    await self.websocket.send(json.dumps({'type': 'session.updated',
+                                                          'session': data.get('session')}))
+                elif event_type == 'input_audio_buffer.append':
+                    self.on_audio(base64.b64decode(data['audio']))
+                elif event_type == 'input_audio_buffer.commit':
+                    self.on_commit()
+        finally:
+            sender.cancel()
+            if expire:
+                expire.cancel()
+
+
+class MockQwenServer:
+    """在后台线程中运行的替身服务器，也可以直接作为脚本运行"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 silence_ms: int = 400, partial_every: int = 2, spike_prob: float = 0.0,
+                 spike_latency: float = 0.0, seed: int = 0, max_session: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.silence_ms = silence_ms
+        self.partial_every = partial_every
+        self.spike_prob = spike_prob
+        self.spike_latency = spike_latency
+        self.random = random.Random(seed)
+        self.max_session = max_session
+        self.received_samples = 0
+        self.connections = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.ready = threading.Event()
+        self._stop: Optional[asyncio.Event] = None
+
+    @property
+    def url(self) -> str:
+        return f'ws://{self.host}:{self.port}'
+
+    async def _handler(self, websocket):
+        self.connections += 1
+        try:
+            await MockSession(self, websocket).handle()
+        except Exception as e:
+            logger.debug(f'mock session closed: {e}')
+
+    async def serve(self):
+        self._stop = asyncio.Event()
+        async with serve(self._handler, self.host, self.port) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self.loop = asyncio.get_running_loop()
+            self.ready.set()
+            await self._stop.wait()
+
+    def start(self) -> 'MockQwenServer':
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.serve()), daemon=True)
+        self.thread.start()
+        self.ready.wait(5)
+        return self
+
+    def stop(self):
+        if self.loop and self._stop:
+            self.loop.call_soon_threadsafe(self._stop.set)
+        if self.thread:
+            self.thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added before every response')
+    parser.add_argument('--silence-ms', type=int, default=400)
+    parser.add_argument('--spike-prob', type=float, default=0.0, help='probability of a latency spike per sentence')
+    parser.add_argument('--spike-latency', type=float, default=0.0, help='extra seconds of a latency spike')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-session', type=float, default=0.0, help='close every connection after this many seconds')
+    args = parser.parse_args()
+    server = MockQwenServer(args.host, args.port, args.latency, args.silence_ms, spike_prob=args.spike_prob,
+                            spike_latency=args.spike_latency, seed=args.seed, max_session=args.max_session)
+    print(f'mock qwen server listening on ws://{args.host}:{args.port}')
+    asyncio.run(server.serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""会话回放：在录制的同一份流量上对比流水线的耗时
+
+record  用合成音频和本地替身服务器录制一段会话（等同于在配置中打开 capture.enabled），得到可以回放的样例
+run     不连网络回放录制文件：按录制时的配置重建 AudioTranslateService，音频按时间线交给流水线，
+        服务端消息交给 ReplayTranslator 重新解析。统计回放的墙钟时间、CPU 时间，并核对整句结果与录制时一致。
+        --speed 0（默认）不等待、尽快回放，用于比较 CPU 开销；--speed 1 按录制的节奏回放，延迟数值才有意义
+
+线上录制的文件同样可以用 run 回放，录制时打开 capture.source_audio 才会包含声道处理和重采样。
+
+用法:
+    python -m benchmark.replay record [--seconds 30] [--source-audio] [--dir ./captures]
+    python -m benchmark.replay run captures/capture_xxx.bin [--speed 0] [--repeat 3]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+from loguru import logger
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def write_config(workdir: str, values: dict):
+    """values 的键为 Config 的点分路径，写成嵌套的 .config.yaml"""
+    data = {}
+    for key, value in values.items():
+        current = data
+        parts = key.split('.')
+        for part in parts[:-1]:
+            current = current.setdefault(part, {})
+        current[parts[-1]] = value
+    with open(os.path.join(workdir, '.config.yaml'), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(data, f, allow_unicode=True)
+
+
+def record(args):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-m', 'benchmark.mock_qwen_server', '--port', str(port)],
+                              env={**os.environ, 'PYTHONPATH': os.getcwd()}, stdout=subprocess.DEVNULL)
+    directory = os.path.abspath(args.dir)
+    # Config 从当前目录读取 .config.yaml，切到临时目录使用基准专用配置
+    sys.path.insert(0, os.getcwd())
+    workdir = tempfile.mkdtemp(prefix='replay_record_')
+    write_config(workdir, {
+        'translator.model': 'qwen', 'translator.api_key': 'benchmark', 'translator.target_language': 'zh',
+        'translator.ws_url': f'ws://127.0.0.1:{port}', 'audio.device_monitor': False,
+        'capture.enabled': True, 'capture.dir': directory, 'capture.source_audio': args.source_audio,
+    })
+    os.chdir(workdir)
+    from service.audio_source import SyntheticSource
+    from service.audio_translate_service import AudioTranslateService
+
+    try:
+        time.sleep(1.0)
+        service = AudioTranslateService()
+        service.start([SyntheticSource('loopback', frame_ms=200, speed=1.0)])
+        path = service.capture.path
+        time.sleep(args.seconds)
+        service.stop()
+    finally:
+        server.terminate()
+        server.wait()
+    print(f'recorded {os.path.getsize(path) / 1024:.0f} KiB to {path}')
+
+
+def run(args):
+    path = os.path.abspath(args.path)
+    sys.path.insert(0, os.getcwd())
+    from service.session_capture import KIND_CAPTURE, KIND_SEND, ReplaySession
+
+    session = ReplaySession(path, speed=args.speed)
+    values = dict(session.config)
+    values.update({'translator.model': 'replay', 'translator.replay.path': path, 'audio.device_monitor': False,
+                   'capture.enabled': False})
+    if not session.has_source_audio:
+        # 只有发送的音频时每个录制的会话单独回放，不再混音
+        values['audio.mix_mode'] = 'separate'
+    workdir = tempfile.mkdtemp(prefix='replay_run_')
+    write_config(workdir, values)
+    os.chdir(workdir)
+    from service.audio_translate_service import AudioTranslateService
+
+    kind = KIND_CAPTURE if session.has_source_audio else KIND_SEND
+    audio_bytes = sum(len(record.payload) for record in session.records if record.kind == kind)
+    duration = session.records[-1].t if session.records else 0.0
+    expected = session.expected_events()
+    print(f'{os.path.basename(path)}: {len(session.records)} records, {duration:.1f}s, '
+          f'{audio_bytes / 1024:.0f} KiB {"capture" if session.has_source_audio else "send"} audio, '
+          f'{len(expected)} recorded finals')
+    for index in range(args.repeat):
+        events = []
+        session.install()
+        service = AudioTranslateService()
+        service.register_callback(events.append)
+        service.start(session.audio_sources())
+        sent = [translator for pipeline in service.pipelines.values() for translator in pipeline.translators.values()]
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        session.run(service)
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        sent_bytes = sum(translator.sent_bytes for translator in sent)
+        service.stop()
+        session.uninstall()
+        finals = [(event.source, event.target_language, event.sentence_id, event.sentence)
+                  for event in events if event.is_sentence_ended]
+        print(f'run {index + 1}: wall {wall:.3f}s ({duration / max(wall, 1e-9):.0f}x realtime)  cpu {cpu:.3f}s  '
+              f'sent {sent_bytes / 1024:.0f} KiB  finals {len(finals)}  match: {finals == expected}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record')
+    record_parser.add_argument('--seconds', type=float, default=30)
+    record_parser.add_argument('--source-audio', action='store_true', help='also record the raw capture audio')
+    record_parser.add_argument('--dir', default='./captures')
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('path')
+    run_parser.add_argument('--speed', type=float, default=0, help='0 replays as fast as possible')
+    run_parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    if args.command == 'record':
+        record(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""长时间运行的浸泡测试：内存、线程和句柄是否随运行时间增长
+
+用合成音频（SyntheticSource 按 speed 倍速输出）驱动完整的 AudioTranslateService，翻译器连接本地替身服务器
+（单独的子进程，不计入本进程的内存）。事件经 EventBus 按主窗口的方式分发：SubTitleData 按句设置和延迟删除、
+TranscriptRecorder 写字幕文件（按大小切分）、LatencyMetrics 统计延迟；loguru 写 DEBUG 日志并按大小轮转。
+Windows 下加 --overlay 时还会按显示定时器的节奏重绘 SubtitleRect 字幕窗口。
+
+定时采样：
+    rss        进程常驻内存（Linux 读 /proc，Windows 用 GetProcessMemoryInfo）
+    traced     tracemalloc 统计的 Python 对象内存
+    threads    存活的 Python 线程数
+    gdi/user   GDI / USER 对象数（仅 Windows）
+预热（前 10% 的时间）结束时记录基线和 tracemalloc 快照。最后三个采样的最小值相对基线的增长超过限制时
+以退出码 1 结束，并打印增长最多的分配位置。字幕的延迟删除时间等按倍速缩短，与实际运行时的节奏一致。
+
+用法: python -m benchmark.soak [--hours 24] [--speed 240] [--overlay]
+"""
+import argparse
+import ctypes
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import List, Optional
+
+from loguru import logger
+
+MB = 1024 * 1024
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def rss_bytes() -> Optional[int]:
+    if sys.platform == 'win32':
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', ctypes.c_ulong), ('PageFaultCount', ctypes.c_ulong),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+def gui_resources() -> Optional[tuple]:
+    """(GDI 对象数, USER 对象数)，非 Windows 返回 None"""
+    if sys.platform != 'win32':
+        return None
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    return ctypes.windll.user32.GetGuiResources(process, 0), ctypes.windll.user32.GetGuiResources(process, 1)
+
+
+class Sample:
+    __slots__ = ('elapsed', 'rss', 'traced', 'threads', 'gui', 'sentences')
+
+    def __init__(self, elapsed: float, sentences: int):
+        self.elapsed = elapsed
+        self.rss = rss_bytes()
+        self.traced = tracemalloc.get_traced_memory()[0]
+        self.threads = threading.active_count()
+        self.gui = gui_resources()
+        self.sentences = sentences
+
+    def row(self, speed: float) -> str:
+        rss = f'{self.rss / MB:.1f}' if self.rss is not None else '-'
+        gdi, user = self.gui if self.gui else ('-', '-')
+        return (f'{self.elapsed * speed / 3600:>8.2f} {rss:>9} {self.traced / MB:>9.1f} {self.threads:>7} '
+                f'{gdi:>5} {user:>5} {self.sentences:>9}')
+
+
+class SoakApp:
+    """按主窗口的方式消费翻译事件，只是没有 Qt"""
+
+    def __init__(self, service, suspend_time: float, transcript_dir: str, overlay: bool):
+        from model.subtitle_data import SubTitleData
+        from service.latency_metrics import LatencyMetrics
+        from service.transcript_recorder import TranscriptRecorder
+
+        self.service = service
+        self.suspend_time = suspend_time
+        self.lanes = {}
+        self.sentences = 0
+        self.new_lane = SubTitleData
+        # 小的切分大小，长时间运行时会切出很多文件
+        self.recorder = TranscriptRecorder(transcript_dir, max_bytes=256 * 1024, fsync='never')
+        self.metrics = LatencyMetrics()
+        self.subscriptions = []
+        self.rect = None
+        if overlay:
+            from view.subtitle_rect import SubtitleRect
+
+            self.rect = SubtitleRect(24, 200, 800)
+
+    def start(self):
+        self.recorder.start()
+        bus = self.service.event_bus
+        self.subscriptions = [bus.subscribe(self.on_translate_events, window=0.05, name='soak'),
+                              bus.subscribe(self.on_record_events, window=1.0, name='transcript'),
+                              bus.subscribe(self.metrics.on_events, window=1.0, name='latency')]
+
+    def on_translate_events(self, events):
+        for event in events:
+            logger.debug('translate_event is {}'.format(event))
+            subtitle_data = self.lanes.setdefault((event.source, event.target_language), self.new_lane())
+            subtitle_data.set(event.sentence_id, event.sentence)
+            if event.is_sentence_ended:
+                self.sentences += 1
+                subtitle_data.delay_del(event.sentence_id, self.suspend_time)
+
+    def on_record_events(self, events):
+        for event in events:
+            self.recorder.on_translate_event(event)
+
+    def update_display(self):
+        texts = []
+        for subtitle_data in list(self.lanes.values()):
+            texts.extend(subtitle_data.get_list())
+        if self.rect and texts:
+            self.rect.draw(texts)
+
+    def stop(self):
+        for subscription in self.subscriptions:
+            self.service.event_bus.unsubscribe(subscription)
+        self.recorder.stop()
+        if self.rect:
+            self.rect.clean()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=float, default=24, help='simulated running time')
+    parser.add_argument('--speed', type=float, default=240, help='audio speed relative to real time')
+    parser.add_argument('--samples', type=int, default=40)
+    parser.add_argument('--frame-ms', type=float, default=200)
+    parser.add_argument('--suspend-time', type=float, default=5, help='subtitle.suspend_time in simulated seconds')
+    parser.add_argument('--overlay', action='store_true', help='also redraw the subtitle window (Windows only)')
+    parser.add_argument('--max-rss-mb', type=float, default=40)
+    parser.add_argument('--max-traced-mb', type=float, default=10)
+    parser.add_argument('--max-threads', type=int, default=4)
+    parser.add_argument('--max-gdi', type=int, default=50)
+    parser.add_argument('--top', type=int, default=10, help='number of allocation sites to print')
+    args = parser.parse_args()
+    if args.overlay and sys.platform != 'win32':
+        parser.error('--overlay needs Windows')
+
+    sys.path.insert(0, os.getcwd())
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-m', 'benchmark.mock_qwen_server', '--port', str(port)],
+                              env={**os.environ, 'PYTHONPATH': os.getcwd()}, stdout=subprocess.DEVNULL)
+    # Config 从当前目录读取 .config.yaml，切到临时目录使用浸泡测试专用配置
+    workdir = tempfile.mkdtemp(prefix='soak_')
+    with open(os.path.join(workdir, '.config.yaml'), 'w', encoding='utf-8') as f:
+        f.write(f'translator:\n  model: qwen\n  api_key: benchmark\n  target_language: zh\n'
+                f'  ws_url: ws://127.0.0.1:{port}\naudio:\n  frame_ms: {args.frame_ms}\n')
+    os.chdir(workdir)
+    logger.remove()
+    logger.add(os.path.join(workdir, 'logs', 'app_{time:YYYY-MM-DD}.log'), rotation='1 MB', retention=3,
+               encoding='utf-8', level='DEBUG')
+
+    from service.audio_source import SyntheticSource
+    from service.audio_translate_service import AudioTranslateService
+
+    tracemalloc.start()
+    duration = args.hours * 3600 / args.speed
+    warmup = duration * 0.1
+    interval = duration / args.samples
+    samples: List[Sample] = []
+    try:
+        time.sleep(1.0)
+        threads_before = threading.active_count()
+        service = AudioTranslateService()
+        app = SoakApp(service, args.suspend_time / args.speed, os.path.join(workdir, 'transcripts'), args.overlay)
+        app.start()
+        service.start([SyntheticSource('loopback', frame_ms=args.frame_ms, speed=args.speed)])
+        print(f'soak: {args.hours:g}h simulated in {duration / 60:.1f} min, workdir {workdir}')
+        print(f'{"hours":>8} {"rss MB":>9} {"traced MB":>9} {"threads":>7} {"gdi":>5} {"user":>5} {"sentences":>9}')
+
+        started = time.perf_counter()
+        baseline = None
+        snapshot = None
+        next_sample = started + interval
+        # 显示定时器 200ms 一次，按倍速缩短但不低于 10ms
+        display_interval = max(0.2 / args.speed, 0.01)
+        while True:
+            now = time.perf_counter()
+            if now - started >= duration:
+                break
+            app.update_display()
+            if now >= next_sample:
+                next_sample += interval
+                sample = Sample(now - started, app.sentences)
+                samples.append(sample)
+                print(sample.row(args.speed), flush=True)
+                if baseline is None and now - started >= warmup:
+                    baseline = sample
+                    snapshot = tracemalloc.take_snapshot()
+            time.sleep(display_interval)
+
+        final_snapshot = tracemalloc.take_snapshot()
+        service.stop()
+        app.stop()
+        time.sleep(args.suspend_time / args.speed + 0.5)
+        threads_after = threading.active_count()
+    finally:
+        server.terminate()
+        server.wait()
+
+    tail = samples[-3:]
+    if baseline is None or not tail:
+        print('not enough samples, increase --hours or --samples')
+        sys.exit(1)
+    failures = []
+
+    def check(name: str, growth: float, limit: float, unit: str):
+        flag = '  FAIL' if growth > limit else ''
+        print(f'{name:<8} {growth:>+10.1f} {unit} (limit {limit:g}){flag}')
+        if growth > limit:
+            failures.append(name)
+
+    print(f'\ngrowth since warmup ({baseline.elapsed * args.speed / 3600:.1f}h), '
+          f'{tail[-1].sentences} sentences, {app.metrics.summary()}')
+    if baseline.rss is not None:
+        check('rss', (min(s.rss for s in tail) - baseline.rss) / MB, args.max_rss_mb, 'MB')
+    check('traced', (min(s.traced for s in tail) - baseline.traced) / MB, args.max_traced_mb, 'MB')
+    check('threads', min(s.threads for s in tail) - baseline.threads, args.max_threads, '')
+    if baseline.gui is not None:
+        check('gdi', min(s.gui[0] for s in tail) - baseline.gui[0], args.max_gdi, '')
+    print(f'threads before start {threads_before}, after stop {threads_after}')
+
+    print(f'\ntop {args.top} allocation sites by growth since warmup:')
+    for stat in final_snapshot.compare_to(snapshot, 'lineno')[:args.top]:
+        print(f'  {stat.size_diff / 1024:>+10.1f} KiB {stat.count_diff:>+8} blocks  {stat.traceback}')
+
+    if failures:
+        print(f'\nsoak failed: {", ".join(failures)} grew beyond limits')
+        sys.exit(1)
+    print('\nsoak passed')
+
+
+if __name__ == '__main__':
+    main()
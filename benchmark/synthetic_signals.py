@@ -0,0 +1,124 @@
+"""语音 / 音乐判别的合成测试信号，全部由固定种子生成，不依赖音频文件
+
+    speech        类似语音：按音节生成的元音（基频带抖动和滑动的谐波，按共振峰加权）和清辅音（带通噪声），
+                  音节约 4 个/秒，词间短停顿，句间 0.3~0.8 秒停顿
+    music         和弦进行：每个和弦 0.5~1 秒，谐波随时间衰减的乐音叠加，可选每拍一次的鼓点
+    noise         平稳的粉红噪声，例如风扇、空调
+    speech_music  语音叠加在音乐上（语音比音乐高 snr_db），应判为语音
+
+每个生成函数返回 (int16 单声道 PCM, 每个样本是否为语音的布尔数组)。
+"""
+from typing import Tuple
+
+import numpy as np
+
+# 几个元音的前三个共振峰（Hz）
+VOWELS = np.array([[730, 1090, 2440], [270, 2290, 3010], [300, 870, 2240], [530, 1840, 2480], [570, 840, 2410],
+                   [660, 1720, 2410], [440, 1020, 2240]], dtype=np.float32)
+FORMANT_BANDWIDTH = np.array([90, 110, 170], dtype=np.float32)
+
+
+def _to_pcm(signal: np.ndarray, peak: float = 0.5) -> np.ndarray:
+    scale = peak / max(float(np.max(np.abs(signal))), 1e-9)
+    return np.clip(signal * scale * 32767, -32768, 32767).astype(np.int16)
+
+
+def _vowel(rng: np.random.Generator, seconds: float, rate: int, f0: float) -> np.ndarray:
+    n = int(seconds * rate)
+    t = np.arange(n) / rate
+    # 基频在音节内滑动并带一点抖动
+    contour = f0 * (1 + rng.uniform(-0.15, 0.15) * t / seconds) * (1 + 0.01 * rng.standard_normal(n).cumsum() / np.sqrt(n))
+    phase = 2 * np.pi * np.cumsum(contour) / rate
+    formants = VOWELS[rng.integers(len(VOWELS))]
+    harmonics = np.arange(1, int(4000 / f0) + 1, dtype=np.float32)
+    frequencies = harmonics * f0
+    weights = np.exp(-(((frequencies[:, None] - formants[None, :]) / FORMANT_BANDWIDTH[None, :]) ** 2)).sum(axis=1)
+    weights += 0.02 / harmonics
+    signal = (weights[:, None] * np.sin(harmonics[:, None] * phase[None, :])).sum(axis=0)
+    envelope = np.sin(np.pi * np.arange(n) / n) ** 0.7
+    return signal * envelope
+
+
+def _fricative(rng: np.random.Generator, seconds: float, rate: int) -> np.ndarray:
+    n = int(seconds * rate)
+    spectrum = np.fft.rfft(rng.standard_normal(n))
+    frequencies = np.fft.rfftfreq(n, 1 / rate)
+    spectrum *= (frequencies > 2500) & (frequencies < min(7000, rate / 2))
+    envelope = np.sin(np.pi * np.arange(n) / n)
+    return np.fft.irfft(spectrum, n) * envelope * 0.3
+
+
+def speech(seconds: float, rate: int = 16000, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    pieces, labels = [], []
+    total = int(seconds * rate)
+    f0 = rng.uniform(100, 220)
+    while sum(len(piece) for piece in pieces) < total:
+        # 一句话 4~12 个音节，音节之间偶尔有词间停顿
+        for _ in range(rng.integers(4, 13)):
+            if rng.random() < 0.25:
+                piece = _fricative(rng, rng.uniform(0.05, 0.1), rate)
+                pieces.append(piece)
+                labels.append(np.ones(len(piece), dtype=bool))
+            piece = _vowel(rng, rng.uniform(0.12, 0.25), rate, f0 * rng.uniform(0.9, 1.1))
+            pieces.append(piece * rng.uniform(0.5, 1.0))
+            labels.append(np.ones(len(piece), dtype=bool))
+            gap = np.zeros(int(rng.uniform(0.02, 0.12) * rate))
+            pieces.append(gap)
+            labels.append(np.ones(len(gap), dtype=bool))
+        pause = np.zeros(int(rng.uniform(0.3, 0.8) * rate))
+        pieces.append(pause)
+        labels.append(np.zeros(len(pause), dtype=bool))
+    signal = np.concatenate(pieces)[:total]
+    # 句间停顿也有一点底噪
+    signal = signal / max(float(np.max(np.abs(signal))), 1e-9) + 0.001 * rng.standard_normal(len(signal))
+    return _to_pcm(signal), np.concatenate(labels)[:total]
+
+
+def music(seconds: float, rate: int = 16000, seed: int = 0, drums: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    total = int(seconds * rate)
+    signal = np.zeros(total)
+    position = 0
+    root = rng.uniform(110, 220)
+    while position < total:
+        length = min(int(rng.choice([0.5, 0.75, 1.0]) * rate), total - position)
+        t = np.arange(length) / rate
+        chord = root * 2 ** (np.array([0, 4, 7, rng.choice([11, 12])]) / 12) * 2 ** (rng.integers(-5, 6) / 12)
+        for frequency in chord:
+            harmonics = np.arange(1, 8)
+            decay = np.exp(-t[None, :] * (1.5 + harmonics[:, None]))
+            signal[position:position + length] += (np.sin(2 * np.pi * frequency * harmonics[:, None] * t[None, :])
+                                                   * decay / harmonics[:, None]).sum(axis=0)
+        attack = np.minimum(1.0, t / 0.02)
+        signal[position:position + length] *= attack
+        position += length
+    if drums:
+        beat = int(0.5 * rate)
+        kick = np.exp(-np.arange(int(0.1 * rate)) / (0.02 * rate))
+        for start in range(0, total - len(kick), beat):
+            signal[start:start + len(kick)] += (np.sin(2 * np.pi * 60 * np.arange(len(kick)) / rate)
+                                                + 0.3 * rng.standard_normal(len(kick))) * kick
+    return _to_pcm(signal), np.zeros(total, dtype=bool)
+
+
+def noise(seconds: float, rate: int = 16000, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    total = int(seconds * rate)
+    spectrum = np.fft.rfft(rng.standard_normal(total))
+    frequencies = np.fft.rfftfreq(total, 1 / rate)
+    spectrum /= np.sqrt(np.maximum(frequencies, 20.0))
+    return _to_pcm(np.fft.irfft(spectrum, total), 0.2), np.zeros(total, dtype=bool)
+
+
+def speech_music(seconds: float, rate: int = 16000, seed: int = 0, snr_db: float = 6.0) -> Tuple[np.ndarray, np.ndarray]:
+    voice, labels = speech(seconds, rate, seed)
+    background, _ = music(seconds, rate, seed + 1)
+    voice = voice.astype(np.float32)
+    background = background.astype(np.float32)
+    voiced = voice[labels]
+    gain = np.sqrt(np.mean(voiced ** 2) / max(float(np.mean(background ** 2)), 1e-9)) * 10 ** (-snr_db / 20)
+    return _to_pcm(voice + background * gain), labels
+
+
+SIGNALS = {'speech': speech, 'music': music, 'noise': noise, 'speech_music': speech_music}
@@ -10,6 +10,8 @@ class Config:
     _lock = threading.Lock()
     _last_modified = 0
     _config_data: Dict[str, Any] = {}
+    # 命令行等在运行时指定的值，优先于配置文件，不写回文件，重新加载配置文件后仍然有效
+    _overrides: Dict[str, Any] = {}
     _timer = None
 
     def __new__(cls):
@@ -67,6 +69,8 @@ class Config:
 
     def get(self, key: str, default=None):
         """获取配置值"""
+        if key in self._overrides:
+            return self._overrides[key]
         keys = key.split('.')
         value = self._config_data
         for k in keys:
@@ -80,6 +84,10 @@ class Config:
         """获取所有配置"""
         return self._config_data.copy()
 
+    def override(self, key: str, value: Any):
+        """在内存中覆盖一个配置项（点分隔的完整键），只影响 get 以该键读取的结果"""
+        self._overrides[key] = value
+
     def reload(self):
         """手动重新加载配置文件"""
         self._load_config()
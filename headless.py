@@ -0,0 +1,120 @@
+"""无界面运行：采集、翻译，把字幕按行写成 JSON（JSONL）
+
+不导入 PyQt6 和字幕窗口，适合服务器和脚本使用。日志写到 stderr，stdout 只有字幕：
+    {"type": "final", "source": "loopback", "target_language": "zh", "sentence_id": 3, "text": "...",
+     "time": ..., "audio_start": ..., "audio_end": ..., "latency": 0.42}
+type 为 final / partial，开启 endpoint 时还有 endpoint（本地检测到停顿，该句提前结束）。
+收到 SIGTERM / SIGINT 后停止采集、关闭翻译会话，把关闭过程中到达的最后几句也写出后退出。
+命令行参数覆盖 .config.yaml 中的对应配置，其余配置（api_key 等）仍从配置文件读取。
+
+用法:
+    python headless.py --source loopback --model qwen --target zh en
+    python headless.py --source synthetic --finals-only --unix /tmp/subtitles.sock
+"""
+import argparse
+import signal
+import sys
+import threading
+import time
+
+started = time.perf_counter()
+
+from loguru import logger
+
+from config import Config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', nargs='+', help='音频源：loopback / microphone / synthetic，默认使用配置')
+    parser.add_argument('--model', help='翻译模型（translator.model），默认使用配置')
+    parser.add_argument('--target', nargs='+', help='目标语言，可以有多个')
+    parser.add_argument('--source-language', help='源语言，默认使用配置')
+    parser.add_argument('--mix', action='store_true', help='多个音频源混音后翻译')
+    parser.add_argument('--isolation', choices=['thread', 'process'], help='音频处理和翻译的运行方式')
+    parser.add_argument('--finals-only', action='store_true', help='只输出整句，不输出局部结果')
+    parser.add_argument('--unix', metavar='PATH', help='在该 Unix 域套接字上输出，而不是 stdout')
+    parser.add_argument('--seconds', type=float, help='运行指定秒数后退出')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    config = Config()
+    overrides = {'audio.sources': args.source, 'translator.model': args.model,
+                 'translator.target_languages': args.target, 'translator.source_language': args.source_language,
+                 'audio.mix_mode': 'mix' if args.mix else None, 'audio.isolation': args.isolation}
+    for key, value in overrides.items():
+        if value is not None:
+            config.override(key, value)
+
+    from service import span_tracer
+    from service.jsonl_output import JsonlOutput, UnixSocketOutput
+
+    tracer = span_tracer.configure()
+
+    if config.get('audio.isolation', 'thread') == 'process':
+        from service.process_translate_service import ProcessTranslateService
+        service = ProcessTranslateService()
+    else:
+        from service.audio_translate_service import AudioTranslateService
+        service = AudioTranslateService()
+    partials = not args.finals_only
+    output = UnixSocketOutput(args.unix, partials) if args.unix else JsonlOutput(sys.stdout.buffer, partials)
+    service.event_bus.subscribe(output.on_events, window=0.05, name='jsonl')
+    broadcast = None
+    if config.get('broadcast.enabled', False):
+        from service.subtitle_broadcast import SubtitleBroadcastServer
+        broadcast = SubtitleBroadcastServer.from_config()
+        broadcast.start()
+        service.event_bus.subscribe(broadcast.on_events, window=0.05, name='broadcast')
+
+    stop = threading.Event()
+
+    def on_signal(signum, frame):
+        logger.info(f'Received signal {signum}, stopping')
+        stop.set()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    if hasattr(signal, 'SIGBREAK'):
+        # Windows 控制台的 Ctrl+Break
+        signal.signal(signal.SIGBREAK, on_signal)
+    if tracer.enabled and hasattr(signal, 'SIGUSR1'):
+        # kill -USR1 <pid> 导出 trace，不停止翻译
+        signal.signal(signal.SIGUSR1, lambda signum, frame: tracer.dump())
+    if config.get('archive.enabled', False) and hasattr(signal, 'SIGUSR2'):
+        # kill -USR2 <pid> 重新翻译最近 archive.recaption_seconds 秒的音频，结果的 source 为 "<音频源>:recaption"
+        signal.signal(signal.SIGUSR2, lambda signum, frame: service.recaption(
+            config.get('archive.recaption_seconds', 30)))
+
+    if config.get('translator.rotation.enabled', False) and hasattr(signal, 'SIGHUP'):
+        # kill -HUP <pid> 立即轮换翻译会话，先连上新会话，在句子边界切换
+        signal.signal(signal.SIGHUP, lambda signum, frame: service.rotate_sessions())
+
+    exit_code = 0
+    try:
+        service.start()
+        logger.info(f'Headless translation running, ready in {(time.perf_counter() - started) * 1000:.0f}ms')
+        # 带超时的等待，信号处理函数才能在主线程上及时执行
+        deadline = None if args.seconds is None else time.monotonic() + args.seconds
+        while not stop.wait(0.5):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+    except Exception as e:
+        logger.exception(f'Headless translation failed: {e}')
+        exit_code = 1
+    finally:
+        # stop 会关闭翻译会话并把剩余事件交给订阅者
+        service.stop()
+        service.event_bus.close()
+        output.close()
+        if broadcast:
+            broadcast.stop()
+        if tracer.enabled:
+            tracer.dump()
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
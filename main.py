@@ -5,6 +5,7 @@ import os
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtGui import QIcon
 from view.main_window import MainWindow
+from service import span_tracer
 from loguru import logger
 
 if __name__ == '__main__':
@@ -12,6 +13,7 @@ if __name__ == '__main__':
     os.makedirs(log_dir, exist_ok=True)
     log_file = os.path.join(log_dir, "app_{time:YYYY-MM-DD}.log")
     logger.add(log_file, rotation="00:00", retention="7 days", encoding="utf-8", level="INFO")
+    span_tracer.configure()
     app = QApplication(sys.argv)
     app.setApplicationName('Auto Subtitle')
     icon_path='icon/icon.ico'
@@ -1,6 +1,28 @@
 class TranslationEvent:
+    # 每句话的每次局部结果都会创建一个事件，用 __slots__ 减少内存和属性访问开销
+    __slots__ = ('sentence_id', 'sentence', 'is_sentence_ended', 'create_time', 'target_language', 'source',
+                 'audio_start', 'audio_end', 'speculative_end')
+
     def __init__(self):
         self.sentence_id = 0
         self.sentence = ""
         self.is_sentence_ended = False
         self.create_time=0
+        self.target_language = ""
+        self.source = ""
+        # 句子对应音频的采集时间（time.time() 时间戳），未知时为 None
+        self.audio_start = None
+        self.audio_end = None
+        # 客户端检测到停顿、服务端还没有给出整句结果时为 True，界面可以提前开始让这句消失
+        self.speculative_end = False
+
+    def latency(self):
+        """音频采集结束到事件产生的时间，未知时为 None"""
+        if self.audio_end is None:
+            return None
+        return self.create_time - self.audio_end
+
+    def __repr__(self):
+        return (f'TranslationEvent(sentence_id={self.sentence_id}, sentence={self.sentence!r}, '
+                f'is_sentence_ended={self.is_sentence_ended}, target_language={self.target_language!r}, '
+                f'source={self.source!r}, audio_start={self.audio_start}, audio_end={self.audio_end})')
@@ -0,0 +1,51 @@
+import threading
+
+from service.span_tracer import tracer
+
+
+class SubTitleData():
+    def __init__(self):
+        self.data={}
+        self.lock=threading.Lock()
+        # 等待删除的句子，同一句再次 delay_del 或文本又变化时取消之前的计时
+        self.timers={}
+
+    def set(self,id,text):
+        with self.lock:
+            if id in self.data and self.data[id]==text:
+                return False
+            self.data[id]=text
+            # 提前判断结束的句子还在继续，不再删除
+            timer = self.timers.pop(id, None)
+            if timer:
+                timer.cancel()
+            return True
+
+    def get_list(self):
+        with self.lock:
+            sorted_keys = sorted(self.data.keys())
+            return [self.data[key] for key in sorted_keys]
+
+    def delay_del(self, id, delay_sec):
+        def delayed_delete():
+            with self.lock:
+                if self.timers.get(id) is not timer:
+                    return
+                del self.timers[id]
+                if id in self.data:
+                    del self.data[id]
+            tracer.instant('subtitle.expire', {'sentence_id': id})
+
+        timer = threading.Timer(delay_sec, delayed_delete)
+        with self.lock:
+            previous = self.timers.get(id)
+            if previous:
+                previous.cancel()
+            self.timers[id] = timer
+        timer.start()
+    def clean(self):
+        with self.lock:
+            self.data.clear()
+            for timer in self.timers.values():
+                timer.cancel()
+            self.timers.clear()
@@ -0,0 +1,26 @@
+import argparse
+import os
+
+from loguru import logger
+
+from service.channel_processor import CHANNEL_MODES
+from service.offline_subtitle_service import OfflineSubtitleService
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='为音频文件生成 SRT 字幕，翻译模型使用 .config.yaml 中的配置')
+    parser.add_argument('input', help='音频文件，16bit WAV 或 av 支持的格式')
+    parser.add_argument('-o', '--output', help='输出的 SRT 文件，默认与输入文件同名')
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='同时打开的翻译会话数')
+    parser.add_argument('-t', '--target-language', help='目标语言，默认使用配置')
+    parser.add_argument('--min-silence', type=float, default=0.5, help='静音持续多久（秒）切分一次')
+    parser.add_argument('--max-segment', type=float, default=30.0, help='单个片段的最大时长（秒）')
+    parser.add_argument('--channel-mode', choices=CHANNEL_MODES, default='average',
+                        help='多声道转单声道的方式，电影音轨可用 center 只取对白声道')
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.input)[0] + '.srt'
+    service = OfflineSubtitleService(concurrency=args.concurrency, target_language=args.target_language,
+                                     min_silence=args.min_silence, max_segment=args.max_segment,
+                                     channel_mode=args.channel_mode)
+    stats = service.run(args.input, output)
+    logger.info(f'{output}: {stats["cues"]} subtitles, realtime factor {stats["realtime_factor"]}x')
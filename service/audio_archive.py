@@ -0,0 +1,282 @@
+import mmap
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from config import Config
+from model.event import TranslationEvent
+from translator.base import create_translator, get_target_languages
+
+HEADER_SIZE = 64
+MAGIC = 0x31484352414F4955  # b'UIOARCH1'，小端
+# 每条索引最少对应的音频时长，索引容量按它从音频容量推算
+INDEX_MIN_MS = 10
+
+
+class AudioArchive:
+    """最近一段单声道 int16 音频的环形归档，保存在固定大小的内存映射文件中
+
+    文件布局：64 字节头（magic / rate / capacity / index_capacity / written / index_count 六个 int64），
+    索引区（index_capacity 个 int64 字节位置 + index_capacity 个 float64 采集时间），其后是音频数据区。
+    每次 write 追加一块音频并记一条索引（块在归档中的绝对字节位置、首个样本的采集时间），
+    按采集时间查找时在两条索引之间按采样率线性换算。位置只增不减，超出 capacity 的旧音频被覆盖，
+    磁盘占用固定为 capacity 字节加上索引。
+
+    单写多读：写入方先写音频和索引，最后推进 written / index_count，读取方（包括另一个进程，
+    以 readonly 打开同一文件）按计数读取。read 返回内存映射上的 memoryview，不把音频拷进 Python 对象。
+
+    Args:
+        path: 归档文件路径
+        seconds: 保留的音频秒数，决定文件大小（16kHz 下每分钟约 1.9MB）
+        rate: 采样率
+        readonly: 打开已有的归档只读，seconds / rate 以文件中的为准
+    """
+
+    def __init__(self, path: str, seconds: float = 600, rate: int = 16000, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        if readonly:
+            with open(path, 'rb') as f:
+                header = np.frombuffer(f.read(HEADER_SIZE), dtype=np.int64)
+            if header[0] != MAGIC:
+                raise ValueError(f'{path} is not an audio archive')
+            rate, capacity, index_capacity = int(header[1]), int(header[2]), int(header[3])
+        else:
+            capacity = int(seconds * rate) * 2
+            index_capacity = capacity // (rate * 2 * INDEX_MIN_MS // 1000) + 1
+        self.rate = rate
+        self.capacity = capacity
+        self.index_capacity = index_capacity
+        self.data_offset = HEADER_SIZE + index_capacity * 16
+        size = self.data_offset + capacity
+        if readonly:
+            self.file = open(path, 'rb')
+            self.mm = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.file = open(path, 'w+b')
+            self.file.truncate(size)
+            self.mm = mmap.mmap(self.file.fileno(), size)
+        self.counters = np.ndarray((6,), dtype=np.int64, buffer=self.mm)
+        self.positions = np.ndarray((index_capacity,), dtype=np.int64, buffer=self.mm, offset=HEADER_SIZE)
+        self.times = np.ndarray((index_capacity,), dtype=np.float64, buffer=self.mm,
+                                offset=HEADER_SIZE + index_capacity * 8)
+        if not readonly:
+            self.counters[:] = (MAGIC, rate, capacity, index_capacity, 0, 0)
+
+    @classmethod
+    def from_config(cls, label: str, rate: int) -> Optional['AudioArchive']:
+        """archive.enabled 为 true 时为该路音频创建归档，文件为 archive.dir 下的 archive_<label>.pcm"""
+        config = Config()
+        if not config.get('archive.enabled', False):
+            return None
+        return cls(archive_path(label), float(config.get('archive.seconds', 600)), rate)
+
+    @property
+    def written(self) -> int:
+        return int(self.counters[4])
+
+    def write(self, data: bytes, capture_time: Optional[float] = None):
+        """追加一块音频，capture_time 为首个样本的采集时间，缺省时按上一块推算"""
+        written = int(self.counters[4])
+        count = int(self.counters[5])
+        if capture_time is None:
+            end = self.time_at(written)
+            capture_time = end if end is not None else time.time()
+        offset = written % self.capacity
+        first = min(len(data), self.capacity - offset)
+        start = self.data_offset + offset
+        self.mm[start:start + first] = data[:first] if first < len(data) else data
+        if first < len(data):
+            # 只有数据区末尾放不下的部分从头写，超出容量的块只保留最后 capacity 字节
+            rest = data[first:][-self.capacity:]
+            self.mm[self.data_offset:self.data_offset + len(rest)] = rest
+        slot = count % self.index_capacity
+        self.positions[slot] = written
+        self.times[slot] = capture_time
+        self.counters[5] = count + 1
+        self.counters[4] = written + len(data)
+
+    def _index(self):
+        """按时间顺序返回仍有音频的索引 (字节位置, 采集时间)"""
+        count = int(self.counters[5])
+        written = int(self.counters[4])
+        n = min(count, self.index_capacity)
+        slots = np.arange(count - n, count) % self.index_capacity
+        positions = self.positions[slots]
+        times = self.times[slots]
+        valid = positions >= written - self.capacity
+        return positions[valid], times[valid], written
+
+    def time_at(self, position: int) -> Optional[float]:
+        """归档中某个字节位置对应的采集时间"""
+        times = self.times_at(np.array([position], dtype=np.int64))
+        return None if times is None else float(times[0])
+
+    def times_at(self, positions: np.ndarray) -> Optional[np.ndarray]:
+        """一组字节位置对应的采集时间"""
+        index_positions, index_times, _ = self._index()
+        if len(index_positions) == 0:
+            return None
+        i = np.maximum(np.searchsorted(index_positions, positions, side='right') - 1, 0)
+        return index_times[i] + (positions - index_positions[i]) / 2 / self.rate
+
+    def locate(self, capture_time: float) -> int:
+        """采集时间对应的字节位置，限制在归档现有的范围内"""
+        positions, times, written = self._index()
+        if len(positions) == 0:
+            return written
+        i = int(np.searchsorted(times, capture_time, side='right')) - 1
+        if i < 0:
+            return int(positions[0])
+        position = int(positions[i]) + int((capture_time - times[i]) * self.rate) * 2
+        # 两块之间有间隙（例如切换设备）时不越过下一块的起点
+        limit = int(positions[i + 1]) if i + 1 < len(positions) else written
+        return min(max(position, int(positions[i])), limit)
+
+    def span(self) -> tuple:
+        """归档中现有音频的 (起始采集时间, 结束采集时间)"""
+        written = self.written
+        start = max(0, written - self.capacity)
+        return self.time_at(start), self.time_at(written)
+
+    def read(self, start: int, end: int) -> List[memoryview]:
+        """返回 [start, end) 字节位置的音频，跨过数据区末尾时为两段；是内存映射上的视图，不拷贝"""
+        written = self.written
+        start = max(start, written - self.capacity, 0)
+        end = min(end, written)
+        # 按样本对齐
+        start -= start % 2
+        end -= end % 2
+        views = []
+        while start < end:
+            offset = start % self.capacity
+            length = min(end - start, self.capacity - offset)
+            begin = self.data_offset + offset
+            views.append(memoryview(self.mm)[begin:begin + length])
+            start += length
+        return views
+
+    def close(self):
+        self.counters = self.positions = self.times = None
+        try:
+            self.mm.close()
+        except BufferError:
+            # 还有回放中的 memoryview，映射随最后一个引用释放
+            pass
+        self.file.close()
+
+
+def archive_path(label: str) -> str:
+    directory = Config().get('archive.dir', './archive')
+    return os.path.join(directory, f'archive_{label}.pcm')
+
+
+class Recaption:
+    """把归档中的一段音频交给新的翻译会话重新翻译
+
+    在后台线程中按 chunk_ms 切块发送，speed 为相对实时的发送倍速（0 表示不等待），
+    每块带上原始的采集时间，结果的 audio_start / audio_end 仍对应当时的音频。
+    发完后补 tail_ms 的静音让服务端断句，结果停止到达 settle 秒后（最多 timeout 秒）关闭会话。
+
+    Args:
+        archive: 音频归档
+        translator: 新建的翻译会话，采样率应与归档相同
+        start_time / end_time: 重新翻译的采集时间范围
+        callback: 翻译事件回调，在翻译会话的回调线程上调用
+    """
+
+    def __init__(self, archive: AudioArchive, translator, start_time: float, end_time: float,
+                 callback: Callable[[TranslationEvent], None], speed: float = 4.0, chunk_ms: int = 100,
+                 tail_ms: int = 1000, settle: float = 2.0, timeout: float = 15.0, close_archive: bool = False):
+        self.archive = archive
+        self.translator = translator
+        self.start_time = start_time
+        self.end_time = end_time
+        self.callback = callback
+        self.speed = speed
+        self.chunk_bytes = archive.rate * 2 * chunk_ms // 1000
+        self.tail_ms = tail_ms
+        self.settle = settle
+        self.timeout = timeout
+        # 为这次回放单独打开的归档在结束后关闭
+        self.close_archive = close_archive
+        self.last_event = time.monotonic()
+        self.events = 0
+        self.thread = threading.Thread(target=self._run, name='Recaption', daemon=True)
+
+    def start(self) -> 'Recaption':
+        self.translator.register_callback(self._on_event)
+        self.thread.start()
+        return self
+
+    def join(self, timeout: Optional[float] = None):
+        self.thread.join(timeout)
+
+    def _on_event(self, event: TranslationEvent):
+        self.last_event = time.monotonic()
+        self.events += 1
+        self.callback(event)
+
+    def _run(self):
+        archive = self.archive
+        start = archive.locate(self.start_time)
+        end = archive.locate(self.end_time)
+        duration = (end - start) / 2 / archive.rate
+        logger.info(f'Re-captioning {duration:.1f}s of archived audio')
+        began = time.monotonic()
+        try:
+            self.translator.start()
+            self._send(start, end, began)
+            if self.tail_ms:
+                self.translator.send_data(bytes(archive.rate * 2 * self.tail_ms // 1000))
+            deadline = time.monotonic() + self.timeout
+            self.last_event = max(self.last_event, time.monotonic())
+            while time.monotonic() < deadline and time.monotonic() - self.last_event < self.settle:
+                time.sleep(0.1)
+        except Exception as e:
+            logger.exception(f'Re-caption failed: {e}')
+        finally:
+            try:
+                self.translator.close()
+            except Exception as e:
+                logger.error(f'Failed to close re-caption translator: {e}')
+            if self.close_archive:
+                archive.close()
+        logger.info(f'Re-captioned {duration:.1f}s in {time.monotonic() - began:.1f}s, {self.events} events')
+
+    def _send(self, start: int, end: int, began: float):
+        archive = self.archive
+        sent = 0
+        for view in archive.read(start, end):
+            # 每块的采集时间一次算出，块直接是内存映射上的切片
+            capture_times = archive.times_at(np.arange(start + sent, start + sent + len(view), self.chunk_bytes))
+            for n, offset in enumerate(range(0, len(view), self.chunk_bytes)):
+                chunk = view[offset:offset + self.chunk_bytes]
+                self.translator.send_data(chunk, float(capture_times[n]))
+                sent += len(chunk)
+                if self.speed > 0:
+                    delay = began + sent / 2 / archive.rate / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+
+def start_recaption(archive: AudioArchive, seconds: float, callback: Callable[[TranslationEvent], None],
+                    language: Optional[str] = None, close_archive: bool = False) -> Optional[Recaption]:
+    """用新的翻译会话重新翻译归档中最近 seconds 秒的音频，language 缺省为第一个目标语言"""
+    start_time, end_time = archive.span()
+    if end_time is None:
+        logger.warning('Audio archive is empty, nothing to re-caption')
+        if close_archive:
+            archive.close()
+        return None
+    translator = create_translator(language or get_target_languages()[0], archive.rate)
+    if translator is None:
+        raise RuntimeError('Failed to create translator')
+    speed = float(Config().get('archive.replay_speed', 4))
+    return Recaption(archive, translator, max(start_time, end_time - seconds), end_time, callback, speed=speed,
+                     close_archive=close_archive).start()
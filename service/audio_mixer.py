@@ -0,0 +1,142 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+
+class SourceBuffer:
+    """单个音频源的固定容量环形缓冲区（单声道 int16）
+
+    容量写满后丢弃最旧的样本，保证每个音频源占用的内存有上限。
+    """
+
+    def __init__(self, label: str, capacity: int, rate: int = 16000):
+        self.label = label
+        self.rate = rate
+        self.buf = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+        self.dropped = 0
+        self.last_push = 0.0
+        # 缓冲区中第一个样本的采集时间
+        self.head_time: Optional[float] = None
+
+    def push(self, samples: np.ndarray, capture_time: Optional[float] = None):
+        self.last_push = time.monotonic()
+        if self.size == 0 or self.head_time is None:
+            self.head_time = capture_time
+        if len(samples) > self.capacity:
+            self.dropped += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        overflow = self.size + len(samples) - self.capacity
+        if overflow > 0:
+            self.drop(overflow)
+        end = (self.start + self.size) % self.capacity
+        first = min(len(samples), self.capacity - end)
+        self.buf[end:end + first] = samples[:first]
+        self.buf[:len(samples) - first] = samples[first:]
+        self.size += len(samples)
+
+    def drop(self, n: int):
+        n = min(n, self.size)
+        self.start = (self.start + n) % self.capacity
+        self.size -= n
+        self.dropped += n
+        self._advance_head(n)
+
+    def _advance_head(self, n: int):
+        if self.head_time is not None:
+            self.head_time += n / self.rate
+
+    def add_into(self, out: np.ndarray):
+        """取出 len(out) 个样本累加到 out 中"""
+        n = len(out)
+        first = min(n, self.capacity - self.start)
+        out[:first] += self.buf[self.start:self.start + first]
+        out[first:] += self.buf[:n - first]
+        self.start = (self.start + n) % self.capacity
+        self.size -= n
+        self._advance_head(n)
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+        self.head_time = None
+
+
+class AudioMixer:
+    """把多个已重采样的音频源按样本对齐混成一路
+
+    所有活跃音频源都攒够 frame_size 个样本时输出一帧。不同声卡的时钟存在漂移，
+    某个音频源积压超过其他源 max_skew 个样本时丢弃它最旧的样本重新对齐；
+    超过 stall_timeout 秒没有数据的音频源视为静音，不再等待。
+
+    Args:
+        labels: 音频源名称
+        output_callback: 接收混音后的 int16 PCM 及其采集时间
+        frame_size: 每次输出的样本数，默认 200ms
+        max_buffer: 每个音频源最多缓存的样本数，默认 2s，不能小于 frame_size
+        max_skew: 允许的音频源之间积压差，默认 500ms
+        stall_timeout: 音频源无数据多久后不再等待
+        rate: 输入和输出的采样率
+    """
+
+    def __init__(self, labels: List[str], output_callback: Callable[[bytes, Optional[float]], None],
+                 frame_size: int = 3200, max_buffer: int = 32000, max_skew: int = 8000, stall_timeout: float = 0.5,
+                 rate: int = 16000):
+        if frame_size > max_buffer:
+            # 缓冲区永远攒不够一帧，不会有任何输出
+            raise ValueError(f'Mixer frame of {frame_size} samples exceeds the {max_buffer}-sample source buffer')
+        self.rate = rate
+        self.buffers: Dict[str, SourceBuffer] = {label: SourceBuffer(label, max_buffer, rate) for label in labels}
+        self.output_callback = output_callback
+        self.frame_size = frame_size
+        self.max_skew = max_skew
+        self.stall_timeout = stall_timeout
+        self.lock = threading.Lock()
+        self._mix_buf = np.zeros(frame_size, dtype=np.int32)
+        self._out_buf = np.zeros(frame_size, dtype=np.int16)
+
+    def push(self, label: str, data: bytes, capture_time: Optional[float] = None):
+        # 回调可能来自不同音频源的线程，混音和输出都在锁内完成以保证帧的顺序
+        with self.lock:
+            self.buffers[label].push(np.frombuffer(data, dtype=np.int16), capture_time)
+            self._mix_ready()
+
+    def _active_buffers(self) -> List[SourceBuffer]:
+        now = time.monotonic()
+        active = []
+        for buffer in self.buffers.values():
+            if now - buffer.last_push < self.stall_timeout:
+                active.append(buffer)
+            elif buffer.size:
+                logger.debug(f'Audio source {buffer.label} stalled, dropping {buffer.size} samples')
+                buffer.clear()
+        return active
+
+    def _mix_ready(self):
+        while True:
+            active = self._active_buffers()
+            if not active or any(buffer.size < self.frame_size for buffer in active):
+                return
+            min_size = min(buffer.size for buffer in active)
+            for buffer in active:
+                if buffer.size - min_size > self.max_skew:
+                    logger.debug(f'Audio source {buffer.label} drifted {buffer.size - min_size} samples ahead')
+                    buffer.drop(buffer.size - min_size)
+            head_times = [buffer.head_time for buffer in active if buffer.head_time is not None]
+            capture_time = min(head_times) if head_times else None
+            self._mix_buf.fill(0)
+            for buffer in active:
+                buffer.add_into(self._mix_buf)
+            np.clip(self._mix_buf, -32768, 32767, out=self._mix_buf)
+            self._out_buf[:] = self._mix_buf
+            self.output_callback(self._out_buf.tobytes(), capture_time)
+
+    def stats(self) -> Dict[str, dict]:
+        with self.lock:
+            return {label: {'buffered': buffer.size, 'dropped': buffer.dropped}
+                    for label, buffer in self.buffers.items()}
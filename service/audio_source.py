@@ -0,0 +1,319 @@
+import itertools
+import struct
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+try:
+    import pyaudiowpatch as pyaudio
+except ImportError:
+    # 非 Windows 环境下没有 WASAPI，只能使用 SyntheticSource
+    pyaudio = None
+
+_audio_service = None
+_audio_service_lock = threading.Lock()
+
+
+def get_audio_service():
+    """所有 WASAPI 音频源共享同一个 PyAudio 实例"""
+    global _audio_service
+    if pyaudio is None:
+        raise RuntimeError('pyaudiowpatch is not available on this system')
+    with _audio_service_lock:
+        if _audio_service is None:
+            _audio_service = pyaudio.PyAudio()
+        return _audio_service
+
+
+def reset_audio_service():
+    """释放共享的 PyAudio 实例。PortAudio 只在初始化时枚举设备，重新初始化后才能看到新的默认设备，
+    调用前必须先关闭所有 WASAPI 流"""
+    global _audio_service
+    with _audio_service_lock:
+        if _audio_service is not None:
+            _audio_service.terminate()
+            _audio_service = None
+
+
+def get_default_endpoint(flow: str) -> Optional[str]:
+    """从注册表读取当前默认音频设备的 ID，flow 为 Render（输出）或 Capture（输入）
+
+    每个设备的 Role:0 记录了它最近一次被设为默认设备的时间，取最新的一个；
+    不受 PortAudio 设备列表缓存的影响，可以低开销地轮询。不支持时返回 None。
+    """
+    try:
+        import winreg
+    except ImportError:
+        return None
+    path = rf'SOFTWARE\Microsoft\Windows\CurrentVersion\MMDevices\Audio\{flow}'
+    latest = None
+    try:
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, path) as root:
+            for i in itertools.count():
+                try:
+                    device_id = winreg.EnumKey(root, i)
+                except OSError:
+                    break
+                try:
+                    with winreg.OpenKey(root, device_id) as key:
+                        state, _ = winreg.QueryValueEx(key, 'DeviceState')
+                        role, _ = winreg.QueryValueEx(key, 'Role:0')
+                except OSError:
+                    continue
+                if state != 1 or len(role) < 16:
+                    continue
+                # SYSTEMTIME：年 月 星期 日 时 分 秒 毫秒
+                year, month, _, day, hour, minute, second, millis = struct.unpack('<8H', role[:16])
+                stamp = (year, month, day, hour, minute, second, millis)
+                if latest is None or stamp > latest[0]:
+                    latest = (stamp, device_id)
+    except OSError:
+        return None
+    return latest[1] if latest else None
+
+
+class AudioSource:
+    """音频源基类
+
+    采集到的 int16 交错 PCM 通过 start 时传入的回调交给上游，
+    回调参数为 (data, capture_time)，capture_time 为第一个样本的采集时间（time.time() 时间戳）。
+    frame_ms 为每次回调的音频时长，实际帧数按设备采样率换算。
+    """
+
+    def __init__(self, label: str, frame_ms: float = 200):
+        self.label = label
+        self.frame_ms = frame_ms
+        self.rate = 48000
+        self.channels = 2
+        self.callback: Optional[Callable[[bytes, float], None]] = None
+        # 打开时所用设备的标识，与 default_device_key() 不同时说明系统默认设备已切换
+        self.device_key: Optional[str] = None
+
+    @property
+    def frames_per_buffer(self) -> int:
+        return max(1, int(self.rate * self.frame_ms / 1000))
+
+    def probe(self) -> Tuple[int, int]:
+        """打开前查询将要采集的 (采样率, 声道数)，用于与翻译后端协商发送格式"""
+        return self.rate, self.channels
+
+    def start(self, callback: Callable[[bytes, float], None]):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def default_device_key(self) -> Optional[str]:
+        """系统当前默认设备的标识，不跟随默认设备的音频源返回 None"""
+        return None
+
+    def is_alive(self) -> bool:
+        """流是否仍在运行，设备被拔出等错误后返回 False"""
+        return True
+
+
+class WasapiSource(AudioSource):
+    """WASAPI 设备音频源，open_device 负责找到具体设备"""
+
+    def __init__(self, label: str, frame_ms: float = 200):
+        super().__init__(label, frame_ms)
+        self.stream = None
+        self.device = None
+
+    def open_device(self, audio_service) -> Optional[dict]:
+        raise NotImplementedError
+
+    def probe(self) -> Tuple[int, int]:
+        device = self.open_device(get_audio_service())
+        if device is None:
+            return self.rate, self.channels
+        return int(device["defaultSampleRate"]), device["maxInputChannels"]
+
+    def start(self, callback: Callable[[bytes, float], None]):
+        audio_service = get_audio_service()
+        self.device = self.open_device(audio_service)
+        if self.device is None:
+            raise RuntimeError(f'No WASAPI device found for audio source {self.label}')
+        self.callback = callback
+        self.device_key = self.default_device_key()
+        self.rate = int(self.device["defaultSampleRate"])
+        self.channels = self.device["maxInputChannels"]
+        self.stream = audio_service.open(
+            format=pyaudio.paInt16,
+            channels=self.channels,
+            rate=self.rate,
+            input=True,
+            input_device_index=self.device["index"],
+            stream_callback=self._stream_callback,
+            frames_per_buffer=self.frames_per_buffer,
+        )
+        logger.info(f'Audio source {self.label} opened: {self.device["name"]}, {self.rate}Hz, {self.channels}ch')
+
+    def _stream_callback(self, data, frame_count, time_info, status):
+        now = time.time()
+        capture_time = now - frame_count / self.rate
+        if time_info and time_info.get('input_buffer_adc_time') and time_info.get('current_time'):
+            # PortAudio 的时间基准与 time.time() 不同，只使用两者之差
+            capture_time = now - (time_info['current_time'] - time_info['input_buffer_adc_time'])
+        self.callback(data, capture_time)
+        return (None, pyaudio.paContinue)
+
+    def stop(self):
+        if self.stream:
+            if self.stream.is_active():
+                self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+
+    def is_alive(self) -> bool:
+        return self.stream is not None and self.stream.is_active()
+
+    @staticmethod
+    def get_wasapi_info(audio_service) -> dict:
+        try:
+            return audio_service.get_host_api_info_by_type(pyaudio.paWASAPI)
+        except OSError:
+            logger.warning("Looks like WASAPI is not available on the system. Exiting...")
+            raise
+
+
+class WasapiLoopbackSource(WasapiSource):
+    """默认输出设备的环回采集，即电脑正在播放的声音"""
+
+    def default_device_key(self) -> Optional[str]:
+        return get_default_endpoint('Render')
+
+    def open_device(self, audio_service) -> Optional[dict]:
+        wasapi_info = self.get_wasapi_info(audio_service)
+        default_speakers = audio_service.get_device_info_by_index(wasapi_info["defaultOutputDevice"])
+        if default_speakers["isLoopbackDevice"]:
+            return default_speakers
+        for loopback in audio_service.get_loopback_device_info_generator():
+            if default_speakers["name"] in loopback["name"]:
+                return loopback
+        logger.warning("Looks like WASAPI is not available on the system. Exiting...")
+        return None
+
+
+class WasapiMicrophoneSource(WasapiSource):
+    """默认输入设备，即本地麦克风"""
+
+    def default_device_key(self) -> Optional[str]:
+        return get_default_endpoint('Capture')
+
+    def open_device(self, audio_service) -> Optional[dict]:
+        wasapi_info = self.get_wasapi_info(audio_service)
+        if wasapi_info["defaultInputDevice"] < 0:
+            logger.warning("No default WASAPI input device")
+            return None
+        return audio_service.get_device_info_by_index(wasapi_info["defaultInputDevice"])
+
+
+class SyntheticSource(AudioSource):
+    """合成音频源，不依赖声卡，用于 Linux 下的测试和基准测试
+
+    交替输出 speech_sec 秒的调幅音调和 silence_sec 秒的静音。
+
+    Args:
+        speed: 相对实时的倍速，0 表示不等待、尽快输出
+        drift_ppm: 模拟声卡时钟漂移，正数表示比标称采样率产生更多的样本
+        duration: 输出的音频总时长（秒），None 表示一直输出直到 stop
+
+    采集时间按倍速换算，加速运行时与实际输出时间一致。
+    """
+
+    def __init__(self, label: str = 'synthetic', frame_ms: float = 200, rate: int = 48000,
+                 channels: int = 2, frequency: float = 220.0, speech_sec: float = 3.0, silence_sec: float = 1.0,
+                 speed: float = 1.0, drift_ppm: float = 0.0, duration: Optional[float] = None, seed: int = 0):
+        super().__init__(label, frame_ms)
+        self.rate = rate
+        self.channels = channels
+        self.frequency = frequency
+        self.speech_sec = speech_sec
+        self.silence_sec = silence_sec
+        self.speed = speed
+        self.drift_ppm = drift_ppm
+        self.duration = duration
+        self.rng = np.random.default_rng(seed)
+        self.stopped = threading.Event()
+        self.finished = threading.Event()
+        self.thread = None
+        self.position = 0
+        self.start_time = 0.0
+
+    def generate(self, frame_count: int) -> bytes:
+        t = (self.position + np.arange(frame_count)) / self.rate
+        period = self.speech_sec + self.silence_sec
+        voiced = (t % period) < self.speech_sec
+        # 4Hz 调幅，接近语音的音节节奏
+        envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t))
+        signal = np.where(voiced, 8000 * envelope * np.sin(2 * np.pi * self.frequency * t), 0.0)
+        signal += self.rng.normal(0, 20, frame_count)
+        self.position += frame_count
+        frames = np.repeat(signal[:, np.newaxis], self.channels, axis=1)
+        return np.clip(frames, -32768, 32767).astype(np.int16).tobytes()
+
+    def start(self, callback: Callable[[bytes, float], None]):
+        self.callback = callback
+        self.start_time = time.time() - self.position / self.rate / (self.speed or 1)
+        self.stopped.clear()
+        self.finished.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        chunk_sec = self.frames_per_buffer / self.rate
+        # 时钟漂移体现为每个缓冲区实际到达的间隔与标称值不同
+        interval = chunk_sec / (1 + self.drift_ppm / 1e6) / self.speed if self.speed > 0 else 0
+        started = time.perf_counter()
+        emitted = 0
+        while not self.stopped.is_set():
+            if self.duration is not None and emitted * chunk_sec >= self.duration:
+                break
+            capture_time = self.start_time + self.position / self.rate / (self.speed or 1)
+            data = self.generate(self.frames_per_buffer)
+            self.callback(data, capture_time)
+            emitted += 1
+            if interval:
+                delay = started + emitted * interval - time.perf_counter()
+                if delay > 0:
+                    self.stopped.wait(delay)
+        self.finished.set()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+
+
+def create_source(name: str, frame_ms: float = 200) -> AudioSource:
+    """按名称创建音频源：loopback / microphone / synthetic"""
+    if name == 'loopback':
+        return WasapiLoopbackSource(name, frame_ms)
+    elif name == 'microphone':
+        return WasapiMicrophoneSource(name, frame_ms)
+    elif name == 'synthetic':
+        return SyntheticSource(name, frame_ms)
+    else:
+        raise ValueError(f'Unknown audio source: {name}')
+
+
+def create_sources(names: List[str], frame_ms: float = 200) -> List[AudioSource]:
+    return [create_source(name, frame_ms) for name in names]
+
+
+def reopen_sources(sources: List[AudioSource]):
+    """关闭后重新打开音频源，回调保持不变，重新打开时按新设备确定采样率和声道数
+
+    只要其中有 WASAPI 音频源就会重新初始化 PortAudio，此时 sources 必须包含所有已打开的 WASAPI 音频源。
+    """
+    callbacks = [source.callback for source in sources]
+    for source in sources:
+        source.stop()
+    if any(isinstance(source, WasapiSource) for source in sources):
+        reset_audio_service()
+    for source, callback in zip(sources, callbacks):
+        source.start(callback)
@@ -1,89 +1,381 @@
+import functools
 import sys
 import threading
 import time
 import wave
-from typing import Protocol, Callable
+from collections import deque
+from typing import Protocol, Callable, Dict, List, Optional, Tuple
 
 import numpy as np
-import pyaudiowpatch as pyaudio
 from loguru import logger
 
+from config import Config
 from model.event import TranslationEvent
-from translator.base import ITranslator, create_translator
+from service.audio_archive import AudioArchive, Recaption, start_recaption
+from service.audio_mixer import AudioMixer
+from service.audio_source import AudioSource, create_sources
+from service.channel_processor import ChannelProcessor, downmix
+from service.device_monitor import DeviceMonitor
+from service.endpoint_detector import EndpointDetector
+from service.event_bus import EventBus
+from service.idle_manager import IdleManager
+from service.send_chunker import SendChunker
+from service.session_capture import SessionCapture
+from service.speech_discriminator import SpeechDiscriminator
+from service.span_tracer import tracer
+from translator.base import ITranslator, create_translator, get_target_languages, get_translator_spec
+from translator.registry import AudioCapabilities, negotiate
+from translator.rotating_translator import RotatingTranslator
 
 CHUNK_SIZE=9600
+FRAME_MS=200
+MIX_LABEL='mix'
+# 混音在该采样率下进行，后端不接受时改用后端的首选采样率
+MIX_RATE=16000
+# 重新翻译的结果以 "<音频源>:recaption" 作为音频源，显示为单独的字幕轨道
+RECAPTION_SUFFIX=':recaption'
+# speech_gate 恢复发送时补发的块数（按 200ms 一块约 600ms）
+PREROLL_CHUNKS=3
+
+
+class SourcePipeline:
+    """一路音频的处理状态：静音计数以及每个目标语言的翻译会话和发送分块
+
+    分离模式下每个音频源一条，混音模式下所有音频源共用一条。
+    rate 为与翻译后端协商的发送采样率，采集采样率与之相同时只转单声道、不重采样。
+    """
+
+    def __init__(self, label: str, rate: int = 16000, capabilities: Optional[AudioCapabilities] = None):
+        self.label = label
+        self.rate = rate
+        self.capabilities = capabilities or AudioCapabilities()
+        self.continuous_silence_cnt = 0
+        # 每个目标语言一个翻译会话，共享同一路采集/重采样/静音检测
+        self.translators: Dict[str, ITranslator] = {}
+        self.chunkers: Dict[str, SendChunker] = {}
+        # archive.enabled 时保存最近的发送音频，可以重新翻译
+        self.archive: Optional[AudioArchive] = None
+        # idle.enabled 时长时间静音后关闭翻译会话，有声音时重新连接
+        self.idle: Optional[IdleManager] = IdleManager.from_config(label, self.translators)
+        # endpoint.enabled 时在本地检测停顿，提前结束句子
+        self.endpoint: Optional[EndpointDetector] = EndpointDetector.from_config(rate)
+        # speech_gate.enabled 时只发送判为语音的音频，音乐、噪声按静音处理
+        self.discriminator: Optional[SpeechDiscriminator] = SpeechDiscriminator.from_config(rate)
+        # 判别器有约一个窗口的延迟，被拦下的最近几块在恢复发送时先补发，避免丢掉句首
+        self.preroll: deque = deque(maxlen=PREROLL_CHUNKS)
+
+    def add_translator(self, language: str, translator: ITranslator, send_ms: Optional[float] = 0):
+        self.translators[language] = translator
+        caps = self.capabilities
+        self.chunkers[language] = SendChunker(translator, send_ms, min_ms=caps.min_chunk_ms or 40,
+                                              max_ms=min(400, caps.max_chunk_ms or 400),
+                                              bytes_per_ms=self.rate * 2 / 1000, max_send_ms=caps.max_chunk_ms)
+
 
 class AudioTranslateService:
     def __init__(self):
-        self.stream = None
-        self.audio_service = pyaudio.PyAudio()
         self.stopped = threading.Event()
-        self.translator=None
-        self.input_channels = 2
-        self.input_rate = 48000
+        self.sources: List[AudioSource] = []
+        self.pipelines: Dict[str, SourcePipeline] = {}
+        self.mixer: Optional[AudioMixer] = None
+        # 每个音频源一个声道处理器，各自持有预分配的缓冲区
+        self.channel_processors: Dict[str, ChannelProcessor] = {}
+        self.device_monitor: Optional[DeviceMonitor] = None
+        # capture.enabled 时录制发送的音频和服务端消息，用于离线回放
+        self.capture: Optional[SessionCapture] = None
+        # archive.enabled 时每路音频一个归档，停止后保留到下次开始，仍可重新翻译
+        self.archives: Dict[str, AudioArchive] = {}
         self.callback=None
-        self.continuous_silence_cnt = 0
+        # 翻译事件发布到事件总线，界面、字幕录制等订阅者在分发线程上成批接收
+        self.event_bus = EventBus()
+        # 连续静音超过 silence_timeout 秒后停止发送
+        self.silence_timeout = 2.0
         self.continuous_silence_cnt_threshold = 10
+        self.send_ms: Optional[float] = 0
+        # 本地检测到停顿时让支持的后端立即断句（commit），并把未结束的句子标记为提前结束（speculative）
+        self.endpoint_commit = True
+        self.endpoint_speculative = True
+        # (音频源, 目标语言) -> 最近一个还没有整句结果的事件
+        self.open_sentences: Dict[Tuple[str, str], TranslationEvent] = {}
 
     def register_callback(self, cb: Callable[[TranslationEvent], None]):
         self.callback = cb
 
-    def start(self):
+    def start(self, sources: Optional[List[AudioSource]] = None):
+        """启动采集和翻译
+
+        Args:
+            sources: 音频源列表，为 None 时按配置 audio.sources 创建（默认只有系统声音环回）
+        """
+        config = Config()
+        frame_ms = config.get('audio.frame_ms', FRAME_MS)
+        if sources is None:
+            sources = create_sources(config.get('audio.sources', ['loopback']), frame_ms)
+        mix_mode = config.get('audio.mix_mode', 'separate')
+        # 发送块时长：不配置时每个采集块直接发送，auto 时根据发送开销和服务端延迟自动选择
+        send_ms = config.get('audio.send_ms', 0)
+        self.send_ms = None if send_ms == 'auto' else float(send_ms)
+        self.continuous_silence_cnt_threshold = max(1, round(self.silence_timeout * 1000 / frame_ms))
+        self.endpoint_commit = config.get('endpoint.commit', True)
+        self.endpoint_speculative = config.get('endpoint.speculative', True)
+        self.open_sentences = {}
+
+        self.stopped.clear()
+        self.sources = sources
+        self.close_archives()
+        # 多声道转单声道的方式，电影等 5.1 / 7.1 音源可选 center 只取对白所在的中置声道
+        channel_mode = config.get('audio.channel_mode', 'average')
+        channel_weights = config.get('audio.channel_weights')
+        self.channel_processors = {source.label: ChannelProcessor(channel_mode, channel_weights) for source in sources}
+        # 发送采样率与翻译后端协商：后端接受采集采样率时直接发送，省去重采样
+        spec = get_translator_spec()
+        self.capture = SessionCapture.from_config()
+        if self.capture:
+            self.capture.start(spec.capabilities)
         try:
-            # Get default WASAPI info
-            wasapi_info = self.audio_service.get_host_api_info_by_type(pyaudio.paWASAPI)
-        except OSError:
-            logger.warning("Looks like WASAPI is not available on the system. Exiting...")
+            if mix_mode == 'mix' and len(sources) > 1:
+                rate = negotiate(spec.capabilities, MIX_RATE)
+                pipeline = self._create_pipeline(MIX_LABEL, rate, spec.capabilities)
+                frame_size = int(rate * frame_ms / 1000)
+                # 缓冲区至少 2 秒，audio.frame_ms 较大时至少容纳两帧
+                self.mixer = AudioMixer([source.label for source in sources],
+                                        functools.partial(self.dispatch, pipeline),
+                                        frame_size=frame_size, max_buffer=max(rate * 2, frame_size * 2),
+                                        max_skew=rate // 2, rate=rate)
+                for source in sources:
+                    source.start(functools.partial(self._on_mix_audio, source))
+            else:
+                for source in sources:
+                    input_rate, _ = source.probe()
+                    pipeline = self._create_pipeline(source.label, negotiate(spec.capabilities, input_rate),
+                                                     spec.capabilities)
+                    logger.info(f'Audio source {source.label}: {input_rate}Hz capture, sending {pipeline.rate}Hz '
+                                f'to {spec.name}')
+                    source.start(functools.partial(self._on_source_audio, source, pipeline))
+        except Exception:
+            self.stop()
             raise
-        default_speakers = self.audio_service.get_device_info_by_index(wasapi_info["defaultOutputDevice"])
+        # 默认设备切换（例如换了耳机）时在新设备上重新打开采集，翻译会话保持不变
+        if config.get('audio.device_monitor', True):
+            self.device_monitor = DeviceMonitor(sources)
+            self.device_monitor.start()
+
+    def _create_pipeline(self, label: str, rate: int = 16000,
+                         capabilities: Optional[AudioCapabilities] = None) -> SourcePipeline:
+        pipeline = SourcePipeline(label, rate, capabilities)
+        pipeline.archive = AudioArchive.from_config(label, rate)
+        if pipeline.archive:
+            self.archives[label] = pipeline.archive
+        self.pipelines[label] = pipeline
+        for language in get_target_languages():
+            # translator.rotation.enabled 时定期换用新的会话，先连上新会话再断开旧的
+            factory = functools.partial(create_translator, language, rate)
+            translator = RotatingTranslator.from_config(factory) or factory()
+            if translator is None:
+                logger.error(f"Failed to create translator instance for {language}")
+                raise RuntimeError("Failed to create translator")
+            if self.capture:
+                translator = self.capture.wrap(translator, label, language, rate)
+            translator.register_callback(functools.partial(self._on_translate_event, label))
+            pipeline.add_translator(language, translator, self.send_ms)
+        return pipeline
 
-        if not default_speakers["isLoopbackDevice"]:
-            for loopback in self.audio_service.get_loopback_device_info_generator():
-                if default_speakers["name"] in loopback["name"]:
-                    default_speakers = loopback
-                    break
+    def _on_translate_event(self, label: str, event: TranslationEvent):
+        event.source = label
+        if self.endpoint_speculative:
+            key = (label, event.target_language)
+            if event.is_sentence_ended or event.speculative_end:
+                self.open_sentences.pop(key, None)
             else:
-                logger.warning("Looks like WASAPI is not available on the system. Exiting...")
-                return
-        self.stopped.clear()
-        self.translator = create_translator()
-        if self.translator is None:
-            logger.error("Failed to create translator instance")
-            raise RuntimeError("Failed to create translator")
-        self.translator.register_callback(self.callback)
-        self.input_rate = default_speakers["defaultSampleRate"]
-        self.input_channels = default_speakers["maxInputChannels"]
-        self.stream = self.audio_service.open(
-            format=pyaudio.paInt16,
-            channels=self.input_channels,
-            rate=int(self.input_rate),
-            input=True,
-            input_device_index=default_speakers["index"],
-            stream_callback=self.translate,
-            frames_per_buffer=CHUNK_SIZE,
-        )
-
-    def translate(self, data, frame_count, time_info, status):
-        data = self.resample_audio(data, input_channels=self.input_channels, input_rate=self.input_rate)
-        
-        if self.is_silence(data):
-            if self.continuous_silence_cnt<self.continuous_silence_cnt_threshold:
-                self.continuous_silence_cnt+=1
+                self.open_sentences[key] = event
+        self.event_bus.publish(event)
+        if self.callback:
+            self.callback(event)
+
+    def _on_source_audio(self, source: AudioSource, pipeline: SourcePipeline, data: bytes, capture_time: float):
+        with tracer.span('audio.capture'):
+            if self.capture:
+                self.capture.record_source_audio(source, data, capture_time)
+            process = functools.partial(self._process_source_audio, source, pipeline)
+            if pipeline.idle:
+                pipeline.idle.feed(process, data, capture_time, len(data) / 2 / source.channels / source.rate)
+            else:
+                process(data, capture_time)
+
+    def _process_source_audio(self, source: AudioSource, pipeline: SourcePipeline, data: bytes,
+                              capture_time: float):
+        self.process(pipeline, data, input_channels=source.channels, input_rate=source.rate,
+                     capture_time=capture_time, processor=self.channel_processors.get(source.label))
+
+    def _on_mix_audio(self, source: AudioSource, data: bytes, capture_time: float):
+        with tracer.span('audio.capture'):
+            if self.capture:
+                self.capture.record_source_audio(source, data, capture_time)
+            idle = self.pipelines[MIX_LABEL].idle
+            process = functools.partial(self._mix_source_audio, source)
+            if idle:
+                idle.feed(process, data, capture_time, len(data) / 2 / source.channels / source.rate)
+            else:
+                process(data, capture_time)
+
+    def _mix_source_audio(self, source: AudioSource, data: bytes, capture_time: float):
+        with tracer.span('audio.resample'):
+            data = self.resample_audio(data, input_channels=source.channels, input_rate=source.rate,
+                                       output_rate=self.mixer.rate, processor=self.channel_processors.get(source.label))
+        self.mixer.push(source.label, data, capture_time)
+
+    def process(self, pipeline: SourcePipeline, data: bytes, input_channels: int, input_rate: int,
+                capture_time: Optional[float] = None, processor: Optional[ChannelProcessor] = None) -> bytes:
+        """重采样到该路的发送采样率后交给 dispatch；设备切换后采集采样率变了也按原来协商的采样率发送"""
+        with tracer.span('audio.resample'):
+            data = self.resample_audio(data, input_channels=input_channels, input_rate=input_rate,
+                                       output_rate=pipeline.rate, processor=processor)
+        self.dispatch(pipeline, data, capture_time)
+        return data
+
+    def dispatch(self, pipeline: SourcePipeline, data: bytes, capture_time: Optional[float] = None):
+        """对单声道数据做静音检测，然后把同一份数据分发给该路的所有翻译会话
+
+        bytes 不可变，所有会话共享同一个缓冲区，不做任何拷贝。
+        capture_time 随数据一起交给翻译会话，用于给结果打上音频时间。
+        """
+        if pipeline.archive:
+            # 静音也归档，保持时间连续
+            pipeline.archive.write(data, capture_time)
+        silent = self.is_silence(data)
+        gated = silent
+        if pipeline.discriminator and not silent:
+            with tracer.span('speech_gate.feed'):
+                gated = not pipeline.discriminator.feed(data)
+        if gated:
+            if pipeline.continuous_silence_cnt<self.continuous_silence_cnt_threshold:
+                pipeline.continuous_silence_cnt+=1
+        else:
+            pipeline.continuous_silence_cnt=0
+        if pipeline.idle:
+            pipeline.idle.observe(silent, len(data) / 2 / pipeline.rate)
+        if pipeline.continuous_silence_cnt<self.continuous_silence_cnt_threshold:
+            if pipeline.preroll:
+                # 从非语音恢复发送，先补发被拦下的最后几块
+                for chunk, chunk_time in pipeline.preroll:
+                    for chunker in pipeline.chunkers.values():
+                        chunker.push(chunk, chunk_time)
+                pipeline.preroll.clear()
+            for chunker in pipeline.chunkers.values():
+                chunker.push(data, capture_time)
         else:
-            self.continuous_silence_cnt=0
-        if self.continuous_silence_cnt<self.continuous_silence_cnt_threshold:
-            self.translator.send_data(data)
-        return (data, pyaudio.paContinue)
+            if pipeline.continuous_silence_cnt==self.continuous_silence_cnt_threshold:
+                # 进入静音后把攒着的音频发出去
+                for chunker in pipeline.chunkers.values():
+                    chunker.flush()
+            if pipeline.discriminator:
+                # 只补发紧挨着恢复点的非语音块，中间隔着静音就丢掉
+                if silent:
+                    pipeline.preroll.clear()
+                else:
+                    pipeline.preroll.append((data, capture_time))
+        if pipeline.endpoint:
+            speech_end = pipeline.endpoint.feed(data, capture_time)
+            if speech_end is not None:
+                self._on_endpoint(pipeline, speech_end)
+
+    def _on_endpoint(self, pipeline: SourcePipeline, speech_end: float):
+        """本地检测到停顿：先把攒着的音频发出去再 commit，没有整句结果的句子标记为提前结束"""
+        if self.endpoint_commit:
+            with tracer.span('endpoint.commit'):
+                for language, translator in pipeline.translators.items():
+                    pipeline.chunkers[language].flush()
+                    translator.commit()
+        if not self.endpoint_speculative:
+            return
+        for language in pipeline.translators:
+            event = self.open_sentences.get((pipeline.label, language))
+            if event is None or (event.audio_start is not None and event.audio_start > speech_end):
+                continue
+            marker = TranslationEvent()
+            marker.sentence_id = event.sentence_id
+            marker.sentence = event.sentence
+            marker.create_time = time.time()
+            marker.target_language = event.target_language
+            marker.audio_start = event.audio_start
+            marker.audio_end = speech_end
+            marker.speculative_end = True
+            self._on_translate_event(pipeline.label, marker)
 
     def stop(self):
         self.stopped.set()
-        if self.stream:
-            if self.stream.is_active():
-                self.stream.stop_stream()
-            self.stream.close()
-        self.translator.close()
+        if self.device_monitor:
+            self.device_monitor.stop()
+            self.device_monitor = None
+        for source in self.sources:
+            try:
+                source.stop()
+            except Exception as e:
+                logger.error(f"Failed to stop audio source {source.label}: {e}")
+        self.sources = []
+        self.mixer = None
+        self.close_translators()
+        # 把关闭翻译器时到达的最后几句也交给订阅者
+        self.event_bus.flush()
+        if self.capture:
+            self.capture.close()
+            self.capture = None
         logger.info('===stop===')
 
+    def recaption(self, seconds: float = 30, label: Optional[str] = None,
+                  language: Optional[str] = None) -> Optional[Recaption]:
+        """用新的翻译会话重新翻译最近 seconds 秒的音频，结果以 "<音频源>:recaption" 发布
+
+        Args:
+            seconds: 重新翻译的时长，不超过归档保留的时长
+            label: 音频源，缺省为第一路（混音模式下为混音）
+            language: 目标语言，缺省为第一个目标语言
+        """
+        label = label or next(iter(self.archives), None)
+        archive = self.archives.get(label)
+        if archive is None:
+            logger.warning('Audio archive is not enabled, set archive.enabled to re-caption')
+            return None
+        return start_recaption(archive, seconds, functools.partial(
+            self._on_translate_event, label + RECAPTION_SUFFIX), language)
+
+    def rotate_sessions(self, label: Optional[str] = None):
+        """立即轮换翻译会话（先连上新会话，在句子边界切换），需要 translator.rotation.enabled
+
+        Args:
+            label: 音频源，缺省为所有音频源
+        """
+        rotating = []
+        for pipeline in self.pipelines.values():
+            if label in (None, pipeline.label):
+                for translator in pipeline.translators.values():
+                    # capture.enabled 时外面还包着一层录制
+                    translator = getattr(translator, 'translator', translator)
+                    if isinstance(translator, RotatingTranslator):
+                        rotating.append(translator)
+        if not rotating:
+            logger.warning('Session rotation is not enabled, set translator.rotation.enabled to rotate')
+        for translator in rotating:
+            translator.rotate()
+
+    def close_archives(self):
+        for archive in self.archives.values():
+            archive.close()
+        self.archives = {}
+
+    def close_translators(self):
+        for pipeline in self.pipelines.values():
+            if pipeline.idle and pipeline.idle.idle_periods:
+                logger.info(pipeline.idle.report())
+            if pipeline.discriminator and pipeline.discriminator.seconds:
+                logger.info(f'{pipeline.label}: {pipeline.discriminator.report()}')
+            for language, translator in pipeline.translators.items():
+                try:
+                    translator.close()
+                except Exception as e:
+                    logger.error(f"Failed to close translator {pipeline.label}/{language}: {e}")
+        self.pipelines = {}
+
     def is_silence(self, data: bytes, threshold: float = 0.001) -> bool:
         """
         判断音频数据是否为静音
@@ -108,14 +400,16 @@ class AudioTranslateService:
         # 如果归一化后的RMS值小于阈值，认为是静音
         return normalized_rms < threshold
 
-    def resample_audio(self, data: bytes, input_channels: int, input_rate: int, output_rate: int = 16000) -> bytes:
+    def resample_audio(self, data: bytes, input_channels: int, input_rate: int, output_rate: int = 16000,
+                       processor: Optional[ChannelProcessor] = None) -> bytes:
         audio_data = np.frombuffer(data, dtype=np.int16)
 
-        # Reshape based on channels
+        # Convert to mono, by the source's channel strategy when given, otherwise by averaging channels
         if input_channels > 1:
-            audio_data = audio_data.reshape(-1, input_channels)
-            # Convert to mono by averaging channels
-            audio_data = audio_data.mean(axis=1).astype(np.int16)
+            if processor is not None:
+                audio_data = processor.process(audio_data, input_channels)
+            else:
+                audio_data = downmix(audio_data, input_channels)
 
         # Calculate resampling ratio
         if input_rate != output_rate:
@@ -0,0 +1,114 @@
+from typing import List, Optional
+
+import numpy as np
+
+CHANNEL_MODES = ('average', 'center', 'mid', 'weighted')
+CENTER_CHANNEL = 2  # WAVEFORMATEXTENSIBLE 声道顺序：FL FR FC LFE BL BR SL SR
+
+# 按声道数的对白权重：中置为主，前置左右少量保留，环绕声道只留一点，LFE 丢弃
+DIALOGUE_WEIGHTS = {
+    2: [1.0, 1.0],
+    3: [0.3, 0.3, 1.0],
+    6: [0.3, 0.3, 1.0, 0.0, 0.1, 0.1],
+    8: [0.3, 0.3, 1.0, 0.0, 0.1, 0.1, 0.1, 0.1],
+}
+
+
+def has_center(channels: int) -> bool:
+    # 四声道一般是 FL FR BL BR，没有中置
+    return channels >= 3 and channels != 4
+
+
+class ChannelProcessor:
+    """把多声道 int16 交错 PCM 转为单声道
+
+    mode:
+        average   所有声道等权平均
+        center    5.1 / 7.1 等带中置声道的音源只取中置（电影对白基本都在中置），立体声按 mid 处理
+        mid       只取前置左右的 mid 分量 (L+R)/2，丢掉环绕、LFE 以及左右反相的 side 分量
+        weighted  按 weights 加权，未指定时使用 DIALOGUE_WEIGHTS 中的对白权重；权重按绝对值之和归一化，不会溢出
+
+    各模式都在预分配的 int32 / float32 缓冲区上计算，不产生 float64 临时数组；
+    缓冲区随输入长度增长，因此每个音频源应使用自己的实例。
+    """
+
+    def __init__(self, mode: str = 'average', weights: Optional[List[float]] = None):
+        if mode not in CHANNEL_MODES:
+            raise ValueError(f'Unknown channel mode {mode}, expected one of {CHANNEL_MODES}')
+        self.mode = mode
+        self.weights = weights
+        self._channels = 0
+        self._plan = None
+        self._acc32 = np.zeros(0, dtype=np.int32)
+        self._accf = np.zeros(0, dtype=np.float32)
+        self._tmpf = np.zeros(0, dtype=np.float32)
+        self._out = np.zeros(0, dtype=np.int16)
+
+    def _make_plan(self, channels: int):
+        """根据声道数确定计算方式：('copy', 声道) / ('sum', 声道列表) / ('weighted', [(声道, 权重)])"""
+        mode = self.mode
+        if mode == 'center' and not has_center(channels):
+            mode = 'mid'
+        if mode == 'center':
+            return 'copy', CENTER_CHANNEL
+        if mode == 'mid':
+            return 'sum', [0, 1]
+        if mode == 'weighted':
+            weights = self.weights or DIALOGUE_WEIGHTS.get(channels)
+            if weights is not None and len(weights) == channels:
+                total = float(np.sum(np.abs(weights)))
+                if total > 0:
+                    return 'weighted', [(c, w / total) for c, w in enumerate(weights) if w]
+        return 'sum', list(range(channels))
+
+    def _ensure_capacity(self, frames: int):
+        if len(self._out) < frames:
+            size = max(frames, 2 * len(self._out))
+            self._acc32 = np.zeros(size, dtype=np.int32)
+            self._accf = np.zeros(size, dtype=np.float32)
+            self._tmpf = np.zeros(size, dtype=np.float32)
+            self._out = np.zeros(size, dtype=np.int16)
+
+    def process(self, audio: np.ndarray, channels: int) -> np.ndarray:
+        """audio 为 int16 交错数据，返回单声道 int16 数组
+
+        返回值是内部缓冲区的视图，下一次调用时会被覆盖，需要保留时由调用方拷贝。
+        """
+        if channels <= 1:
+            return audio
+        if channels != self._channels:
+            self._channels = channels
+            self._plan = self._make_plan(channels)
+        frames_view = audio[:len(audio) - len(audio) % channels].reshape(-1, channels)
+        n = len(frames_view)
+        self._ensure_capacity(n)
+        out = self._out[:n]
+        kind, arg = self._plan
+        if kind == 'copy':
+            out[:] = frames_view[:, arg]
+        elif kind == 'sum':
+            acc = self._acc32[:n]
+            acc[:] = frames_view[:, arg[0]]
+            for c in arg[1:]:
+                np.add(acc, frames_view[:, c], out=acc)
+            np.floor_divide(acc, len(arg), out=acc)
+            out[:] = acc
+        else:
+            acc = self._accf[:n]
+            tmp = self._tmpf[:n]
+            acc.fill(0)
+            for c, weight in arg:
+                tmp[:] = frames_view[:, c]
+                tmp *= weight
+                acc += tmp
+            np.clip(acc, -32768, 32767, out=acc)
+            out[:] = acc
+        return out
+
+
+def downmix(audio: np.ndarray, channels: int) -> np.ndarray:
+    """不保留缓冲区的等权平均，结果为新数组"""
+    if channels <= 1:
+        return audio
+    frames_view = audio[:len(audio) - len(audio) % channels].reshape(-1, channels)
+    return (frames_view.sum(axis=1, dtype=np.int32) // channels).astype(np.int16)
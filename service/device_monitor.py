@@ -0,0 +1,109 @@
+import threading
+import time
+from typing import Callable, List, Optional
+
+from loguru import logger
+
+from service.audio_source import AudioSource, WasapiSource, reopen_sources
+
+
+class DeviceSwitch:
+    __slots__ = ('labels', 'reason', 'detected', 'reopened', 'first_audio')
+
+    def __init__(self, labels: List[str], reason: str, detected: float):
+        self.labels = labels
+        self.reason = reason
+        self.detected = detected
+        self.reopened: Optional[float] = None
+        self.first_audio: Optional[float] = None
+
+    def switch_time(self) -> Optional[float]:
+        """从检测到切换到新设备送来第一块音频的时间（秒）"""
+        return None if self.first_audio is None else self.first_audio - self.detected
+
+
+class DeviceMonitor:
+    """监视默认音频设备的切换，把采集迁移到新设备上
+
+    每 interval 秒比较各音频源的 default_device_key() 与打开时的 device_key，不同或者流已经停止时
+    重新打开音频源。回调保持不变，下游的翻译会话、sentence_id 序列和 AudioClock 都不受影响，
+    采样率和声道数随每次回调的 source.rate / source.channels 自动更新。
+
+    Args:
+        sources: 要监视的音频源，必须是已经 start 的
+        interval: 轮询间隔（秒）
+        on_switch: 每次迁移完成且收到新设备的第一块音频后调用
+    """
+
+    def __init__(self, sources: List[AudioSource], interval: float = 1.0,
+                 on_switch: Optional[Callable[[DeviceSwitch], None]] = None):
+        self.sources = sources
+        self.interval = interval
+        self.on_switch = on_switch
+        self.switches: List[DeviceSwitch] = []
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name='DeviceMonitor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        self.thread = None
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.exception(f'Device monitor failed: {e}')
+
+    def check(self) -> Optional[DeviceSwitch]:
+        """检查一次，需要迁移时立即迁移，返回本次的 DeviceSwitch"""
+        changed = []
+        reason = ''
+        for source in self.sources:
+            key = source.default_device_key()
+            if key is not None and key != source.device_key:
+                changed.append(source)
+                reason = f'default device of {source.label} changed'
+            elif not source.is_alive():
+                changed.append(source)
+                reason = f'stream of {source.label} stopped'
+        if not changed:
+            return None
+        if any(isinstance(source, WasapiSource) for source in changed):
+            # 重新初始化 PortAudio 会使所有已打开的 WASAPI 流失效，一起重新打开
+            changed += [source for source in self.sources if isinstance(source, WasapiSource) and source not in changed]
+        return self.migrate(changed, reason)
+
+    def migrate(self, sources: List[AudioSource], reason: str) -> DeviceSwitch:
+        switch = DeviceSwitch([source.label for source in sources], reason, time.perf_counter())
+        logger.info(f'Migrating audio sources {switch.labels}: {reason}')
+        for source in sources:
+            source.callback = self._first_audio_hook(switch, source, source.callback)
+        try:
+            reopen_sources(sources)
+        except Exception as e:
+            # 新设备暂时不可用（例如刚拔出耳机），下一轮再试
+            logger.error(f'Failed to reopen audio sources {switch.labels}: {e}')
+        switch.reopened = time.perf_counter()
+        self.switches.append(switch)
+        return switch
+
+    def _first_audio_hook(self, switch: DeviceSwitch, source: AudioSource, callback):
+        """包装回调，记录新设备的第一块音频到达的时刻，之后换回原回调"""
+        def hook(data: bytes, capture_time: float):
+            source.callback = callback
+            if switch.first_audio is None:
+                switch.first_audio = time.perf_counter()
+                logger.info(f'Audio source {source.label} resumed on new device '
+                            f'({source.rate}Hz, {source.channels}ch), switch-over {switch.switch_time() * 1000:.0f}ms')
+                if self.on_switch:
+                    self.on_switch(switch)
+            callback(data, capture_time)
+        return hook
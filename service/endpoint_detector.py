@@ -0,0 +1,91 @@
+import time
+from typing import Optional
+
+import numpy as np
+
+from config import Config
+
+
+class EndpointDetector:
+    """在发送前的单声道音频上检测句子结束（停顿），不等服务端断句
+
+    音频按 frame_ms 分帧，整块一次算出每帧的能量（dBFS）。一帧算作有声需要同时满足：
+    高于绝对阈值 threshold_db，且比最近的说话电平低不超过 drop_db（电平取有声帧的峰值，每秒衰减 decay_db），
+    这样说完话后只剩背景音乐或底噪时也能判为停顿。
+    累计至少 min_speech_ms 的有声帧之后，连续 pause_ms 没有声音即为一个端点，返回最后一个有声帧结束时的采集时间。
+    没说够 min_speech_ms 就停顿的短促声音（咳嗽、按键声）不产生端点。
+
+    Args:
+        rate: 采样率
+        pause_ms: 判为句子结束的停顿时长
+        drop_db: 比说话电平低多少 dB 算作停顿
+        threshold_db: 绝对的静音阈值（dBFS）
+        min_speech_ms: 产生端点前至少需要的有声时长
+        frame_ms: 分帧时长
+        decay_db: 说话电平每秒衰减的 dB 数
+    """
+
+    def __init__(self, rate: int = 16000, pause_ms: float = 500, drop_db: float = 25.0, threshold_db: float = -55.0,
+                 min_speech_ms: float = 200, frame_ms: float = 10, decay_db: float = 6.0):
+        self.rate = rate
+        self.frame = max(1, int(rate * frame_ms / 1000))
+        self.step = self.frame / rate
+        self.pause = pause_ms / 1000
+        self.drop_db = drop_db
+        self.threshold_db = threshold_db
+        self.min_speech = min_speech_ms / 1000
+        self.decay_db = decay_db
+        self.level = threshold_db
+        self.voiced_seconds = 0.0
+        self.silent_seconds = 0.0
+        self.last_voice: Optional[float] = None
+        # 没有采集时间时按送入的音频时长推算
+        self.clock: Optional[float] = None
+        self.endpoints = 0
+
+    @classmethod
+    def from_config(cls, rate: int) -> Optional['EndpointDetector']:
+        """endpoint.enabled 为 true 时创建"""
+        config = Config()
+        if not config.get('endpoint.enabled', False):
+            return None
+        return cls(rate, pause_ms=float(config.get('endpoint.pause_ms', 500)),
+                   drop_db=float(config.get('endpoint.drop_db', 25)),
+                   threshold_db=float(config.get('endpoint.threshold_db', -55)),
+                   min_speech_ms=float(config.get('endpoint.min_speech_ms', 200)))
+
+    def feed(self, data: bytes, capture_time: Optional[float] = None) -> Optional[float]:
+        """送入一块 int16 单声道音频，检测到端点时返回说话结束的采集时间，否则返回 None"""
+        samples = np.frombuffer(data, dtype=np.int16)
+        n = len(samples) // self.frame
+        if capture_time is None:
+            capture_time = self.clock if self.clock is not None else time.time()
+        self.clock = capture_time + len(samples) / self.rate
+        if n == 0:
+            return None
+        frames = samples[:n * self.frame].astype(np.float32).reshape(n, self.frame) / 32768.0
+        db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        self.level = max(self.level - self.decay_db * n * self.step, float(db.max()))
+        voiced = (db >= self.threshold_db) & (db >= self.level - self.drop_db)
+        endpoint = None
+        # 每块只有十几帧，逐帧累计停顿
+        for i, frame_voiced in enumerate(voiced.tolist()):
+            if frame_voiced:
+                self.voiced_seconds += self.step
+                self.silent_seconds = 0.0
+                self.last_voice = capture_time + (i + 1) * self.step
+                continue
+            self.silent_seconds += self.step
+            if self.silent_seconds >= self.pause and self.voiced_seconds > 0:
+                if self.voiced_seconds >= self.min_speech and endpoint is None:
+                    endpoint = self.last_voice
+                    self.endpoints += 1
+                self.voiced_seconds = 0.0
+        return endpoint
+
+    def reset(self):
+        self.level = self.threshold_db
+        self.voiced_seconds = 0.0
+        self.silent_seconds = 0.0
+        self.last_voice = None
+        self.clock = None
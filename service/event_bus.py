@@ -0,0 +1,113 @@
+import collections
+import threading
+import time
+from typing import Callable, List, Optional
+
+from loguru import logger
+
+from model.event import TranslationEvent
+from service.span_tracer import tracer
+
+
+class Subscription:
+    """一个订阅者：独立的事件队列和批处理窗口"""
+
+    def __init__(self, handler: Callable[[List[TranslationEvent]], None], window: float, max_pending: int,
+                 name: str):
+        self.handler = handler
+        self.window = window
+        self.name = name
+        # deque.append / popleft 在 CPython 中是原子的，生产者不需要加锁；超出上限时丢弃最旧的事件
+        self.queue = collections.deque(maxlen=max_pending)
+        self.last_delivery = 0.0
+        self.delivered = 0
+        # 分发线程和 flush 可能同时投递，保证同一订阅者不会被并发调用
+        self.delivery_lock = threading.Lock()
+
+    def drain(self) -> List[TranslationEvent]:
+        batch = []
+        queue = self.queue
+        while queue:
+            try:
+                batch.append(queue.popleft())
+            except IndexError:
+                break
+        return batch
+
+
+class EventBus:
+    """进程内的翻译事件总线
+
+    publish 可在任意线程（音频回调、WebSocket、SDK 回调线程）调用，只把事件追加到每个订阅者的队列，
+    不加锁也不调用订阅者。分发线程按各订阅者的批处理窗口把积攒的事件成批交给订阅者，
+    订阅者因此只会在分发线程上被调用，慢的订阅者也不会阻塞翻译回调。
+
+    Args:
+        tick: 分发线程的最大轮询间隔（秒），实际间隔取它与最小批处理窗口中的较小值
+    """
+
+    def __init__(self, tick: float = 0.05):
+        self.tick = tick
+        self.subscriptions: List[Subscription] = []
+        self.lock = threading.Lock()  # 只保护订阅列表的修改
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def subscribe(self, handler: Callable[[List[TranslationEvent]], None], window: float = 0.05,
+                  max_pending: int = 10000, name: str = '') -> Subscription:
+        """订阅事件，handler 在分发线程上以事件列表为参数调用，两次调用至少间隔 window 秒"""
+        subscription = Subscription(handler, window, max_pending, name or getattr(handler, '__name__', ''))
+        with self.lock:
+            # 复制后替换，publish 遍历的列表不会被修改
+            self.subscriptions = self.subscriptions + [subscription]
+            if self.thread is None:
+                self.stopped.clear()
+                self.thread = threading.Thread(target=self._run, name='EventBus', daemon=True)
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription, flush: bool = True):
+        with self.lock:
+            self.subscriptions = [sub for sub in self.subscriptions if sub is not subscription]
+        if flush:
+            self._deliver(subscription)
+
+    def publish(self, event: TranslationEvent):
+        for subscription in self.subscriptions:
+            subscription.queue.append(event)
+
+    def flush(self):
+        """立即把所有积攒的事件交给订阅者（在调用线程上）"""
+        for subscription in self.subscriptions:
+            self._deliver(subscription)
+
+    def close(self):
+        self.stopped.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        self.thread = None
+        self.flush()
+
+    def _deliver(self, subscription: Subscription):
+        with subscription.delivery_lock:
+            batch = subscription.drain()
+            subscription.last_delivery = time.monotonic()
+            if not batch:
+                return
+            try:
+                start = time.perf_counter()
+                subscription.handler(batch)
+                tracer.complete(f'bus.{subscription.name}', start, args={'events': len(batch)})
+                subscription.delivered += len(batch)
+            except Exception as e:
+                logger.exception(f'Event subscriber {subscription.name} failed: {e}')
+
+    def _run(self):
+        while not self.stopped.is_set():
+            subscriptions = self.subscriptions
+            interval = min([self.tick] + [sub.window for sub in subscriptions if sub.window > 0])
+            self.stopped.wait(max(interval, 0.001))
+            now = time.monotonic()
+            for subscription in subscriptions:
+                if subscription.queue and now - subscription.last_delivery >= subscription.window:
+                    self._deliver(subscription)
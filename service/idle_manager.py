@@ -0,0 +1,197 @@
+import collections
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from loguru import logger
+
+from config import Config
+from translator.base import ITranslator
+
+ACTIVE = 'active'
+IDLE = 'idle'
+WAKING = 'waking'
+READY = 'ready'
+
+
+class IdleManager:
+    """长时间静音时关闭一路音频的翻译会话，只保留电平检测，有声音时重新连接
+
+    状态：
+        active  正常处理：重采样、静音检测、发送；dispatch 通过 observe 报告静音时长，连续静音超过 timeout 秒后进入 idle
+        idle    后台线程关闭翻译会话；采集回调只对原始 PCM 抽样算电平，不重采样、不发送，
+                最近 preroll_ms 的原始音频留在缓冲区中
+        waking  电平超过阈值，后台线程重新连接，期间的音频继续缓冲，最多 max_buffer_ms；
+                只等关闭线程让出旧连接（detach），不等旧连接关闭完成
+        ready   连接完成，下一个采集回调先按原顺序处理缓冲的音频（预卷），再处理当前块，回到 active
+
+    采集仍然打开，音频设备和采集线程不受影响，只省掉重采样、RMS 计算和连接。
+    每次恢复时输出空闲时长、节省的连接分钟数和估算的 CPU 时间（按 active 时每块的平均处理耗时计算，
+    不含 WebSocket 线程的心跳等开销）。
+
+    Args:
+        label: 音频源标签，用于日志
+        translators: 该路的翻译会话（语言 -> 会话），与 SourcePipeline.translators 为同一个字典
+        timeout: 连续静音多少秒后进入 idle
+        preroll_ms: 恢复时补发的唤醒前音频时长
+        max_buffer_ms: 重新连接期间最多缓冲的音频时长，超出时丢弃最旧的
+        threshold: 唤醒的电平阈值（归一化 RMS），与静音检测的阈值含义相同
+        stride: 电平检测的抽样间隔（样本数）
+    """
+
+    def __init__(self, label: str, translators: Dict[str, ITranslator], timeout: float = 60.0,
+                 preroll_ms: float = 500, max_buffer_ms: float = 10000, threshold: float = 0.001, stride: int = 8):
+        self.label = label
+        self.translators = translators
+        self.timeout = timeout
+        self.preroll = preroll_ms / 1000
+        self.max_buffer = max_buffer_ms / 1000
+        self.threshold = threshold * 32767.0
+        self.stride = stride
+        self.state = ACTIVE
+        self.silent_seconds = 0.0
+        # (处理函数, 原始音频, 采集时间, 时长)
+        self.buffer = collections.deque()
+        self.buffer_seconds = 0.0
+        self.drain_lock = threading.Lock()
+        # 让出旧连接和重新连接在后台线程上串行执行
+        self.transition_lock = threading.Lock()
+        self.idle_since = 0.0
+        self.closed_at: Optional[float] = None
+        self.wake_at = 0.0
+        # 统计
+        self.active_cost = 0.0
+        self.idle_cost = 0.0
+        self.idle_chunks = 0
+        self.idle_periods = 0
+        self.idle_seconds = 0.0
+        self.connection_seconds_saved = 0.0
+        self.cpu_seconds_saved = 0.0
+        self.reconnect_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, label: str, translators: Dict[str, ITranslator]) -> Optional['IdleManager']:
+        """idle.enabled 为 true 时创建"""
+        config = Config()
+        if not config.get('idle.enabled', False):
+            return None
+        return cls(label, translators, timeout=float(config.get('idle.timeout', 60)),
+                   preroll_ms=float(config.get('idle.preroll_ms', 500)),
+                   max_buffer_ms=float(config.get('idle.max_buffer_ms', 10000)),
+                   threshold=float(config.get('idle.threshold', 0.001)))
+
+    def feed(self, process: Callable[[bytes, float], None], data: bytes, capture_time: float, seconds: float):
+        """采集回调的入口：active 时直接交给 process 处理，idle 时只做电平检测并缓冲
+
+        Args:
+            process: 正常的处理函数（重采样并分发），以 (data, capture_time) 调用
+            data: 原始 int16 交错 PCM
+            seconds: data 的时长
+        """
+        state = self.state
+        if state == ACTIVE:
+            start = time.perf_counter()
+            process(data, capture_time)
+            # 每块处理耗时的指数平均，用来估算 idle 时省下的 CPU
+            self.active_cost += (time.perf_counter() - start - self.active_cost) * 0.05
+            return
+        if state == READY:
+            self._drain()
+            process(data, capture_time)
+            return
+        start = time.perf_counter()
+        self.buffer.append((process, data, capture_time, seconds))
+        self.buffer_seconds += seconds
+        limit = self.preroll if state == IDLE else self.max_buffer
+        while self.buffer_seconds > limit and len(self.buffer) > 1:
+            self.buffer_seconds -= self.buffer.popleft()[3]
+        if state == IDLE and self.level(data) >= self.threshold:
+            self._wake()
+        self.idle_cost += time.perf_counter() - start
+        self.idle_chunks += 1
+
+    def level(self, data: bytes) -> float:
+        """抽样的 RMS，所有声道混在一起计算"""
+        samples = np.frombuffer(data, dtype=np.int16)[::self.stride].astype(np.float32)
+        return float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+
+    def observe(self, silent: bool, seconds: float):
+        """active 时由 dispatch 调用，报告一块音频是否静音"""
+        if not silent:
+            self.silent_seconds = 0.0
+            return
+        self.silent_seconds += seconds
+        if self.state == ACTIVE and self.silent_seconds >= self.timeout:
+            self._suspend()
+
+    def _suspend(self):
+        self.state = IDLE
+        self.idle_since = time.monotonic()
+        self.idle_chunks = 0
+        self.idle_cost = 0.0
+        logger.info(f'{self.label}: silent for {self.silent_seconds:.0f}s, closing translator sessions until speech')
+        threading.Thread(target=self._close_translators, name='IdleSuspend', daemon=True).start()
+
+    def _close_translators(self):
+        finishers = []
+        with self.transition_lock:
+            # 从发出关闭起算节省的连接时间，等待连接线程退出的时间不计入
+            self.closed_at = time.monotonic()
+            for language, translator in list(self.translators.items()):
+                try:
+                    finishers.append((language, translator.detach()))
+                except Exception as e:
+                    logger.error(f'Failed to close idle translator {self.label}/{language}: {e}')
+        # 旧连接在锁外关闭，可能要等几秒；期间有声音时 _reconnect 不必等它，直接打开新连接
+        for language, finish in finishers:
+            try:
+                finish()
+            except Exception as e:
+                logger.error(f'Failed to close idle translator {self.label}/{language}: {e}')
+
+    def _wake(self):
+        self.state = WAKING
+        self.wake_at = time.monotonic()
+        threading.Thread(target=self._reconnect, name='IdleResume', daemon=True).start()
+
+    def _reconnect(self):
+        with self.transition_lock:
+            connected = time.monotonic()
+            for language, translator in list(self.translators.items()):
+                try:
+                    translator.start()
+                except Exception as e:
+                    # 发送时会再尝试连接
+                    logger.error(f'Failed to reconnect translator {self.label}/{language}: {e}')
+            now = time.monotonic()
+            idle_seconds = self.wake_at - self.idle_since
+            saved_connection = (connected - self.closed_at) * len(self.translators) if self.closed_at else 0.0
+            saved_cpu = max(0.0, self.idle_chunks * self.active_cost - self.idle_cost)
+            self.idle_periods += 1
+            self.idle_seconds += idle_seconds
+            self.connection_seconds_saved += saved_connection
+            self.cpu_seconds_saved += saved_cpu
+            self.reconnect_seconds += now - self.wake_at
+            self.closed_at = None
+            self.silent_seconds = 0.0
+            self.state = READY
+        logger.info(f'{self.label}: speech after {idle_seconds:.0f}s idle, reconnected in '
+                    f'{(now - self.wake_at) * 1000:.0f}ms with {self.buffer_seconds * 1000:.0f}ms buffered; '
+                    f'saved {saved_connection / 60:.1f} connection-minutes, ~{saved_cpu * 1000:.0f}ms CPU')
+
+    def _drain(self):
+        """在采集线程上按原顺序处理缓冲的音频，然后回到 active"""
+        with self.drain_lock:
+            if self.state != READY:
+                return
+            while self.buffer:
+                process, data, capture_time, _ = self.buffer.popleft()
+                process(data, capture_time)
+            self.buffer_seconds = 0.0
+            self.state = ACTIVE
+
+    def report(self) -> str:
+        return (f'{self.label}: idle {self.idle_periods} times for {self.idle_seconds / 60:.1f} minutes, '
+                f'saved {self.connection_seconds_saved / 60:.1f} connection-minutes and '
+                f'~{self.cpu_seconds_saved:.2f}s CPU')
@@ -0,0 +1,118 @@
+import json
+import os
+import socket
+import threading
+from typing import BinaryIO, List, Optional
+
+from loguru import logger
+
+from model.event import TranslationEvent
+
+
+def event_to_json(event: TranslationEvent) -> dict:
+    latency = event.latency()
+    return {
+        'type': 'final' if event.is_sentence_ended else 'endpoint' if event.speculative_end else 'partial',
+        'source': event.source,
+        'target_language': event.target_language,
+        'sentence_id': event.sentence_id,
+        'text': event.sentence,
+        'time': round(event.create_time, 3),
+        'audio_start': None if event.audio_start is None else round(event.audio_start, 3),
+        'audio_end': None if event.audio_end is None else round(event.audio_end, 3),
+        'latency': None if latency is None else round(latency, 3),
+    }
+
+
+class JsonlOutput:
+    """把翻译事件按行写成 JSON（JSONL）
+
+    作为事件总线的订阅者在分发线程上调用，一批事件拼成一次写入。
+
+    Args:
+        stream: 输出的二进制流，例如 sys.stdout.buffer
+        partials: 是否输出未完成的局部结果，false 时只输出整句
+    """
+
+    def __init__(self, stream: Optional[BinaryIO] = None, partials: bool = True):
+        self.stream = stream
+        self.partials = partials
+
+    def encode(self, events: List[TranslationEvent]) -> bytes:
+        return ''.join(json.dumps(event_to_json(event), ensure_ascii=False) + '\n' for event in events
+                       if self.partials or event.is_sentence_ended).encode('utf-8')
+
+    def on_events(self, events: List[TranslationEvent]):
+        data = self.encode(events)
+        if data:
+            self.write(data)
+
+    def write(self, data: bytes):
+        try:
+            self.stream.write(data)
+            self.stream.flush()
+        except (BrokenPipeError, ValueError):
+            # 读取端（例如管道另一侧的脚本）已经退出
+            pass
+
+    def close(self):
+        pass
+
+
+class UnixSocketOutput(JsonlOutput):
+    """在 Unix 域套接字上监听，把 JSONL 发给所有已连接的客户端
+
+    客户端随时连接、断开；发送超过 send_timeout 秒没有完成的客户端被断开，不会阻塞事件分发。
+    """
+
+    def __init__(self, path: str, partials: bool = True, send_timeout: float = 1.0):
+        super().__init__(None, partials)
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError('Unix domain sockets are not supported on this system')
+        self.path = path
+        self.send_timeout = send_timeout
+        self.clients: List[socket.socket] = []
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            # 上次异常退出留下的套接字文件
+            os.unlink(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(16)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._accept, name='JsonlAccept', daemon=True)
+        self.thread.start()
+        logger.info(f'Writing subtitles to unix socket {path}')
+
+    def _accept(self):
+        while not self.stopped.is_set():
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                break
+            client.settimeout(self.send_timeout)
+            with self.lock:
+                self.clients.append(client)
+
+    def write(self, data: bytes):
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.sendall(data)
+            except OSError:
+                with self.lock:
+                    self.clients.remove(client)
+                client.close()
+
+    def close(self):
+        self.stopped.set()
+        self.server.close()
+        with self.lock:
+            for client in self.clients:
+                client.close()
+            self.clients = []
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,44 @@
+import collections
+import time
+from typing import List
+
+import numpy as np
+from loguru import logger
+
+from model.event import TranslationEvent
+
+
+class LatencyMetrics:
+    """统计整句从音频采集结束到结果产生的延迟，定期输出分位数
+
+    作为事件总线的订阅者使用，只保留最近 window_size 句的延迟。
+    """
+
+    def __init__(self, window_size: int = 200, report_interval: float = 60.0):
+        self.latencies = collections.deque(maxlen=window_size)
+        self.report_interval = report_interval
+        self.last_report = time.monotonic()
+        self.sentences = 0
+
+    def on_events(self, events: List[TranslationEvent]):
+        for event in events:
+            if not event.is_sentence_ended:
+                continue
+            latency = event.latency()
+            if latency is not None:
+                self.latencies.append(latency)
+                self.sentences += 1
+        now = time.monotonic()
+        if self.latencies and now - self.last_report >= self.report_interval:
+            self.last_report = now
+            summary = self.summary()
+            logger.info(f'capture-to-display latency over last {summary["count"]} sentences: '
+                        f'p50 {summary["p50"] * 1000:.0f}ms, p95 {summary["p95"] * 1000:.0f}ms, '
+                        f'max {summary["max"] * 1000:.0f}ms')
+
+    def summary(self) -> dict:
+        if not self.latencies:
+            return {'count': 0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+        values = np.fromiter(self.latencies, dtype=np.float64)
+        p50, p95 = np.percentile(values, [50, 95])
+        return {'count': len(values), 'p50': float(p50), 'p95': float(p95), 'max': float(values.max())}
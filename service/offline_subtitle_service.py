@@ -0,0 +1,247 @@
+import os
+import queue
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from model.event import TranslationEvent
+from service.audio_translate_service import AudioTranslateService, CHUNK_SIZE
+from service.channel_processor import ChannelProcessor
+from service.transcript_recorder import TranscriptCue, TranscriptFile
+from translator.base import ITranslator, create_translator
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2
+
+
+class AudioSegment:
+    __slots__ = ('start', 'end', 'data')
+
+    def __init__(self, start: float, end: float, data: bytes):
+        self.start = start
+        self.end = end
+        self.data = data
+
+
+class SegmentCollector:
+    """收集一个翻译会话返回的句子，判断当前片段是否已经翻译完"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sentences: Dict[int, List] = {}
+        self.last_event = 0.0
+
+    def reset(self):
+        with self.lock:
+            self.sentences = {}
+            self.last_event = 0.0
+
+    def on_event(self, event: TranslationEvent):
+        with self.lock:
+            self.sentences[event.sentence_id] = [event.sentence, event.is_sentence_ended,
+                                                 event.audio_start, event.audio_end]
+            self.last_event = time.monotonic()
+
+    def wait(self, settle_time: float, no_result_timeout: float, timeout: float) -> bool:
+        """等到所有句子都结束且 settle_time 内没有新结果；返回是否正常结束"""
+        start = time.monotonic()
+        while True:
+            time.sleep(0.02)
+            now = time.monotonic()
+            with self.lock:
+                if self.sentences:
+                    ended = all(sentence[1] for sentence in self.sentences.values())
+                    if ended and now - self.last_event >= settle_time:
+                        return True
+                elif now - start >= no_result_timeout:
+                    return True
+            if now - start >= timeout:
+                return False
+
+    def cues(self, segment: AudioSegment, target_language: str) -> List[TranscriptCue]:
+        """优先使用翻译结果中的音频时间；没有时片段内的多个句子按文本长度分配片段时长"""
+        with self.lock:
+            items = [(sentence_id, sentence) for sentence_id, sentence in sorted(self.sentences.items())
+                     if sentence[0]]
+        total = sum(len(sentence[0]) for _, sentence in items)
+        cues = []
+        cursor = segment.start
+        for sentence_id, (text, _, audio_start, audio_end) in items:
+            end = cursor + (segment.end - segment.start) * len(text) / total
+            if audio_start is not None and audio_end is not None:
+                cursor, end = max(segment.start, audio_start), min(segment.end, audio_end)
+            cues.append(TranscriptCue('', target_language, sentence_id, text, cursor, end))
+            cursor = end
+        return cues
+
+
+class OfflineSubtitleService:
+    """离线字幕：读取音频文件，按静音切分后用多个翻译会话并发翻译，输出一个 SRT 文件
+
+    每个工作线程持有一个翻译会话，依次处理分到的片段；片段按最快速度发送，
+    不按实时节奏等待，因此整体速度只受并发数和服务端处理速度限制。
+
+    Args:
+        concurrency: 同时打开的翻译会话数
+        target_language: 目标语言，为 None 时使用配置
+        translator_factory: 创建翻译会话的函数，默认使用 create_translator
+        min_silence: 静音持续多久（秒）切分一次
+        max_segment: 单个片段的最大时长（秒），超过后强制切分
+        settle_time: 片段所有句子结束后再等待多久没有新结果才认为完成
+        segment_timeout: 单个片段的最长等待时间
+        channel_mode: 多声道转单声道的方式，见 ChannelProcessor
+    """
+
+    WINDOW = 1600  # 100ms 的静音检测窗口
+
+    def __init__(self, concurrency: int = 4, target_language: Optional[str] = None,
+                 translator_factory: Optional[Callable[[], ITranslator]] = None, min_silence: float = 0.5,
+                 max_segment: float = 30.0, settle_time: float = 0.5, segment_timeout: float = 60.0,
+                 channel_mode: str = 'average'):
+        self.concurrency = max(1, concurrency)
+        self.target_language = target_language
+        self.translator_factory = translator_factory or (lambda: create_translator(target_language))
+        self.min_silence = min_silence
+        self.max_segment = max_segment
+        self.settle_time = settle_time
+        self.segment_timeout = segment_timeout
+        self.audio_service = AudioTranslateService()
+        self.channel_processor = ChannelProcessor(channel_mode)
+        # 片段末尾补 1s 静音，让服务端的断句逻辑结束最后一句
+        self._tail_silence = bytes(SAMPLE_RATE * BYTES_PER_SAMPLE)
+
+    @staticmethod
+    def load_audio(path: str) -> Tuple[bytes, int, int]:
+        """读取音频文件，返回 (int16 交错 PCM, 采样率, 声道数)
+
+        16bit WAV 直接用 wave 读取，其他格式需要安装 av。
+        """
+        if path.lower().endswith('.wav'):
+            with wave.open(path, 'rb') as wav:
+                if wav.getsampwidth() == BYTES_PER_SAMPLE:
+                    return wav.readframes(wav.getnframes()), wav.getframerate(), wav.getnchannels()
+        import av
+
+        with av.open(path) as container:
+            stream = container.streams.audio[0]
+            # 保留原始声道布局，5.1 / 7.1 的中置声道交给 ChannelProcessor 处理
+            channels = stream.channels
+            resampler = av.AudioResampler(format='s16', layout=stream.layout.name, rate=stream.rate)
+            chunks = []
+            for frame in container.decode(stream):
+                for out in resampler.resample(frame):
+                    chunks.append(out.to_ndarray().tobytes())
+            for out in resampler.resample(None):
+                chunks.append(out.to_ndarray().tobytes())
+            return b''.join(chunks), stream.rate, channels
+
+    def resample(self, data: bytes, rate: int, channels: int) -> bytes:
+        """按实时采集相同的块大小调用 resample_audio，避免整段音频的大数组临时变量"""
+        chunk_bytes = CHUNK_SIZE * channels * BYTES_PER_SAMPLE
+        return b''.join(
+            self.audio_service.resample_audio(data[offset:offset + chunk_bytes], input_channels=channels,
+                                              input_rate=rate, processor=self.channel_processor)
+            for offset in range(0, len(data), chunk_bytes)
+        )
+
+    def split_segments(self, audio: bytes) -> List[AudioSegment]:
+        """在连续静音处切分 16kHz 单声道音频，纯静音部分不发送"""
+        window_bytes = self.WINDOW * BYTES_PER_SAMPLE
+        min_silence_windows = max(1, int(self.min_silence * SAMPLE_RATE / self.WINDOW))
+        max_windows = max(1, int(self.max_segment * SAMPLE_RATE / self.WINDOW))
+        segments = []
+        seg_start = None
+        silent_run = 0
+        n_windows = (len(audio) + window_bytes - 1) // window_bytes
+
+        def close_segment(end_window):
+            segments.append(AudioSegment(seg_start * self.WINDOW / SAMPLE_RATE,
+                                         min(end_window * self.WINDOW, len(audio) // BYTES_PER_SAMPLE) / SAMPLE_RATE,
+                                         audio[seg_start * window_bytes:end_window * window_bytes]))
+
+        for i in range(n_windows):
+            silent = self.audio_service.is_silence(audio[i * window_bytes:(i + 1) * window_bytes])
+            if seg_start is None:
+                if not silent:
+                    seg_start = i
+                    silent_run = 0
+                continue
+            silent_run = silent_run + 1 if silent else 0
+            if silent_run >= min_silence_windows:
+                close_segment(i + 1 - silent_run)
+                seg_start = None
+            elif i + 1 - seg_start >= max_windows:
+                close_segment(i + 1)
+                seg_start = None
+        if seg_start is not None:
+            close_segment(n_windows - silent_run)
+        return segments
+
+    def translate_segments(self, segments: List[AudioSegment]) -> List[TranscriptCue]:
+        pending = queue.Queue()
+        for index, segment in enumerate(segments):
+            pending.put((index, segment))
+        results: Dict[int, List[TranscriptCue]] = {}
+        workers = min(self.concurrency, len(segments))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(self._worker, pending, results) for _ in range(workers)]:
+                future.result()
+        return [cue for index in sorted(results) for cue in results[index]]
+
+    def _worker(self, pending: queue.Queue, results: Dict[int, List[TranscriptCue]]):
+        translator = self.translator_factory()
+        collector = SegmentCollector()
+        translator.register_callback(collector.on_event)
+        target_language = getattr(translator, 'target_language', self.target_language or '')
+        send_bytes = CHUNK_SIZE // 3 * BYTES_PER_SAMPLE
+        try:
+            while True:
+                try:
+                    index, segment = pending.get_nowait()
+                except queue.Empty:
+                    break
+                collector.reset()
+                # 以文件内的时间作为采集时间，翻译结果的音频时间即字幕时间
+                for offset in range(0, len(segment.data), send_bytes):
+                    translator.send_data(segment.data[offset:offset + send_bytes],
+                                         segment.start + offset / BYTES_PER_SAMPLE / SAMPLE_RATE)
+                translator.send_data(self._tail_silence, segment.end)
+                if not collector.wait(self.settle_time, self.settle_time * 4, self.segment_timeout):
+                    logger.warning(f'Segment {index} ({segment.start:.1f}s) timed out')
+                results[index] = collector.cues(segment, target_language)
+        finally:
+            translator.close()
+
+    def run(self, input_path: str, output_path: str) -> dict:
+        """翻译 input_path 并写入 output_path（SRT），返回统计信息"""
+        started = time.perf_counter()
+        data, rate, channels = self.load_audio(input_path)
+        audio = self.resample(data, rate, channels)
+        duration = len(audio) / BYTES_PER_SAMPLE / SAMPLE_RATE
+        segments = self.split_segments(audio)
+        logger.info(f'{input_path}: {duration:.1f}s audio, {len(segments)} segments')
+        cues = self.translate_segments(segments) if segments else []
+
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        if cues:
+            srt = TranscriptFile(output_path, 'srt', 0)
+            srt.write(cues, 0)
+            srt.close()
+        else:
+            open(output_path, 'w', encoding='utf-8').close()
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            'audio_seconds': round(duration, 3),
+            'elapsed_seconds': round(elapsed, 3),
+            'realtime_factor': round(duration / elapsed, 2) if elapsed else 0,
+            'segments': len(segments),
+            'cues': len(cues),
+        }
+        logger.info(f'Offline subtitle finished: {stats}')
+        return stats
@@ -0,0 +1,349 @@
+import math
+import multiprocessing
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from loguru import logger
+
+from config import Config
+from model.event import TranslationEvent
+from service.audio_source import AudioSource, create_sources
+from service.audio_archive import AudioArchive, Recaption, archive_path, start_recaption
+from service.audio_translate_service import MIX_LABEL, RECAPTION_SUFFIX, AudioTranslateService
+from service.device_monitor import DeviceMonitor
+from service.event_bus import EventBus
+from service.shared_ring import SharedRing
+from service import span_tracer
+from service.span_tracer import tracer
+
+# 音频记录头：音频源序号、声道数、采样率、采集时间
+AUDIO_HEADER = struct.Struct('<BBId')
+# 事件记录头：sentence_id、标志（bit0 整句，bit1 提前判断的结束）、create_time、audio_start、audio_end、三个字符串的字节数
+EVENT_HEADER = struct.Struct('<qBdddHHI')
+HEARTBEAT_INTERVAL = 0.5
+# 重启工作进程前由主进程写入事件环的空记录，之后的事件属于新的工作进程
+GENERATION_MARKER = b''
+
+
+def encode_event(event: TranslationEvent) -> bytes:
+    target_language = (event.target_language or '').encode('utf-8')
+    source = (event.source or '').encode('utf-8')
+    sentence = (event.sentence or '').encode('utf-8')
+    header = EVENT_HEADER.pack(
+        event.sentence_id, event.is_sentence_ended | event.speculative_end << 1, event.create_time,
+        math.nan if event.audio_start is None else event.audio_start,
+        math.nan if event.audio_end is None else event.audio_end,
+        len(target_language), len(source), len(sentence))
+    return b''.join((header, target_language, source, sentence))
+
+
+def decode_event(record: bytes) -> TranslationEvent:
+    sentence_id, flags, create_time, audio_start, audio_end, n_language, n_source, n_sentence = \
+        EVENT_HEADER.unpack_from(record)
+    pos = EVENT_HEADER.size
+    event = TranslationEvent()
+    event.sentence_id = sentence_id
+    event.is_sentence_ended = bool(flags & 1)
+    event.speculative_end = bool(flags & 2)
+    event.create_time = create_time
+    event.audio_start = None if math.isnan(audio_start) else audio_start
+    event.audio_end = None if math.isnan(audio_end) else audio_end
+    event.target_language = record[pos:pos + n_language].decode('utf-8')
+    pos += n_language
+    event.source = record[pos:pos + n_source].decode('utf-8')
+    pos += n_source
+    event.sentence = record[pos:pos + n_sentence].decode('utf-8')
+    return event
+
+
+class RingSource(AudioSource):
+    """工作进程中代表主进程某个音频源的替身，声道数和采样率随每条音频记录更新"""
+
+    def start(self, callback: Callable[[bytes, float], None]):
+        self.callback = callback
+
+    def stop(self):
+        self.callback = None
+
+
+def _setup_worker_logging(log_level: str):
+    # spawn 出的进程不继承主进程的日志配置
+    logger.remove()
+    logger.add(sys.stderr, level=log_level)
+    if os.path.isdir('./logs'):
+        logger.add(os.path.join('./logs', 'worker_{time:YYYY-MM-DD}.log'), rotation="00:00", retention="7 days",
+                   encoding="utf-8", level=log_level)
+
+
+def worker_main(labels: List[str], frame_ms: float, audio_ring_name: str, event_ring_name: str,
+                stop_event, heartbeat, log_level: str = 'INFO', formats: Optional[List[Tuple[int, int]]] = None,
+                rotate_event=None):
+    """工作进程入口：从音频环读取音频，运行 AudioTranslateService，把翻译事件写入事件环
+
+    formats 为主进程探测到的各音频源 (采样率, 声道数)，用于与翻译后端协商发送采样率。
+    rotate_event 被主进程置位时轮换所有翻译会话。
+    """
+    _setup_worker_logging(log_level)
+    # 工作进程收不到字幕窗口的快捷键，启用 trace 时在退出前导出自己的记录
+    span_tracer.configure()
+    audio_ring = SharedRing(name=audio_ring_name)
+    event_ring = SharedRing(name=event_ring_name)
+    audio_ring.skip_all()
+    sources = [RingSource(label, frame_ms) for label in labels]
+    for source, (rate, channels) in zip(sources, formats or []):
+        source.rate = rate
+        source.channels = channels
+    service = AudioTranslateService()
+    # 各翻译会话的回调在不同线程上，事件环只允许一个生产者
+    event_lock = threading.Lock()
+
+    def on_translate_event(event: TranslationEvent):
+        record = encode_event(event)
+        with event_lock:
+            event_ring.write(record)
+
+    service.register_callback(on_translate_event)
+    try:
+        service.start(sources)
+        last_heartbeat = 0.0
+        while not stop_event.is_set():
+            now = time.time()
+            if now - last_heartbeat >= HEARTBEAT_INTERVAL:
+                heartbeat.value = now
+                last_heartbeat = now
+                if rotate_event is not None and rotate_event.is_set():
+                    rotate_event.clear()
+                    service.rotate_sessions()
+            record = audio_ring.read_wait(HEARTBEAT_INTERVAL)
+            if record is None:
+                continue
+            index, channels, rate, capture_time = AUDIO_HEADER.unpack_from(record)
+            source = sources[index]
+            source.channels = channels
+            source.rate = rate
+            if source.callback:
+                source.callback(record[AUDIO_HEADER.size:], capture_time)
+    finally:
+        # 关闭翻译会话可能超过主进程等待的时间被终止，先导出
+        if tracer.enabled:
+            tracer.dump()
+        service.stop()
+        audio_ring.close()
+        event_ring.close()
+
+
+class ProcessTranslateService:
+    """在独立进程中运行音频处理和翻译
+
+    采集仍在主进程中进行，采集回调只把原始 PCM 拷贝进共享内存环形缓冲区；重采样、静音检测、
+    编码发送、WebSocket 收包和 JSON 解析都在工作进程中完成，不再和界面争抢 GIL。
+    翻译事件编码后经另一个共享内存环传回主进程，发布到 event_bus，接口与 AudioTranslateService 相同。
+
+    工作进程由监督线程看护：进程退出或心跳超过 hang_timeout 秒未更新时重启，
+    重启期间音频源保持打开，环满后丢弃音频；restart_window 秒内重启超过 max_restarts 次则放弃。
+    重启后的句子编号接在之前最大的编号之后，界面上还没消失的旧字幕不会被新句子覆盖。
+    """
+
+    def __init__(self, audio_capacity: int = 4 << 20, event_capacity: int = 1 << 20, hang_timeout: float = 10.0,
+                 max_restarts: int = 5, restart_window: float = 60.0, log_level: str = 'INFO'):
+        self.audio_capacity = audio_capacity
+        self.event_capacity = event_capacity
+        self.hang_timeout = hang_timeout
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.log_level = log_level
+        self.event_bus = EventBus()
+        self.callback = None
+        self.sources: List[AudioSource] = []
+        # 工作进程中各路音频的标签，重新翻译时按标签找到归档文件
+        self.labels: List[str] = []
+        self.formats: List[Tuple[int, int]] = []
+        self.frame_ms = 200
+        self.audio_ring: Optional[SharedRing] = None
+        self.audio_lock = threading.Lock()
+        self.event_ring: Optional[SharedRing] = None
+        self.device_monitor: Optional[DeviceMonitor] = None
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.worker_stop = None
+        self.worker_rotate = None
+        self.heartbeat = None
+        self.stopped = threading.Event()
+        self.threads: List[threading.Thread] = []
+        self.restarts: List[float] = []
+        # 新的工作进程从 1 开始给句子编号，主进程给之后的事件加上偏移，避免和重启前的句子重号
+        self.sentence_id_offset = 0
+        self.max_sentence_id = 0
+
+    def register_callback(self, cb: Callable[[TranslationEvent], None]):
+        self.callback = cb
+
+    def start(self, sources: Optional[List[AudioSource]] = None):
+        config = Config()
+        self.frame_ms = config.get('audio.frame_ms', 200)
+        if sources is None:
+            sources = create_sources(config.get('audio.sources', ['loopback']), self.frame_ms)
+        self.sources = sources
+        self.labels = [MIX_LABEL] if config.get('audio.mix_mode', 'separate') == 'mix' and len(sources) > 1 \
+            else [source.label for source in sources]
+        self.formats = [source.probe() for source in sources]
+        self.stopped.clear()
+        self.restarts = []
+        self.sentence_id_offset = 0
+        self.max_sentence_id = 0
+        self.audio_ring = SharedRing(self.audio_capacity)
+        self.event_ring = SharedRing(self.event_capacity)
+        try:
+            self._spawn()
+            for index, source in enumerate(sources):
+                source.start(self._make_audio_callback(index, source))
+        except Exception:
+            self.stop()
+            raise
+        # 音频记录带有声道数和采样率，设备迁移后工作进程自动按新格式处理
+        if config.get('audio.device_monitor', True):
+            self.device_monitor = DeviceMonitor(sources)
+            self.device_monitor.start()
+        self.threads = [threading.Thread(target=self._read_events, name='WorkerEvents', daemon=True),
+                        threading.Thread(target=self._supervise, name='WorkerSupervisor', daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def _make_audio_callback(self, index: int, source: AudioSource):
+        ring = self.audio_ring
+        lock = self.audio_lock
+        pack = AUDIO_HEADER.pack
+
+        # 只做一次拷贝；多个音频源的回调线程共用一个环，写入时加锁
+        def on_audio(data: bytes, capture_time: float):
+            start = time.perf_counter()
+            header = pack(index, source.channels, source.rate, capture_time)
+            with lock:
+                ring.write(header, data)
+            tracer.complete('audio.capture', start)
+        return on_audio
+
+    def recaption(self, seconds: float = 30, label: Optional[str] = None,
+                  language: Optional[str] = None) -> Optional[Recaption]:
+        """与 AudioTranslateService.recaption 相同；归档由工作进程写入，这里只读打开同一文件，在主进程中重新翻译"""
+        label = label or next(iter(self.labels), None)
+        path = archive_path(label) if label else None
+        if not Config().get('archive.enabled', False) or path is None or not os.path.exists(path):
+            logger.warning('Audio archive is not enabled, set archive.enabled to re-caption')
+            return None
+        archive = AudioArchive(path, readonly=True)
+
+        def on_translate_event(event: TranslationEvent):
+            event.source = label + RECAPTION_SUFFIX
+            self.event_bus.publish(event)
+            if self.callback:
+                self.callback(event)
+        return start_recaption(archive, seconds, on_translate_event, language, close_archive=True)
+
+    def rotate_sessions(self, label: Optional[str] = None):
+        """通知工作进程轮换翻译会话；工作进程中所有音频源的会话都会轮换，label 只为与 AudioTranslateService 接口一致"""
+        if not Config().get('translator.rotation.enabled', False):
+            logger.warning('Session rotation is not enabled, set translator.rotation.enabled to rotate')
+            return
+        if self.worker_rotate is not None:
+            self.worker_rotate.set()
+
+    def _spawn(self):
+        self.worker_stop = self.context.Event()
+        self.worker_rotate = self.context.Event()
+        self.heartbeat = self.context.Value('d', time.time(), lock=False)
+        self.process = self.context.Process(
+            target=worker_main, name='TranslateWorker', daemon=True,
+            args=([source.label for source in self.sources], self.frame_ms, self.audio_ring.name,
+                  self.event_ring.name, self.worker_stop, self.heartbeat, self.log_level, self.formats,
+                  self.worker_rotate))
+        self.process.start()
+        logger.info(f'Translate worker started, pid {self.process.pid}')
+
+    def _read_events(self):
+        while not self.stopped.is_set():
+            record = self.event_ring.read_wait(0.2, poll_interval=0.01)
+            if record is not None:
+                self._publish_record(record)
+
+    def _publish_record(self, record: bytes):
+        if record == GENERATION_MARKER:
+            # 旧工作进程的事件已经全部读完
+            self.sentence_id_offset = self.max_sentence_id
+            return
+        try:
+            event = decode_event(record)
+        except Exception as e:
+            logger.error(f'Failed to decode translate event: {e}')
+            return
+        event.sentence_id += self.sentence_id_offset
+        self.max_sentence_id = max(self.max_sentence_id, event.sentence_id)
+        self.event_bus.publish(event)
+        if self.callback:
+            self.callback(event)
+
+    def _supervise(self):
+        while not self.stopped.wait(1.0):
+            process = self.process
+            if process.is_alive() and time.time() - self.heartbeat.value < self.hang_timeout:
+                continue
+            reason = 'exited' if not process.is_alive() else 'stopped responding'
+            now = time.monotonic()
+            self.restarts = [t for t in self.restarts if now - t < self.restart_window] + [now]
+            if len(self.restarts) > self.max_restarts:
+                logger.error(f'Translate worker {reason} {len(self.restarts)} times '
+                             f'within {self.restart_window:.0f}s, giving up')
+                self._terminate()
+                return
+            logger.warning(f'Translate worker {reason} (exit code {process.exitcode}), restarting')
+            self._terminate()
+            if not self.stopped.is_set():
+                # 旧工作进程已退出，此时主进程是事件环唯一的写入方
+                self.event_ring.write(GENERATION_MARKER)
+                # 设备可能已经迁移，按当前的采集格式重新协商
+                self.formats = [(source.rate, source.channels) for source in self.sources]
+                self._spawn()
+
+    def _terminate(self):
+        process = self.process
+        if process is None:
+            return
+        self.worker_stop.set()
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=5)
+
+    def stop(self):
+        self.stopped.set()
+        if self.device_monitor:
+            self.device_monitor.stop()
+            self.device_monitor = None
+        for source in self.sources:
+            try:
+                source.stop()
+            except Exception as e:
+                logger.error(f"Failed to stop audio source {source.label}: {e}")
+        self.sources = []
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.threads = []
+        self._terminate()
+        self.process = None
+        # 工作进程退出前写入的最后几句
+        if self.event_ring:
+            while (record := self.event_ring.read()) is not None:
+                self._publish_record(record)
+        self.event_bus.flush()
+        if self.audio_ring and self.audio_ring.dropped:
+            logger.warning(f'Audio ring dropped {self.audio_ring.dropped} chunks')
+        for ring in (self.audio_ring, self.event_ring):
+            if ring:
+                ring.close()
+        self.audio_ring = None
+        self.event_ring = None
+        logger.info('===stop===')
@@ -0,0 +1,118 @@
+import time
+from typing import Optional
+
+from service.span_tracer import tracer
+from translator.base import ITranslator
+
+BYTES_PER_MS = 32  # 16kHz 单声道 int16
+
+
+class SendChunker:
+    """把单声道 int16 音频攒成发送块后再交给翻译会话
+
+    send_ms 为固定的发送块时长；为 None 时自动选择：
+        - 每次 send_data 的固定开销越大，块越大，使发送开销不超过音频时长的 cpu_budget
+        - 服务端往返延迟越大，攒块带来的额外延迟越不明显，块可以放大到延迟的 latency_ratio 倍
+    两者取较大值，再限制在 [min_ms, max_ms] 之间，每 adjust_every 次发送重新计算一次。
+    翻译后端限制了单次发送的时长时（max_send_ms），更大的块拆开发送。
+
+    Args:
+        translator: 翻译会话
+        send_ms: 固定发送块时长（毫秒），None 表示自动
+        min_ms: 自动模式的最小块时长
+        max_ms: 自动模式的最大块时长
+        cpu_budget: 发送开销占音频时长的比例上限
+        latency_ratio: 块时长相对服务端往返延迟的比例
+        bytes_per_ms: 每毫秒音频的字节数，由协商得到的采样率决定
+        max_send_ms: 后端允许的单次发送时长上限，None 表示不限制
+    """
+
+    def __init__(self, translator: ITranslator, send_ms: Optional[float] = None, min_ms: float = 40,
+                 max_ms: float = 400, cpu_budget: float = 0.01, latency_ratio: float = 0.25,
+                 adjust_every: int = 10, bytes_per_ms: float = BYTES_PER_MS,
+                 max_send_ms: Optional[float] = None):
+        self.translator = translator
+        self.auto = send_ms is None
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.cpu_budget = cpu_budget
+        self.latency_ratio = latency_ratio
+        self.adjust_every = adjust_every
+        self.bytes_per_ms = bytes_per_ms
+        # 按样本对齐的单次发送上限
+        self.max_bytes = max(2, int(max_send_ms * bytes_per_ms) & ~1) if max_send_ms else None
+        self.send_ms = min_ms if self.auto else send_ms
+        self.buffer = bytearray()
+        self.buffer_time: Optional[float] = None
+        self.send_count = 0
+        # 发送耗时 = 固定开销 + 每毫秒音频的开销 * 块时长，用带衰减的最小二乘估计
+        self._n = 0.0
+        self._sx = 0.0
+        self._sy = 0.0
+        self._sxx = 0.0
+        self._sxy = 0.0
+
+    @property
+    def send_bytes(self) -> int:
+        return int(self.send_ms * self.bytes_per_ms)
+
+    def push(self, data: bytes, capture_time: Optional[float] = None):
+        if not self.buffer and len(data) >= self.send_bytes:
+            # 采集块已经够大，直接发送，避免拷贝
+            self._send(data, capture_time)
+            return
+        if not self.buffer:
+            self.buffer_time = capture_time
+        self.buffer += data
+        if len(self.buffer) >= self.send_bytes:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            data = bytes(self.buffer)
+            self.buffer.clear()
+            self._send(data, self.buffer_time)
+
+    def _send(self, data: bytes, capture_time: Optional[float]):
+        while self.max_bytes and len(data) > self.max_bytes:
+            self._send(data[:self.max_bytes], capture_time)
+            data = data[self.max_bytes:]
+            if capture_time is not None:
+                capture_time += self.max_bytes / self.bytes_per_ms / 1000
+        start = time.perf_counter()
+        self.translator.send_data(data, capture_time)
+        end = time.perf_counter()
+        cost = end - start
+        tracer.complete('translator.send', start, end)
+        self.send_count += 1
+        if self.auto:
+            self._observe(len(data) / self.bytes_per_ms, cost)
+            if self.send_count % self.adjust_every == 0:
+                self.adjust()
+
+    def _observe(self, x: float, y: float, decay: float = 0.98):
+        self._n = self._n * decay + 1
+        self._sx = self._sx * decay + x
+        self._sy = self._sy * decay + y
+        self._sxx = self._sxx * decay + x * x
+        self._sxy = self._sxy * decay + x * y
+
+    def fixed_cost(self) -> float:
+        """每次发送与块大小无关的开销（秒）
+
+        块大小几乎不变时无法拟合截距，保守地把全部耗时都当作固定开销。
+        """
+        if not self._n:
+            return 0.0
+        denominator = self._n * self._sxx - self._sx * self._sx
+        if denominator <= 1e-2 * self._n * self._sxx:
+            return self._sy / self._n
+        slope = (self._n * self._sxy - self._sx * self._sy) / denominator
+        return max(0.0, (self._sy - slope * self._sx) / self._n)
+
+    def adjust(self):
+        # 只有与块大小无关的固定开销才能靠增大块摊薄
+        cost_ms = self.fixed_cost() * 1000 / self.cpu_budget
+        latency = self.translator.get_response_latency()
+        latency_ms = latency * 1000 * self.latency_ratio if latency else 0
+        self.send_ms = min(self.max_ms, max(self.min_ms, cost_ms, latency_ms))
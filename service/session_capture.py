@@ -0,0 +1,462 @@
+"""会话录制与回放
+
+录制：把发给翻译会话的音频（send_data 的参数）和服务端发回的消息按到达时间写进一个二进制文件，
+用于复现线上的性能问题。回放：不连网络，按录制时的节奏（或加速）把同样的音频和消息重新走一遍流水线，
+优化前后可以在完全相同的流量上对比。
+
+文件格式：MAGIC 之后是连续的记录，每条记录为 RECORD 头 (kind, stream, t, length) 加 length 字节的内容，
+t 为相对录制开始的秒数（单调时钟）。
+    KIND_HEADER   JSON：录制开始的 time.time()、翻译后端及其能力、相关配置
+    KIND_STREAM   JSON：一个翻译会话（音频源标签、目标语言、采样率、是否录制了原始消息）
+    KIND_SOURCE   JSON：一个音频源的采样率和声道数，设备切换后格式变化时再写一条
+    KIND_SEND     发给翻译会话的 pcm16 单声道音频，前 8 字节为采集时间（double，未知时为 NaN）
+    KIND_MESSAGE  服务端发来的原始消息（UTF-8），只有 qwen 这样通过 _on_message 收包的会话才有
+    KIND_EVENT    翻译会话产生的 TranslationEvent（JSON），回放时用来核对结果
+    KIND_CAPTURE  采集回调收到的原始音频（可选），格式同 KIND_SEND，回放时可以连重采样一起复现
+"""
+import json
+import math
+import os
+import queue
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from model.event import TranslationEvent
+from service.audio_source import AudioSource
+from translator.base import ITranslator
+
+MAGIC = b'ASCAP1\n'
+RECORD = struct.Struct('<BHdI')
+CAPTURE_TIME = struct.Struct('<d')
+
+KIND_HEADER = 0
+KIND_STREAM = 1
+KIND_SOURCE = 2
+KIND_SEND = 3
+KIND_MESSAGE = 4
+KIND_EVENT = 5
+KIND_CAPTURE = 6
+
+# 录制到文件头里的配置，回放时按这些配置重建流水线；不包含 api_key
+CONFIG_KEYS = ('translator.model', 'translator.target_language', 'translator.target_languages',
+               'translator.source_language', 'audio.sources', 'audio.mix_mode', 'audio.channel_mode',
+               'audio.channel_weights', 'audio.frame_ms', 'audio.send_ms')
+
+
+def encode_event(event: TranslationEvent) -> bytes:
+    return json.dumps({
+        'sentence_id': event.sentence_id,
+        'sentence': event.sentence,
+        'is_sentence_ended': event.is_sentence_ended,
+        'create_time': event.create_time,
+        'target_language': event.target_language,
+        'audio_start': event.audio_start,
+        'audio_end': event.audio_end,
+    }, ensure_ascii=False).encode('utf-8')
+
+
+def decode_event(payload: bytes) -> TranslationEvent:
+    event = TranslationEvent()
+    for key, value in json.loads(payload).items():
+        setattr(event, key, value)
+    return event
+
+
+class CaptureRecord:
+    __slots__ = ('kind', 'stream', 't', 'payload')
+
+    def __init__(self, kind: int, stream: int, t: float, payload: bytes):
+        self.kind = kind
+        self.stream = stream
+        self.t = t
+        self.payload = payload
+
+    def json(self) -> dict:
+        return json.loads(self.payload)
+
+    def audio(self) -> Tuple[bytes, Optional[float]]:
+        """KIND_SEND / KIND_CAPTURE 的 (pcm, 采集时间)"""
+        capture_time, = CAPTURE_TIME.unpack_from(self.payload)
+        return self.payload[CAPTURE_TIME.size:], None if math.isnan(capture_time) else capture_time
+
+
+def read_capture(path: str) -> Iterator[CaptureRecord]:
+    """按顺序读出录制文件中的记录，文件末尾不完整的记录（录制时进程被杀）忽略"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'Not a session capture: {path}')
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                break
+            kind, stream, t, length = RECORD.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length:
+                break
+            yield CaptureRecord(kind, stream, t, payload)
+
+
+class RecordingTranslator(ITranslator):
+    """包装一个翻译会话，把发送的音频、收到的原始消息和产生的事件交给 SessionCapture
+
+    只在调用线程上入队，写文件在 SessionCapture 的后台线程中完成。
+    被包装的会话有 _on_message（qwen）时换成录制版本，WebSocket 建立连接时取到的就是它。
+    """
+
+    def __init__(self, capture: 'SessionCapture', translator: ITranslator, stream: int):
+        self.capture = capture
+        self.translator = translator
+        self.stream = stream
+        self.callback = None
+        self.records_messages = hasattr(translator, '_on_message')
+        if self.records_messages:
+            on_message = translator._on_message
+
+            def recording_on_message(ws, message):
+                self.capture.record(KIND_MESSAGE, self.stream,
+                                    message.encode('utf-8') if isinstance(message, str) else message)
+                on_message(ws, message)
+
+            translator._on_message = recording_on_message
+        translator.register_callback(self._on_event)
+
+    def _on_event(self, event: TranslationEvent):
+        self.capture.record(KIND_EVENT, self.stream, encode_event(event))
+        if self.callback:
+            self.callback(event)
+
+    def send_data(self, data: bytes, capture_time: Optional[float] = None):
+        self.capture.record_audio(KIND_SEND, self.stream, data, capture_time)
+        self.translator.send_data(data, capture_time)
+
+    def start(self):
+        self.translator.start()
+
+    def close(self):
+        self.translator.close()
+
+    def detach(self) -> Callable[[], None]:
+        return self.translator.detach()
+
+    def register_callback(self, cb: Callable[[TranslationEvent], None]):
+        self.callback = cb
+
+    def get_response_latency(self) -> Optional[float]:
+        return self.translator.get_response_latency()
+
+    def commit(self) -> bool:
+        return self.translator.commit()
+
+    def __getattr__(self, name):
+        # 其余属性（例如对冲翻译的 providers）直接取被包装的会话
+        return getattr(self.translator, name)
+
+
+class SessionCapture:
+    """把一次翻译会话录制到 capture_时间.bin
+
+    Args:
+        directory: 输出目录
+        source_audio: 同时录制采集回调的原始音频（通常是 48kHz 立体声，体积约为发送音频的 6 倍），
+            回放时可以连声道处理和重采样一起复现
+        max_pending: 等待写入的记录上限，磁盘跟不上时丢弃新记录而不阻塞采集和收包线程
+        flush_interval: 后台线程最多隔多久把缓冲写到文件
+    """
+
+    def __init__(self, directory: str = './captures', source_audio: bool = False, max_pending: int = 5000,
+                 flush_interval: float = 1.0):
+        self.directory = directory
+        self.source_audio = source_audio
+        self.flush_interval = flush_interval
+        self.queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.path = ''
+        self.start_time = 0.0
+        self.start_wall = 0.0
+        self.streams = 0
+        # 音频源标签 -> (编号, 采样率, 声道数)
+        self.sources: Dict[str, Tuple[int, int, int]] = {}
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.written_bytes = 0
+
+    @classmethod
+    def from_config(cls) -> Optional['SessionCapture']:
+        """capture.enabled 为 true 时按配置创建，否则返回 None"""
+        from config import Config
+
+        config = Config()
+        if not config.get('capture.enabled', False):
+            return None
+        return cls(directory=config.get('capture.dir', './captures'),
+                   source_audio=config.get('capture.source_audio', False))
+
+    def start(self, capabilities=None):
+        """打开文件并写入文件头，capabilities 为翻译后端的 AudioCapabilities，回放时按它协商采样率"""
+        from config import Config
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.start_time = time.monotonic()
+        self.start_wall = time.time()
+        name = time.strftime('capture_%Y%m%d_%H%M%S.bin', time.localtime(self.start_wall))
+        self.path = os.path.join(self.directory, name)
+        config = Config()
+        header = {'start_wall': self.start_wall,
+                  'config': {key: config.get(key) for key in CONFIG_KEYS if config.get(key) is not None}}
+        if capabilities is not None:
+            header['capabilities'] = {'sample_rates': list(capabilities.sample_rates),
+                                      'min_chunk_ms': capabilities.min_chunk_ms,
+                                      'max_chunk_ms': capabilities.max_chunk_ms}
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, args=(open(self.path, 'wb', buffering=1 << 16),),
+                                       name='SessionCapture', daemon=True)
+        self.record(KIND_HEADER, 0, json.dumps(header).encode('utf-8'))
+        self.thread.start()
+        logger.info(f'Session capture to {self.path}')
+
+    def wrap(self, translator: ITranslator, label: str, language: str, rate: int) -> RecordingTranslator:
+        with self.lock:
+            stream = self.streams
+            self.streams += 1
+        wrapped = RecordingTranslator(self, translator, stream)
+        self.record(KIND_STREAM, stream, json.dumps({
+            'label': label, 'language': language, 'rate': rate, 'messages': wrapped.records_messages,
+            'target': f'{type(translator).__module__}:{type(translator).__qualname__}',
+        }).encode('utf-8'))
+        return wrapped
+
+    def record_source_audio(self, source: AudioSource, data: bytes, capture_time: Optional[float]):
+        """在采集回调上调用，source_audio 为 false 时什么也不做"""
+        if not self.source_audio:
+            return
+        known = self.sources.get(source.label)
+        if known is None or known[1:] != (source.rate, source.channels):
+            # 第一次出现或设备切换后格式变了，先写一条格式记录
+            with self.lock:
+                index = known[0] if known else len(self.sources)
+                self.sources[source.label] = (index, source.rate, source.channels)
+            self.record(KIND_SOURCE, index, json.dumps({
+                'label': source.label, 'rate': source.rate, 'channels': source.channels,
+            }).encode('utf-8'))
+        self.record_audio(KIND_CAPTURE, self.sources[source.label][0], data, capture_time)
+
+    def record_audio(self, kind: int, stream: int, data: bytes, capture_time: Optional[float]):
+        # 采集时间和音频分两段写，不为拼接复制音频
+        self.record(kind, stream, CAPTURE_TIME.pack(math.nan if capture_time is None else capture_time), data)
+
+    def record(self, kind: int, stream: int, payload: bytes, data: bytes = b''):
+        if self.thread is None:
+            return
+        try:
+            self.queue.put_nowait((kind, stream, time.monotonic() - self.start_time, payload, data))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+            self.thread = None
+        if self.dropped:
+            logger.warning(f'Session capture dropped {self.dropped} records')
+        if self.path:
+            logger.info(f'Session capture saved {self.written_bytes} bytes to {self.path}')
+
+    def _run(self, file):
+        file.write(MAGIC)
+        last_flush = time.monotonic()
+        while True:
+            try:
+                kind, stream, t, payload, data = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self.stopped.is_set():
+                    break
+                continue
+            try:
+                file.write(RECORD.pack(kind, stream, t, len(payload) + len(data)))
+                file.write(payload)
+                if data:
+                    file.write(data)
+                self.written_bytes += RECORD.size + len(payload) + len(data)
+                now = time.monotonic()
+                if now - last_flush >= self.flush_interval:
+                    file.flush()
+                    last_flush = now
+            except Exception as e:
+                logger.error(f'Failed to write session capture: {e}')
+        file.close()
+
+
+class ReplaySource(AudioSource):
+    """回放录制的原始采集音频，由 ReplaySession.run 在回放线程上调用回调"""
+
+    def __init__(self, label: str, rate: int, channels: int, frame_ms: float = 200):
+        super().__init__(label, frame_ms)
+        self.rate = rate
+        self.channels = channels
+
+    def start(self, callback: Callable[[bytes, float], None]):
+        self.callback = callback
+
+    def stop(self):
+        pass
+
+
+_sessions: Dict[str, 'ReplaySession'] = {}
+
+
+def get_replay_session(path: str) -> 'ReplaySession':
+    session = _sessions.get(os.path.abspath(path))
+    if session is None:
+        raise RuntimeError(f'Replay session {path} is not installed')
+    return session
+
+
+class ReplaySession:
+    """把录制文件重新走一遍流水线
+
+    install 之后 translator.model 设为 replay、translator.replay.path 指向录制文件，
+    AudioTranslateService 创建的翻译会话就是 ReplayTranslator，按录制的顺序认领各自的会话。
+    run 按录制的时间线把音频交给流水线、把服务端消息交给对应的 ReplayTranslator，全部在调用线程上完成，
+    同样的输入每次得到同样的调用顺序。
+
+    录制了原始采集音频时从采集回调开始回放（包含声道处理和重采样），否则从 dispatch 开始回放发送的音频。
+
+    Args:
+        path: 录制文件
+        speed: 相对录制的倍速，0 表示不等待、尽快回放。音频时间按倍速换算，只有 1 倍速时延迟数值有意义
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.path = os.path.abspath(path)
+        self.speed = speed
+        self.records: List[CaptureRecord] = []
+        self.header: dict = {}
+        # 会话编号 -> (音频源标签, 目标语言)；同一标签和语言重连后的会话合并到一起
+        self.streams: Dict[int, Tuple[str, str]] = {}
+        self.stream_messages: Dict[Tuple[str, str], bool] = {}
+        self.stream_rates: Dict[Tuple[str, str], int] = {}
+        self.stream_targets: Dict[Tuple[str, str], str] = {}
+        self.sources: Dict[int, ReplaySource] = {}
+        self.translators: Dict[Tuple[str, str], ITranslator] = {}
+        self.start_wall = 0.0
+        self.stopped = threading.Event()
+        frame_ms = 200
+        for record in read_capture(path):
+            if record.kind == KIND_HEADER:
+                self.header = record.json()
+                frame_ms = self.header.get('config', {}).get('audio.frame_ms', frame_ms)
+                continue
+            if record.kind == KIND_STREAM:
+                info = record.json()
+                key = (info['label'], info['language'])
+                self.streams[record.stream] = key
+                self.stream_messages[key] = self.stream_messages.get(key, True) and info['messages']
+                self.stream_rates.setdefault(key, info['rate'])
+                self.stream_targets.setdefault(key, info.get('target', ''))
+            elif record.kind == KIND_SOURCE and record.stream not in self.sources:
+                info = record.json()
+                self.sources[record.stream] = ReplaySource(info['label'], info['rate'], info['channels'], frame_ms)
+            self.records.append(record)
+        self.has_source_audio = bool(self.sources)
+
+    @property
+    def config(self) -> dict:
+        return self.header.get('config', {})
+
+    def install(self):
+        """注册 replay 翻译后端，采样率和发送块时长取录制时的后端能力"""
+        from translator.registry import AudioCapabilities, TranslatorSpec, register
+
+        caps = self.header.get('capabilities') or {}
+        rates = tuple(caps.get('sample_rates') or sorted(set(self.stream_rates.values())) or (16000,))
+        register(TranslatorSpec(
+            'replay', 'translator.replay_translator:ReplayTranslator',
+            AudioCapabilities(sample_rates=rates, min_chunk_ms=caps.get('min_chunk_ms'),
+                              max_chunk_ms=caps.get('max_chunk_ms')),
+            options={'path': 'translator.replay.path'},
+            description='replays a session capture without network',
+        ))
+        self.translators = {}
+        _sessions[self.path] = self
+
+    def uninstall(self):
+        _sessions.pop(self.path, None)
+
+    def audio_sources(self) -> List[AudioSource]:
+        """回放用的音频源；只录制了发送音频时按录制的会话给出占位音频源，只用来建立同样的流水线"""
+        if self.has_source_audio:
+            return list(self.sources.values())
+        rates = {}
+        for (label, _), rate in self.stream_rates.items():
+            rates.setdefault(label, rate)
+        return [ReplaySource(label, rate, 1) for label, rate in rates.items()]
+
+    def attach(self, language: str, translator: ITranslator) -> Tuple[str, str]:
+        """ReplayTranslator 创建时调用，认领录制中第一个还没有被认领的同语言会话"""
+        for key in dict.fromkeys(self.streams.values()):
+            if key[1] == language and key not in self.translators:
+                self.translators[key] = translator
+                return key
+        raise RuntimeError(f'No recorded session left for target language {language} in {self.path}')
+
+    def map_time(self, recorded: Optional[float]) -> Optional[float]:
+        """录制时的 time.time() 时间戳换算为回放时的时间戳"""
+        if recorded is None:
+            return None
+        return self.start_wall + (recorded - self.header.get('start_wall', 0.0)) / (self.speed or 1)
+
+    def expected_events(self) -> List[Tuple[str, str, int, str]]:
+        """录制时各会话产生的整句结果 (音频源标签, 目标语言, sentence_id, 文本)"""
+        expected = []
+        for record in self.records:
+            if record.kind == KIND_EVENT:
+                event = decode_event(record.payload)
+                if event.is_sentence_ended:
+                    label, language = self.streams[record.stream]
+                    expected.append((label, language, event.sentence_id, event.sentence))
+        return expected
+
+    def run(self, service, on_progress: Optional[Callable[[float], None]] = None):
+        """按录制的时间线回放，service 为已经 start 的 AudioTranslateService（音频源为 audio_sources()）"""
+        self.stopped.clear()
+        self.start_wall = time.time()
+        started = time.perf_counter()
+        for record in self.records:
+            if self.stopped.is_set():
+                break
+            if self.speed > 0:
+                delay = record.t / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    self.stopped.wait(delay)
+            if record.kind == KIND_CAPTURE:
+                source = self.sources[record.stream]
+                data, capture_time = record.audio()
+                if source.callback:
+                    source.callback(data, self.map_time(capture_time))
+            elif record.kind == KIND_SOURCE:
+                # 设备切换后的新格式
+                info = record.json()
+                self.sources[record.stream].rate = info['rate']
+                self.sources[record.stream].channels = info['channels']
+            elif record.kind == KIND_SEND and not self.has_source_audio:
+                data, capture_time = record.audio()
+                pipeline = service.pipelines.get(self.streams[record.stream][0])
+                if pipeline is not None:
+                    service.dispatch(pipeline, data, self.map_time(capture_time))
+            elif record.kind in (KIND_MESSAGE, KIND_EVENT):
+                key = self.streams[record.stream]
+                translator = self.translators.get(key)
+                # 录制了原始消息的会话由消息重新生成事件，录制的事件只用于核对
+                if translator is not None and (record.kind == KIND_MESSAGE) == self.stream_messages[key]:
+                    translator.deliver(record)
+            if on_progress:
+                on_progress(record.t)
+
+    def stop(self):
+        self.stopped.set()
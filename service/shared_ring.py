@@ -0,0 +1,109 @@
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+HEADER_SIZE = 64
+LENGTH = struct.Struct('<I')
+
+
+class SharedRing:
+    """跨进程的单生产者单消费者环形缓冲区，按记录读写
+
+    共享内存开头是 write_pos / read_pos / dropped / capacity 四个 uint64，其后是数据区。
+    位置只增不减，生产者写完整条记录后才推进 write_pos，消费者读完后推进 read_pos，
+    因此两端都不需要锁；进程在写一半时退出也不会留下半条记录。
+    空间不足时 write 直接丢弃并返回 False，采集回调永远不会等待。
+
+    Args:
+        capacity: 数据区字节数
+        name: 为 None 时新建共享内存，否则连接已有的共享内存
+    """
+
+    def __init__(self, capacity: int = 1 << 20, name: Optional[str] = None):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + capacity)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.counters = np.ndarray((4,), dtype=np.uint64, buffer=self.shm.buf)
+        if self.owner:
+            self.counters[:] = (0, 0, 0, capacity)
+        # 共享内存的实际大小可能按页对齐，容量以创建方写入的为准
+        self.capacity = int(self.counters[3])
+        self.data = self.shm.buf[HEADER_SIZE:HEADER_SIZE + self.capacity]
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def dropped(self) -> int:
+        return int(self.counters[2])
+
+    def pending(self) -> int:
+        return int(self.counters[0]) - int(self.counters[1])
+
+    def write(self, *parts: bytes) -> bool:
+        """把 parts 拼成一条记录写入，只能由一个生产者调用"""
+        length = sum(len(part) for part in parts)
+        write_pos = int(self.counters[0])
+        if LENGTH.size + length > self.capacity - (write_pos - int(self.counters[1])):
+            self.counters[2] += 1
+            return False
+        pos = self._copy_in(write_pos, LENGTH.pack(length))
+        for part in parts:
+            pos = self._copy_in(pos, part)
+        self.counters[0] = pos
+        return True
+
+    def read(self) -> Optional[bytes]:
+        """取出一条记录，没有数据时返回 None，只能由一个消费者调用"""
+        read_pos = int(self.counters[1])
+        if int(self.counters[0]) == read_pos:
+            return None
+        length, = LENGTH.unpack(self._copy_out(read_pos, LENGTH.size))
+        record = self._copy_out(read_pos + LENGTH.size, length)
+        self.counters[1] = read_pos + LENGTH.size + length
+        return record
+
+    def read_wait(self, timeout: float, poll_interval: float = 0.005) -> Optional[bytes]:
+        """轮询等待一条记录，超时返回 None"""
+        deadline = time.monotonic() + timeout
+        while True:
+            record = self.read()
+            if record is not None or time.monotonic() >= deadline:
+                return record
+            time.sleep(poll_interval)
+
+    def skip_all(self):
+        """消费者丢弃所有未读记录，新的工作进程不处理上一个进程遗留的音频"""
+        self.counters[1] = self.counters[0]
+
+    def _copy_in(self, pos: int, part: bytes) -> int:
+        part = memoryview(part)
+        offset = pos % self.capacity
+        first = min(len(part), self.capacity - offset)
+        self.data[offset:offset + first] = part[:first]
+        if first < len(part):
+            self.data[:len(part) - first] = part[first:]
+        return pos + len(part)
+
+    def _copy_out(self, pos: int, n: int) -> bytes:
+        offset = pos % self.capacity
+        first = min(n, self.capacity - offset)
+        if first == n:
+            return bytes(self.data[offset:offset + n])
+        return bytes(self.data[offset:]) + bytes(self.data[:n - first])
+
+    def close(self):
+        # numpy 视图和 memoryview 都引用着共享内存，必须先释放才能关闭
+        self.counters = None
+        self.data.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
@@ -0,0 +1,146 @@
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from loguru import logger
+
+from config import Config
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer: 'SpanTracer', name: str, args: Optional[dict]):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.complete(self.name, self.start, args=self.args)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class SpanTracer:
+    """跨线程的时间段记录，导出为 Chrome trace（chrome://tracing、ui.perfetto.dev 可直接打开）
+
+    采集回调、WebSocket 收包、事件分发、Qt 主线程和字幕窗口线程上的耗时用 span 记录，
+    在同一条时间线上按线程排列，能看出各线程之间如何交错。
+    记录写入预分配的环形列表，槽位下标来自原子自增的计数器，记录时不加锁；写满后覆盖最旧的记录。
+    未启用时 span 返回共享的空上下文，instant / complete 直接返回，开销只有一次属性判断。
+
+    名称用 "分类.名称" 的形式（例如 audio.resample），分类在导出时作为 cat。
+    时间取 time.perf_counter()，各进程使用同一个单调时钟，工作进程导出的文件可与主进程的合并查看。
+    """
+
+    def __init__(self, capacity: int = 65536):
+        self.enabled = False
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.counter = itertools.count()
+        self.thread_names = {}
+        self.directory = './traces'
+
+    def enable(self, capacity: Optional[int] = None):
+        if capacity and capacity != self.capacity:
+            self.capacity = capacity
+            self.slots = [None] * capacity
+        self.enabled = True
+        logger.info(f'Span tracing enabled, keeping the latest {self.capacity} spans')
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.slots = [None] * self.capacity
+
+    def span(self, name: str, args: Optional[dict] = None):
+        """with tracer.span('audio.resample'): ... 记录一段耗时"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def complete(self, name: str, start: float, end: Optional[float] = None, args: Optional[dict] = None):
+        """记录已经测量好的一段时间，start / end 为 time.perf_counter() 的值"""
+        if not self.enabled:
+            return
+        if end is None:
+            end = time.perf_counter()
+        self._record(('X', name, start, end - start, args))
+
+    def instant(self, name: str, args: Optional[dict] = None):
+        """记录一个时间点，例如收到服务端消息、字幕过期"""
+        if not self.enabled:
+            return
+        self._record(('i', name, time.perf_counter(), 0.0, args))
+
+    def _record(self, record: tuple):
+        tid = threading.get_native_id()
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        # itertools.count 的 next 在 GIL 下是原子的，写入槽位是一次列表赋值，多个线程同时记录也不需要加锁
+        self.slots[next(self.counter) % self.capacity] = record + (tid,)
+
+    def events(self) -> list:
+        """按 Chrome trace event 格式返回环中现有的记录（按时间排序）"""
+        pid = os.getpid()
+        records = sorted((record for record in list(self.slots) if record is not None), key=lambda r: r[2])
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                   'args': {'name': f'auto_subtitle ({pid})'}}]
+        for tid, name in list(self.thread_names.items()):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+        for phase, name, start, duration, args, tid in records:
+            event = {'name': name, 'cat': name.split('.', 1)[0], 'ph': phase, 'ts': round(start * 1e6, 1),
+                     'pid': pid, 'tid': tid}
+            if phase == 'X':
+                event['dur'] = round(duration * 1e6, 1)
+            else:
+                event['s'] = 't'
+            if args:
+                event['args'] = args
+            events.append(event)
+        return events
+
+    def dump(self, path: Optional[str] = None) -> str:
+        """把当前环中的记录写成 Chrome trace JSON，返回文件路径；记录不清空，可多次导出"""
+        if path is None:
+            os.makedirs(self.directory, exist_ok=True)
+            name = time.strftime('trace_%Y%m%d_%H%M%S', time.localtime())
+            path = os.path.join(self.directory, f'{name}_{os.getpid()}.json')
+        events = self.events()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        logger.info(f'Wrote {len(events)} trace events to {path}')
+        return path
+
+
+# 全局 tracer，各模块直接导入使用；未调用 configure / enable 时不记录
+tracer = SpanTracer()
+
+
+def configure() -> SpanTracer:
+    """按 trace.* 配置启用全局 tracer，每个进程启动时调用一次"""
+    config = Config()
+    tracer.directory = config.get('trace.dir', './traces')
+    if config.get('trace.enabled', False) and not tracer.enabled:
+        tracer.enable(int(config.get('trace.capacity', 65536)))
+    return tracer
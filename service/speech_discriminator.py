@@ -0,0 +1,145 @@
+import time
+from typing import Optional
+
+import numpy as np
+
+from config import Config
+
+
+class SpeechDiscriminator:
+    """在发送前的单声道音频上区分语音和音乐 / 平稳噪声，非语音段不发送
+
+    每块音频接在上一块的尾部后用 sliding_window_view 一次切出所有帧（约 32ms，半帧移，不拷贝），
+    加窗后整批做 rfft，在 100~4000Hz 内逐帧算出：
+        能量      对数能量
+        flatness  谱平坦度（几何平均 / 算术平均），噪声接近 1，乐音接近 0
+        flux      相邻两帧归一化幅度谱的差，音色变化越快越大
+    最近 window_ms 的帧特征组成窗口，每块算一次窗口特征：
+        mod4      对数能量包络的调制谱中 3~7Hz 所占的比例，语音的音节速率约 4Hz
+        low       能量低于窗口平均能量一半的帧的比例，语音有音节间的低谷，音乐和噪声很少
+        flux_std  flux 的标准差，语音在元音、辅音、停顿之间频繁切换
+        flatness  平坦度的均值，区分平稳噪声
+    按固定权重组合成 logistic 得分（权重在 benchmark/synthetic_signals.py 的合成信号上调出），
+    得分超过 threshold 判为语音；判为非语音要持续 hold_ms 才生效，避免句中停顿被截断。
+
+    Args:
+        rate: 采样率
+        window_ms: 窗口特征的时长
+        threshold: 语音得分阈值
+        hold_ms: 得分低于阈值持续多久后判为非语音
+    """
+
+    # logistic 权重：mod4, low, flux_std, flatness, 偏置
+    WEIGHTS = np.array([11.0, 5.0, 40.0, 2.0, -12.5])
+
+    def __init__(self, rate: int = 16000, window_ms: float = 1000, threshold: float = 0.5, hold_ms: float = 1000):
+        self.rate = rate
+        # 帧长约 32ms（取 32 的倍数，rfft 较快），半帧移，各采样率下的帧率和特征尺度相同
+        self.n_fft = max(32, int(round(rate * 0.032 / 32)) * 32)
+        self.hop = self.n_fft // 2
+        self.frame_rate = rate / self.hop
+        self.window = np.hanning(self.n_fft).astype(np.float32)
+        frequencies = np.fft.rfftfreq(self.n_fft, 1 / rate)
+        self.band = slice(int(np.searchsorted(frequencies, 100)), int(np.searchsorted(frequencies, 4000)))
+        self.window_frames = max(8, int(window_ms / 1000 * self.frame_rate))
+        modulation = np.fft.rfftfreq(self.window_frames, 1 / self.frame_rate)
+        self.mod_band = (modulation >= 3) & (modulation <= 7)
+        self.mod_window = np.hanning(self.window_frames)
+        self.threshold = threshold
+        self.hold = hold_ms / 1000
+        self.tail = np.zeros(0, dtype=np.float32)
+        self.last_magnitude: Optional[np.ndarray] = None
+        # 最近 window_frames 帧的特征：对数能量、平坦度、flux
+        self.features = np.zeros((3, 0), dtype=np.float32)
+        self.score = 0.0
+        self.is_speech = True
+        self.below = 0.0
+        # 统计
+        self.seconds = 0.0
+        self.speech_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, rate: int) -> Optional['SpeechDiscriminator']:
+        """speech_gate.enabled 为 true 时创建"""
+        config = Config()
+        if not config.get('speech_gate.enabled', False):
+            return None
+        return cls(rate, threshold=float(config.get('speech_gate.threshold', 0.5)),
+                   hold_ms=float(config.get('speech_gate.hold_ms', 1000)))
+
+    def feed(self, data: bytes) -> bool:
+        """送入一块 int16 单声道音频，返回当前是否判为语音"""
+        start = time.perf_counter()
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+        seconds = len(samples) / self.rate
+        buffer = np.concatenate((self.tail, samples))
+        n = (len(buffer) - self.n_fft) // self.hop + 1 if len(buffer) >= self.n_fft else 0
+        if n > 0:
+            frames = np.lib.stride_tricks.sliding_window_view(buffer, self.n_fft)[::self.hop][:n]
+            self.tail = buffer[n * self.hop:]
+            self._add_frames(frames)
+            self.score = self._score()
+        else:
+            self.tail = buffer
+        if self.score >= self.threshold:
+            self.is_speech = True
+            self.below = 0.0
+        else:
+            self.below += seconds
+            if self.below >= self.hold:
+                self.is_speech = False
+        self.seconds += seconds
+        if self.is_speech:
+            self.speech_seconds += seconds
+        self.cpu_seconds += time.perf_counter() - start
+        return self.is_speech
+
+    def _add_frames(self, frames: np.ndarray):
+        power = np.abs(np.fft.rfft(frames * self.window, axis=1)[:, self.band]) ** 2 + 1e-12
+        energy = power.sum(axis=1)
+        flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+        magnitude = np.sqrt(power)
+        magnitude /= np.linalg.norm(magnitude, axis=1, keepdims=True)
+        previous = np.vstack((magnitude[:1] if self.last_magnitude is None else self.last_magnitude[None, :],
+                              magnitude[:-1]))
+        flux = np.sum((magnitude - previous) ** 2, axis=1)
+        self.last_magnitude = magnitude[-1]
+        features = np.vstack((np.log10(energy), flatness, flux)).astype(np.float32)
+        self.features = np.hstack((self.features, features))[:, -self.window_frames:]
+
+    def _score(self) -> float:
+        log_energy = self.features[0]
+        if len(log_energy) < self.window_frames:
+            # 窗口还没填满时维持原判断
+            return 1.0 if self.is_speech else 0.0
+        if log_energy.max() < -6:
+            # 接近静音，交给静音检测
+            return 0.0
+        values = np.append(self.feature_values(), 1.0)
+        return float(1 / (1 + np.exp(-values @ self.WEIGHTS)))
+
+    def feature_values(self) -> Optional[np.ndarray]:
+        """当前窗口的 (mod4, low, flux_std, flatness)，窗口未填满时为 None"""
+        log_energy, flatness, flux = self.features
+        if len(log_energy) < self.window_frames:
+            return None
+        envelope = (log_energy - log_energy.mean()) * self.mod_window
+        spectrum = np.abs(np.fft.rfft(envelope)) ** 2
+        mod4 = spectrum[self.mod_band].sum() / max(spectrum[1:].sum(), 1e-12)
+        linear = 10.0 ** log_energy
+        low = np.mean(linear < 0.5 * linear.mean())
+        return np.array([mod4, low, flux.std(), flatness.mean()])
+
+    def reset(self):
+        self.tail = np.zeros(0, dtype=np.float32)
+        self.last_magnitude = None
+        self.features = np.zeros((3, 0), dtype=np.float32)
+        self.score = 0.0
+        self.is_speech = True
+        self.below = 0.0
+
+    def report(self) -> str:
+        skipped = self.seconds - self.speech_seconds
+        return (f'speech gate: {skipped:.0f}s of {self.seconds:.0f}s non-silent audio classified as non-speech, '
+                f'{self.cpu_seconds / max(self.seconds, 1e-9) * 1000:.2f}ms CPU per audio-second')
@@ -0,0 +1,396 @@
+"""字幕广播服务器：把翻译结果推送给 OBS 浏览器源和局域网内的其他设备
+
+一个 asyncio 线程上的 HTTP 服务器：
+    GET /        字幕网页，背景透明，可直接作为 OBS 浏览器源；?hold=秒 设置整句显示时长
+    GET /ws      WebSocket 推送
+    GET /events  SSE（Server-Sent Events）推送
+两种推送的消息相同，都是 JSON：
+    {"t": "s", "ts": 毫秒, "d": [[轨道, sentence_id, 0, 文本, 是否整句], ...]}   连接时和重新同步时的完整状态
+    {"t": "u", "ts": 毫秒, "d": [[轨道, sentence_id, keep, 追加文本, 是否整句], ...]}   增量更新
+    {"t": "c"}                                                               清空（停止翻译）
+轨道为 "音频源/目标语言"。增量更新的新文本为 旧文本[:keep] + 追加文本（sentence_id 变化时旧文本为空），
+重复应用结果不变，所以丢掉部分更新后直接发一次完整状态即可恢复。
+
+每条消息只编码一次，所有客户端共享同样的字节。每个客户端有一个有上限的发送队列：
+队列满时丢弃其中的更新、改为发送一次完整状态；一次写入超过 stall_timeout 秒没有完成的客户端直接断开，
+慢的客户端不会拖慢其他客户端，服务器内存也不会随客户端积压增长。
+"""
+import asyncio
+import base64
+import collections
+import hashlib
+import json
+import socket
+import threading
+import time
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from model.event import TranslationEvent
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_REQUEST_BYTES = 8192
+# 每个推送连接在内核和 transport 中各最多缓冲这么多字节
+SEND_BUFFER_BYTES = 64 * 1024
+
+OVERLAY_HTML = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>auto_subtitle</title>
+<style>
+html, body { margin: 0; background: transparent; overflow: hidden; }
+#lanes { position: fixed; bottom: 4vh; width: 100%; display: flex; flex-direction: column-reverse;
+         align-items: center; font: 600 36px "Microsoft YaHei", sans-serif; color: #fff;
+         text-shadow: 0 0 4px #000, 0 0 4px #000; }
+.lane { margin: 4px 5%; text-align: center; }
+</style></head>
+<body><div id="lanes"></div>
+<script>
+const hold = (new URLSearchParams(location.search).get('hold') || 5) * 1000;
+const lanes = new Map();
+function render(key) {
+  const lane = lanes.get(key);
+  let div = document.getElementById('lane-' + key);
+  if (!div) {
+    div = document.createElement('div'); div.id = 'lane-' + key; div.className = 'lane';
+    document.getElementById('lanes').appendChild(div);
+  }
+  div.textContent = lane.text;
+  clearTimeout(lane.timer);
+  if (lane.final) lane.timer = setTimeout(() => { div.textContent = ''; }, hold);
+}
+function apply(msg) {
+  if (msg.t === 'c') { lanes.clear(); document.getElementById('lanes').textContent = ''; return; }
+  for (const [key, id, keep, suffix, final] of msg.d) {
+    const lane = lanes.get(key) || {id: null, text: ''};
+    const previous = lane.id === id ? lane.text : '';
+    lane.id = id; lane.text = previous.slice(0, keep) + suffix; lane.final = final;
+    lanes.set(key, lane); render(key);
+  }
+}
+function connect() {
+  const ws = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws');
+  ws.onmessage = (e) => apply(JSON.parse(e.data));
+  ws.onclose = () => setTimeout(connect, 1000);
+}
+connect();
+</script></body></html>
+'''
+
+
+def common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def ws_frame(payload: bytes, opcode: int = 0x1) -> bytes:
+    """服务端发出的 WebSocket 帧，不加掩码"""
+    length = len(payload)
+    if length < 126:
+        header = bytes((0x80 | opcode, length))
+    elif length < 65536:
+        header = bytes((0x80 | opcode, 126)) + length.to_bytes(2, 'big')
+    else:
+        header = bytes((0x80 | opcode, 127)) + length.to_bytes(8, 'big')
+    return header + payload
+
+
+class Message:
+    """一条广播消息，两种推送格式的字节都只编码一次"""
+    __slots__ = ('ws', 'sse')
+
+    def __init__(self, body: bytes):
+        self.ws = ws_frame(body)
+        self.sse = b'data: ' + body + b'\n\n'
+
+
+class Client:
+    __slots__ = ('writer', 'kind', 'queue', 'wakeup', 'needs_snapshot', 'address')
+
+    def __init__(self, writer: asyncio.StreamWriter, kind: str, address: str):
+        self.writer = writer
+        self.kind = kind
+        self.address = address
+        self.queue: Deque[Message] = collections.deque()
+        self.wakeup = asyncio.Event()
+        # 新连接和丢过更新的客户端先收到一次完整状态
+        self.needs_snapshot = True
+
+
+class SubtitleBroadcastServer:
+    """在独立线程上运行的字幕广播服务器
+
+    on_events 订阅事件总线（在分发线程上调用），只把事件交给服务器线程；增量计算、编码和发送都在服务器线程上完成。
+
+    Args:
+        host: 监听地址，127.0.0.1 只允许本机访问，0.0.0.0 允许局域网内其他设备访问
+        port: 监听端口，0 表示自动选择（实际端口见 self.port）
+        client_queue: 每个客户端最多积压的消息数，超出后丢弃积压的更新并重新同步
+        stall_timeout: 一次写入超过该秒数没有完成时断开客户端
+        max_clients: 同时连接的客户端上限
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8766, client_queue: int = 64,
+                 stall_timeout: float = 5.0, max_clients: int = 2000):
+        self.host = host
+        self.port = port
+        self.client_queue = client_queue
+        self.stall_timeout = stall_timeout
+        self.max_clients = max_clients
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.thread: Optional[threading.Thread] = None
+        self.clients: List[Client] = []
+        # 轨道 -> [sentence_id, 文本, 是否整句]，只在服务器线程上修改
+        self.lanes: Dict[str, list] = {}
+        self.snapshot: Optional[Message] = None
+        self.started = threading.Event()
+        # 统计
+        self.broadcasts = 0
+        self.resyncs = 0
+        self.dropped_clients = 0
+
+    @classmethod
+    def from_config(cls) -> Optional['SubtitleBroadcastServer']:
+        """broadcast.enabled 为 true 时按配置创建，否则返回 None"""
+        from config import Config
+
+        config = Config()
+        if not config.get('broadcast.enabled', False):
+            return None
+        return cls(host=config.get('broadcast.host', '127.0.0.1'), port=config.get('broadcast.port', 8766),
+                   client_queue=config.get('broadcast.client_queue', 64),
+                   stall_timeout=config.get('broadcast.stall_timeout', 5.0))
+
+    def start(self):
+        self.started.clear()
+        self.thread = threading.Thread(target=self._run, name='SubtitleBroadcast', daemon=True)
+        self.thread.start()
+        self.started.wait(timeout=5)
+        if self.server is None:
+            raise RuntimeError(f'Failed to start subtitle broadcast server on {self.host}:{self.port}')
+        logger.info(f'Subtitle broadcast on http://{self.host}:{self.port}/')
+
+    def stop(self):
+        loop = self.loop
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        if self.thread:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def on_events(self, events: List[TranslationEvent]):
+        loop = self.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._publish, events)
+
+    def clear(self):
+        """停止翻译时清空所有客户端的字幕"""
+        loop = self.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._clear)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, limit=MAX_REQUEST_BYTES))
+            self.port = self.server.sockets[0].getsockname()[1]
+        except OSError as e:
+            logger.error(f'Subtitle broadcast server failed to listen: {e}')
+            self.server = None
+            self.started.set()
+            self.loop.close()
+            self.loop = None
+            return
+        self.started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            # 取消所有连接的处理协程，各自在 finally 中关闭连接
+            # Python 3.11 的 wait_for 在内层刚好完成时会吞掉取消，没有结束的再取消一次；
+            # 没有连接时不调用 asyncio.wait，这个线程上没有设置当前事件循环
+            tasks = asyncio.all_tasks(self.loop)
+            for _ in range(10):
+                if not tasks:
+                    break
+                for task in tasks:
+                    task.cancel()
+                _, tasks = self.loop.run_until_complete(asyncio.wait(tasks, timeout=0.5))
+            self.loop.close()
+            self.loop = None
+
+    def _publish(self, events: List[TranslationEvent]):
+        # 同一批中同一句只保留最后一次结果，整句和下一句的开头按出现顺序保留
+        latest: Dict[Tuple[str, int], TranslationEvent] = {}
+        for event in events:
+            latest[(f'{event.source}/{event.target_language}', event.sentence_id)] = event
+        items = []
+        for (key, sentence_id), event in latest.items():
+            lane = self.lanes.get(key)
+            state = [sentence_id, event.sentence, event.is_sentence_ended]
+            if lane == state:
+                continue
+            previous = lane[1] if lane is not None and lane[0] == sentence_id else ''
+            keep = common_prefix(previous, event.sentence)
+            self.lanes[key] = state
+            items.append([key, sentence_id, keep, event.sentence[keep:], int(event.is_sentence_ended)])
+        if items:
+            self._broadcast(self._encode('u', items))
+
+    def _clear(self):
+        self.lanes = {}
+        self._broadcast(Message(b'{"t":"c"}'))
+
+    def _encode(self, kind: str, items: list) -> Message:
+        body = json.dumps({'t': kind, 'ts': int(time.time() * 1000), 'd': items}, ensure_ascii=False,
+                          separators=(',', ':'))
+        return Message(body.encode('utf-8'))
+
+    def _broadcast(self, message: Message):
+        self.snapshot = None
+        self.broadcasts += 1
+        for client in self.clients:
+            # 等待完整状态的客户端不需要增量
+            if not client.needs_snapshot:
+                if len(client.queue) >= self.client_queue:
+                    # 跟不上的客户端：丢掉积压的增量，之后发一次完整状态
+                    client.queue.clear()
+                    client.needs_snapshot = True
+                    self.resyncs += 1
+                else:
+                    client.queue.append(message)
+            client.wakeup.set()
+
+    def _snapshot(self) -> Message:
+        if self.snapshot is None:
+            self.snapshot = self._encode('s', [[key, lane[0], 0, lane[1], int(lane[2])]
+                                               for key, lane in self.lanes.items()])
+        return self.snapshot
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        address = str(writer.get_extra_info('peername'))
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10)
+            lines = request.decode('latin-1').split('\r\n')
+            method, target, _ = (lines[0].split(' ', 2) + ['', ''])[:3]
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            url = urlsplit(target)
+            if method != 'GET':
+                await self._respond(writer, '405 Method Not Allowed', b'')
+            elif url.path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._serve_ws(reader, writer, headers, address)
+            elif url.path == '/events':
+                await self._serve_sse(writer, address)
+            elif url.path in ('/', '/index.html'):
+                await self._respond(writer, '200 OK', OVERLAY_HTML.encode('utf-8'), 'text/html; charset=utf-8')
+            else:
+                await self._respond(writer, '404 Not Found', b'')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # 服务器停止时取消；正常返回，避免 asyncio.start_server 把取消当作未处理的异常报告
+            pass
+        except Exception as e:
+            logger.error(f'Subtitle broadcast client {address} failed: {e}')
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: str, body: bytes, content_type: str = 'text/plain'):
+        writer.write(f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n'
+                     f'Connection: close\r\n\r\n'.encode('latin-1') + body)
+        await writer.drain()
+
+    async def _serve_ws(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, headers: dict,
+                        address: str):
+        key = headers.get('sec-websocket-key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode('latin-1')).digest()).decode('latin-1')
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode('latin-1'))
+        client = Client(writer, 'ws', address)
+        receiver = asyncio.ensure_future(self._read_ws(reader, client))
+        try:
+            await self._send_loop(client, receiver)
+        finally:
+            receiver.cancel()
+            if receiver.done() and not receiver.cancelled():
+                # 客户端断开时读取会出错，取出异常避免 asyncio 报告未处理
+                receiver.exception()
+
+    async def _read_ws(self, reader: asyncio.StreamReader, client: Client):
+        """读取客户端发来的帧，只处理 ping 和 close，其余内容丢弃"""
+        while True:
+            head = await reader.readexactly(2)
+            opcode = head[0] & 0x0f
+            length = head[1] & 0x7f
+            if length == 126:
+                length = int.from_bytes(await reader.readexactly(2), 'big')
+            elif length == 127:
+                length = int.from_bytes(await reader.readexactly(8), 'big')
+            mask = await reader.readexactly(4) if head[1] & 0x80 else b''
+            if length > MAX_REQUEST_BYTES:
+                raise ValueError('client frame too large')
+            payload = await reader.readexactly(length)
+            if mask:
+                payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+            if opcode == 0x8:
+                client.writer.write(ws_frame(payload[:2], 0x8))
+                return
+            if opcode == 0x9:
+                client.writer.write(ws_frame(payload, 0xa))
+
+    async def _serve_sse(self, writer: asyncio.StreamWriter, address: str):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                     b'Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n')
+        await self._send_loop(Client(writer, 'sse', address))
+
+    async def _send_loop(self, client: Client, receiver: Optional[asyncio.Future] = None):
+        if len(self.clients) >= self.max_clients:
+            logger.warning(f'Subtitle broadcast refused {client.address}: {self.max_clients} clients connected')
+            return
+        # 内核发送缓冲区和 transport 缓冲区都限制在较小的值，跟不上的客户端很快就会在 drain 上等待，
+        # 积压转移到有上限的消息队列里
+        sock = client.writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_BYTES)
+        client.writer.transport.set_write_buffer_limits(high=SEND_BUFFER_BYTES)
+        self.clients.append(client)
+        try:
+            while receiver is None or not receiver.done():
+                if client.needs_snapshot:
+                    client.needs_snapshot = False
+                    client.queue.clear()
+                    client.writer.write(getattr(self._snapshot(), client.kind))
+                while client.queue:
+                    client.writer.write(getattr(client.queue.popleft(), client.kind))
+                try:
+                    await asyncio.wait_for(client.writer.drain(), timeout=self.stall_timeout)
+                except asyncio.TimeoutError:
+                    self.dropped_clients += 1
+                    logger.warning(f'Subtitle broadcast dropped stalled client {client.address}')
+                    return
+                client.wakeup.clear()
+                if client.queue or client.needs_snapshot:
+                    continue
+                if receiver is None:
+                    await client.wakeup.wait()
+                else:
+                    # WebSocket 客户端断开时 receiver 结束，不必等到下一次广播
+                    wakeup = asyncio.ensure_future(client.wakeup.wait())
+                    await asyncio.wait([wakeup, receiver], return_when=asyncio.FIRST_COMPLETED)
+                    wakeup.cancel()
+        finally:
+            self.clients.remove(client)
+
+    def stats(self) -> dict:
+        return {'clients': len(self.clients), 'broadcasts': self.broadcasts, 'resyncs': self.resyncs,
+                'dropped_clients': self.dropped_clients}
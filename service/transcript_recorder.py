@@ -0,0 +1,281 @@
+import collections
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from model.event import TranslationEvent
+
+FORMATS = ('srt', 'vtt', 'jsonl')
+FSYNC_NEVER = 'never'
+FSYNC_BATCH = 'batch'
+FSYNC_INTERVAL = 'interval'
+MIN_CUE_DURATION = 0.5
+# 编号相同的两次整句，开始时间相差不到该秒数才算同一句的重复结束
+REPEAT_WINDOW = 10.0
+
+
+def format_timestamp(seconds: float, separator: str) -> str:
+    millis = max(0, int(round(seconds * 1000)))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f'{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}'
+
+
+class TranscriptCue:
+    __slots__ = ('source', 'target_language', 'sentence_id', 'text', 'start', 'end')
+
+    def __init__(self, source: str, target_language: str, sentence_id: int, text: str, start: float, end: float):
+        self.source = source
+        self.target_language = target_language
+        self.sentence_id = sentence_id
+        self.text = text
+        self.start = start
+        self.end = max(end, start + MIN_CUE_DURATION)
+
+
+class TranscriptFile:
+    """一个输出文件，负责追加写入、按大小切分以及 fsync"""
+
+    def __init__(self, path: str, fmt: str, max_bytes: int):
+        self.base, self.ext = os.path.splitext(path)
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.part = 0
+        self.file = None
+        self.size = 0
+        self.cue_index = 0
+
+    def _open(self):
+        path = f'{self.base}{self.ext}' if self.part == 0 else f'{self.base}.part{self.part}{self.ext}'
+        self.file = open(path, 'a', encoding='utf-8')
+        self.size = self.file.tell()
+        self.cue_index = 0
+        if self.fmt == 'vtt' and self.size == 0:
+            self.size += self.file.write('WEBVTT\n\n')
+
+    def format(self, cue: TranscriptCue, session_start: float) -> str:
+        if self.fmt == 'jsonl':
+            return json.dumps({
+                'source': cue.source,
+                'target_language': cue.target_language,
+                'sentence_id': cue.sentence_id,
+                'start': round(cue.start - session_start, 3),
+                'end': round(cue.end - session_start, 3),
+                'text': cue.text,
+            }, ensure_ascii=False) + '\n'
+        self.cue_index += 1
+        separator = ',' if self.fmt == 'srt' else '.'
+        start = format_timestamp(cue.start - session_start, separator)
+        end = format_timestamp(cue.end - session_start, separator)
+        if self.fmt == 'srt':
+            return f'{self.cue_index}\n{start} --> {end}\n{cue.text}\n\n'
+        return f'{start} --> {end}\n{cue.text}\n\n'
+
+    def write(self, cues: List[TranscriptCue], session_start: float):
+        if self.file is None:
+            self._open()
+        elif self.max_bytes and self.size >= self.max_bytes:
+            self.file.close()
+            self.part += 1
+            self._open()
+        # 整批拼成一个字符串，只调用一次 write
+        content = ''.join(self.format(cue, session_start) for cue in cues)
+        self.size += len(content.encode('utf-8'))
+        self.file.write(content)
+        self.file.flush()
+
+    def fsync(self):
+        if self.file:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class TranscriptRecorder:
+    """把已完成的句子写成 SRT / WebVTT / JSONL 字幕文件
+
+    on_translate_event 在翻译回调线程上调用，只做入队，格式化和写文件都在后台线程中批量完成。
+    队列和未完成句子的起始时间都有数量上限，长时间录制内存不会增长。
+
+    Args:
+        directory: 输出目录
+        formats: 输出格式，srt / vtt / jsonl 的子集
+        fsync: never 只 flush；batch 每批写入后 fsync；interval 每隔 fsync_interval 秒 fsync
+        max_bytes: 单个文件超过该大小后切分为新文件，0 表示不切分
+        flush_interval: 后台线程最多攒多久写一次
+        max_pending: 队列中等待写入的句子上限，超出时丢弃；也是记录开始时间的未结束句子的上限，超出时淘汰最早的
+        hold: 整句结果到达后先保留多少秒再写入，期间同一句的新结果（对冲翻译换成更好的译文）替换旧的
+    """
+
+    def __init__(self, directory: str = './transcripts', formats: Optional[List[str]] = None,
+                 fsync: str = FSYNC_INTERVAL, fsync_interval: float = 5.0, max_bytes: int = 10 * 1024 * 1024,
+                 flush_interval: float = 1.0, max_pending: int = 10000, hold: float = 0.0):
+        self.directory = directory
+        self.formats = [fmt for fmt in (formats or FORMATS) if fmt in FORMATS]
+        self.fsync_policy = fsync
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.hold = hold
+        self.queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        # 没有结束的句子第一次出现的时间；永远等不到整句的句子超过 max_pending 后淘汰最早的
+        self.first_seen: 'collections.OrderedDict[Tuple[str, str, int], float]' = collections.OrderedDict()
+        self.files: Dict[Tuple[str, str, str], TranscriptFile] = {}
+        self.stopped = threading.Event()
+        self.thread = None
+        self.session_start = 0.0
+        self.session_name = ''
+        self.dropped = 0
+        self.written = 0
+        # 等待写入的整句：句子 -> (最新的结果, 可以写入的时刻)
+        self.held: 'collections.OrderedDict[Tuple[str, str, int], Tuple[TranscriptCue, float]]' = \
+            collections.OrderedDict()
+        # 最近写入的句子的开始时间，用于跳过重复的结束事件
+        self.written_starts: 'collections.OrderedDict[Tuple[str, str, int], float]' = collections.OrderedDict()
+
+    @classmethod
+    def from_config(cls) -> Optional['TranscriptRecorder']:
+        """transcript.enabled 为 true 时按配置创建，否则返回 None"""
+        from config import Config
+
+        config = Config()
+        if not config.get('transcript.enabled', False):
+            return None
+        # 对冲翻译在第一个整句之后 upgrade_window 秒内还可能换成 prefer 的译文，多留 1 秒给事件分发
+        hold = 0.0
+        if config.get('translator.model') == 'hedged' and config.get('translator.hedge.prefer'):
+            hold = float(config.get('translator.hedge.upgrade_window', 3.0)) + 1.0
+        return cls(
+            hold=float(config.get('transcript.hold', hold)),
+            directory=config.get('transcript.dir', './transcripts'),
+            formats=config.get('transcript.formats', list(FORMATS)),
+            fsync=config.get('transcript.fsync', FSYNC_INTERVAL),
+            fsync_interval=config.get('transcript.fsync_interval', 5.0),
+            max_bytes=config.get('transcript.max_bytes', 10 * 1024 * 1024),
+        )
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.session_start = time.time()
+        self.session_name = time.strftime('transcript_%Y%m%d_%H%M%S', time.localtime(self.session_start))
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logger.info(f'Transcript recording to {os.path.join(self.directory, self.session_name)}')
+
+    def on_translate_event(self, event: TranslationEvent):
+        key = (event.source, event.target_language, event.sentence_id)
+        if not event.is_sentence_ended:
+            # 没有音频时间时，用句子第一次出现的时间作为字幕开始时间
+            if event.audio_start is None and key not in self.first_seen:
+                self.first_seen[key] = event.create_time
+                if len(self.first_seen) > self.max_pending:
+                    self.first_seen.popitem(last=False)
+            return
+        start = self.first_seen.pop(key, event.create_time)
+        end = event.create_time
+        if event.audio_start is not None and event.audio_end is not None:
+            start, end = event.audio_start, event.audio_end
+        cue = TranscriptCue(event.source, event.target_language, event.sentence_id, event.sentence, start, end)
+        try:
+            self.queue.put_nowait((cue, time.monotonic()))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+            self.thread = None
+        self.first_seen.clear()
+        if self.dropped:
+            logger.warning(f'Transcript recorder dropped {self.dropped} sentences')
+
+    def _run(self):
+        last_fsync = time.monotonic()
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                if self.stopped.is_set() and not self.held:
+                    break
+                batch = []
+            # 攒一小段时间，把这期间到达的句子合并成一次写入
+            deadline = time.monotonic() + (0 if self.stopped.is_set() else self.flush_interval)
+            while batch and len(batch) < 1000:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            batch = self._release(batch, self.stopped.is_set())
+            if not batch:
+                continue
+            try:
+                self._write_batch(batch)
+                now = time.monotonic()
+                if self.fsync_policy == FSYNC_BATCH or (
+                        self.fsync_policy == FSYNC_INTERVAL and now - last_fsync >= self.fsync_interval):
+                    for transcript_file in self.files.values():
+                        transcript_file.fsync()
+                    last_fsync = now
+            except Exception as e:
+                logger.error(f'Failed to write transcript: {e}')
+        for transcript_file in self.files.values():
+            if self.fsync_policy != FSYNC_NEVER:
+                transcript_file.fsync()
+            transcript_file.close()
+        self.files = {}
+
+    def _release(self, arrived: List[Tuple[TranscriptCue, float]], flush_all: bool) -> List[TranscriptCue]:
+        """新到的整句先保留 hold 秒，同一句再次结束时替换保留的结果，返回到期可以写入的句子"""
+        for cue, received in arrived:
+            key = (cue.source, cue.target_language, cue.sentence_id)
+            held = self.held.get(key)
+            self.held[key] = (cue, held[1] if held else received + self.hold)
+        now = time.monotonic()
+        ready = []
+        while self.held:
+            key, (cue, due) = next(iter(self.held.items()))
+            if due > now and not flush_all:
+                break
+            del self.held[key]
+            ready.append(cue)
+        return ready
+
+    def _write_batch(self, batch: List[TranscriptCue]):
+        # 同一句再次结束时（对冲翻译换成了更好的译文）：同一批内以最后一次为准，已经写入的不再重复。
+        # 内置的翻译会话重连、轮换后 sentence_id 继续递增，编号相同即为同一句；
+        # 仍要求音频时间相近，第三方后端重连后从头编号时，新句子不会被当成重复丢掉
+        latest: Dict[Tuple[str, str, int], TranscriptCue] = {}
+        for cue in batch:
+            latest[(cue.source, cue.target_language, cue.sentence_id)] = cue
+        groups: Dict[Tuple[str, str], List[TranscriptCue]] = {}
+        for key, cue in latest.items():
+            written_start = self.written_starts.get(key)
+            if written_start is not None and abs(written_start - cue.start) < REPEAT_WINDOW:
+                continue
+            self.written_starts[key] = cue.start
+            if len(self.written_starts) > 256:
+                self.written_starts.popitem(last=False)
+            groups.setdefault((cue.source, cue.target_language), []).append(cue)
+        for (source, language), cues in groups.items():
+            for fmt in self.formats:
+                self._get_file(source, language, fmt).write(cues, self.session_start)
+        self.written += len(batch)
+
+    def _get_file(self, source: str, language: str, fmt: str) -> TranscriptFile:
+        key = (source, language, fmt)
+        if key not in self.files:
+            name = '.'.join(part for part in (self.session_name, source, language, fmt) if part)
+            self.files[key] = TranscriptFile(os.path.join(self.directory, name), fmt, self.max_bytes)
+        return self.files[key]
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def config():
+    """运行时覆盖的配置，用例结束后恢复"""
+    from config import Config
+
+    instance = Config()
+    saved = dict(instance._overrides)
+    yield instance
+    instance._overrides.clear()
+    instance._overrides.update(saved)
+
+
+@pytest.fixture
+def thread_errors(monkeypatch):
+    """收集后台线程中未捕获的异常"""
+    import threading
+
+    errors = []
+    monkeypatch.setattr(threading, 'excepthook', lambda args: errors.append(args.exc_value))
+    return errors
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from service.audio_mixer import AudioMixer
+from service.audio_source import SyntheticSource
+
+RATE = 16000
+FRAME = 3200
+
+
+def mono_source(label: str, **kwargs) -> SyntheticSource:
+    return SyntheticSource(label, frame_ms=200, rate=RATE, channels=1, **kwargs)
+
+
+class Collector:
+    def __init__(self):
+        self.frames = []
+        self.lock = threading.Lock()
+
+    def __call__(self, data: bytes, capture_time):
+        with self.lock:
+            self.frames.append((data, capture_time))
+
+
+def test_frames_are_sample_aligned_sums():
+    a = mono_source('a', frequency=220.0, seed=1)
+    b = mono_source('b', frequency=330.0, seed=2)
+    out = Collector()
+    mixer = AudioMixer(['a', 'b'], out, frame_size=FRAME, rate=RATE)
+    # 采集块为半帧：还没有数据的音频源不参与混音，两路都送过数据后才开始攒帧
+    half = FRAME // 2
+    signal_a, signal_b = [], []
+    for i in range(20):
+        chunk_a = a.generate(half)
+        chunk_b = b.generate(half)
+        mixer.push('a', chunk_a, 100.0 + i * 0.1)
+        mixer.push('b', chunk_b, 100.0 + i * 0.1 + 0.01)
+        signal_a.append(chunk_a)
+        signal_b.append(chunk_b)
+    mixed = (np.frombuffer(b''.join(signal_a), np.int16).astype(np.int32)
+             + np.frombuffer(b''.join(signal_b), np.int16))
+    expected = np.clip(mixed, -32768, 32767).astype(np.int16).tobytes()
+    assert [data for data, _ in out.frames] == [expected[i * FRAME * 2:(i + 1) * FRAME * 2] for i in range(10)]
+    # 采集时间取各音频源中最早的一个
+    assert [capture_time for _, capture_time in out.frames] == pytest.approx([100.0 + i * 0.2 for i in range(10)])
+    assert set(mixer.stats()) == {'a', 'b'}
+    assert all(stats['buffered'] == 0 and stats['dropped'] == 0 for stats in mixer.stats().values())
+
+
+def test_drifting_source_stays_bounded():
+    # b 的时钟快 10%，加速 20 倍运行约 1 秒，积压超过 max_skew 后被丢弃
+    a = mono_source('a', speed=20, duration=20)
+    b = mono_source('b', speed=20, duration=20, drift_ppm=100000)
+    max_skew = RATE // 2
+    peak = {'a': 0, 'b': 0}
+    frames = []
+
+    def on_frame(data: bytes, capture_time):
+        frames.append(len(data))
+        for label, buffer in mixer.buffers.items():
+            peak[label] = max(peak[label], buffer.size)
+
+    # stall_timeout 按实际时间计，加速 20 倍时 b 先结束后 a 要攒 6 秒音频才不再等 b，缓冲区放大到 8 秒
+    mixer = AudioMixer(['a', 'b'], on_frame, frame_size=FRAME, max_buffer=RATE * 8, max_skew=max_skew,
+                       stall_timeout=0.3, rate=RATE)
+    for source in (a, b):
+        source.start(lambda data, capture_time, label=source.label: mixer.push(label, data, capture_time))
+    for source in (a, b):
+        assert source.finished.wait(10)
+        source.stop()
+    assert set(frames) == {FRAME * 2}
+    stats = mixer.stats()
+    assert stats['b']['dropped'] > 0
+    assert stats['a']['dropped'] == 0
+    assert peak['b'] <= max_skew
+    # a 的 20 秒音频没有丢失：要么已经混出，要么还在缓冲区里等下一次送入
+    assert len(frames) * FRAME + stats['a']['buffered'] == 20 * RATE
+
+
+def test_stalled_source_is_not_waited_for():
+    a = mono_source('a')
+    b = mono_source('b')
+    out = Collector()
+    mixer = AudioMixer(['a', 'b'], out, frame_size=FRAME, stall_timeout=0.1, rate=RATE)
+    for _ in range(2):
+        mixer.push('a', a.generate(FRAME // 2))
+        mixer.push('b', b.generate(FRAME // 2))
+    assert len(out.frames) == 1
+    # b 还没超时：a 的数据等着对齐
+    mixer.push('a', a.generate(FRAME))
+    assert len(out.frames) == 1
+    time.sleep(0.15)
+    # b 超时后 a 单独输出，之前攒着的也一起输出
+    chunk = a.generate(FRAME)
+    mixer.push('a', chunk)
+    assert len(out.frames) == 3
+    assert out.frames[-1][0] == chunk
+    # b 恢复后重新参与混音
+    mixer.push('b', b.generate(FRAME))
+    mixer.push('a', a.generate(FRAME))
+    assert len(out.frames) == 4
+
+
+def test_frame_larger_than_buffer_is_rejected():
+    with pytest.raises(ValueError):
+        AudioMixer(['a', 'b'], lambda data, capture_time: None, frame_size=RATE * 3, max_buffer=RATE * 2)
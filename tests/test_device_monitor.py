@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from benchmark.mock_qwen_server import MockQwenServer
+from service import audio_source
+from service.audio_source import SyntheticSource
+from service.device_monitor import DeviceMonitor
+
+# 模拟的设备：名称 -> (采样率, 声道数)
+DEVICES = {'speakers': (48000, 2), 'headset': (16000, 1)}
+
+
+class FakeEndpoint:
+    """代替注册表中的系统默认设备"""
+
+    def __init__(self, device: str):
+        self.device = device
+
+    def __call__(self, flow: str):
+        return self.device
+
+
+class SwitchableSource(SyntheticSource):
+    """跟随系统默认输出设备的合成音频源，打开时采用当前默认设备的采样率和声道数"""
+
+    def __init__(self):
+        super().__init__('loopback', frame_ms=20, speech_sec=0.6, silence_sec=0.6, speed=2)
+        self.opened = []
+
+    def default_device_key(self):
+        return audio_source.get_default_endpoint('Render')
+
+    def start(self, callback):
+        self.device_key = self.default_device_key()
+        rate, channels = DEVICES[self.device_key]
+        # 换算采样位置，保持合成信号的时间轴连续
+        self.position = int(self.position * rate / self.rate)
+        self.rate = rate
+        self.channels = channels
+        self.opened.append((self.device_key, rate, channels))
+        super().start(callback)
+
+
+@pytest.fixture
+def qwen_server(config):
+    server = MockQwenServer(port=0, silence_ms=200).start()
+    config.override('translator.model', 'qwen')
+    config.override('translator.api_key', 'test')
+    config.override('translator.target_language', 'zh')
+    config.override('translator.ws_url', server.url)
+    config.override('audio.frame_ms', 20)
+    # 由用例调用 DeviceMonitor.check，不启动轮询线程
+    config.override('audio.device_monitor', False)
+    yield server
+    server.stop()
+
+
+def wait_for(predicate, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+def test_switch_keeps_translator_session(qwen_server, monkeypatch):
+    from service.audio_translate_service import AudioTranslateService
+
+    endpoint = FakeEndpoint('speakers')
+    monkeypatch.setattr(audio_source, 'get_default_endpoint', endpoint)
+    events = []
+    service = AudioTranslateService()
+    service.register_callback(events.append)
+    source = SwitchableSource()
+    service.start([source])
+    try:
+        translators = list(service.pipelines['loopback'].translators.values())
+        monitor = DeviceMonitor([source])
+        finals = lambda: [event.sentence_id for event in events if event.is_sentence_ended]  # noqa: E731
+        wait_for(lambda: len(finals()) >= 2)
+        assert monitor.check() is None
+
+        endpoint.device = 'headset'
+        switch = monitor.check()
+        assert switch is not None and switch.labels == ['loopback']
+        assert source.opened == [('speakers', 48000, 2), ('headset', 16000, 1)]
+        before = len(finals())
+        wait_for(lambda: len(finals()) >= before + 2)
+        assert switch.first_audio is not None
+        # 翻译会话没有重建，sentence_id 接着切换前的继续递增
+        current = list(service.pipelines['loopback'].translators.values())
+        assert len(current) == len(translators) and all(a is b for a, b in zip(current, translators))
+        ids = finals()
+        assert ids == sorted(set(ids))
+        assert qwen_server.connections == 1
+    finally:
+        service.stop()
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from benchmark.mock_qwen_server import MockQwenServer
+from service.idle_manager import ACTIVE, IDLE, READY, WAKING, IdleManager
+from translator.base import ITranslator
+
+RATE = 16000
+CHUNK = 0.1
+SILENCE = bytes(int(RATE * CHUNK) * 2)
+TONE = (8000 * np.sin(2 * np.pi * 220 * np.arange(int(RATE * CHUNK)) / RATE)).astype(np.int16).tobytes()
+
+
+def wait_for(predicate, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def go_idle(manager: IdleManager, process):
+    while manager.state == ACTIVE:
+        manager.feed(process, SILENCE, time.time(), CHUNK)
+        manager.observe(True, CHUNK)
+    assert manager.state == IDLE
+
+
+class SlowCloseTranslator(ITranslator):
+    """关闭旧连接要等 release 才完成"""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def start(self):
+        self.calls.append('start')
+
+    def detach(self):
+        self.calls.append('detach')
+
+        def finish():
+            self.release.wait(10)
+            self.calls.append('closed')
+        return finish
+
+
+def test_wake_does_not_wait_for_old_connection():
+    translator = SlowCloseTranslator()
+    manager = IdleManager('test', {'zh': translator}, timeout=0.3)
+    go_idle(manager, lambda data, capture_time: None)
+    wait_for(lambda: 'detach' in translator.calls)
+    manager.feed(lambda data, capture_time: None, TONE, time.time(), CHUNK)
+    wait_for(lambda: manager.state == READY, timeout=2)
+    # 新连接在让出旧连接之后打开，旧连接还没关完
+    assert translator.calls == ['detach', 'start']
+    translator.release.set()
+    wait_for(lambda: 'closed' in translator.calls)
+
+
+@pytest.fixture
+def qwen_server():
+    server = MockQwenServer(port=0, silence_ms=200).start()
+    yield server
+    server.stop()
+
+
+def test_wake_during_qwen_close_keeps_speech(qwen_server):
+    from translator.qwen_translator import QwenTranslator
+
+    translator = QwenTranslator(api_key='test', ws_url=qwen_server.url)
+    finals = []
+    translator.register_callback(lambda event: event.is_sentence_ended and finals.append(event.sentence))
+    translator.start()
+    manager = IdleManager('test', {'zh': translator}, timeout=0.3, preroll_ms=200)
+    process = translator.send_data
+    try:
+        go_idle(manager, process)
+        # 关闭线程还在等旧的 WebSocket 线程退出（最长 5 秒）时开始说话
+        wait_for(lambda: translator.ws is None)
+        woke = time.monotonic()
+        for _ in range(10):
+            manager.feed(process, TONE, time.time(), CHUNK)
+            time.sleep(0.02)
+        # 连上后下一次 feed 就处理完缓冲回到 active
+        wait_for(lambda: manager.state not in (IDLE, WAKING), timeout=2)
+        assert time.monotonic() - woke < 2
+        for chunk in [TONE] * 2 + [SILENCE] * 5:
+            manager.feed(process, chunk, time.time(), CHUNK)
+        wait_for(lambda: finals)
+        # 唤醒前的预卷和重新连接期间缓冲的 1.2 秒语音都发了出去
+        assert finals == ['sentence 1 1.2s']
+        assert qwen_server.connections == 2
+    finally:
+        translator.close()
@@ -0,0 +1,70 @@
+import re
+import wave
+
+import numpy as np
+import pytest
+
+from benchmark.mock_qwen_server import MockQwenServer
+from service.offline_subtitle_service import OfflineSubtitleService
+
+RATE = 44100
+# 有声音的片段：(开始秒数, 结束秒数)，其余为静音
+BURSTS = [(0.5, 1.5), (2.5, 3.7), (4.8, 5.6)]
+DURATION = 6.5
+
+TIMESTAMP = re.compile(r'(\d\d):(\d\d):(\d\d),(\d\d\d) --> (\d\d):(\d\d):(\d\d),(\d\d\d)')
+
+
+def write_wav(path):
+    t = np.arange(int(DURATION * RATE)) / RATE
+    signal = np.zeros(len(t))
+    for start, end in BURSTS:
+        voiced = (t >= start) & (t < end)
+        signal[voiced] = 8000 * np.sin(2 * np.pi * 220 * t[voiced])
+    # 双声道、44.1kHz，经过与实时采集相同的转单声道和重采样
+    frames = np.repeat(signal.astype(np.int16)[:, np.newaxis], 2, axis=1)
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(frames.tobytes())
+
+
+def seconds(hours, minutes, secs, millis) -> float:
+    return int(hours) * 3600 + int(minutes) * 60 + int(secs) + int(millis) / 1000
+
+
+@pytest.fixture
+def qwen_server(config):
+    server = MockQwenServer(port=0, silence_ms=200).start()
+    config.override('translator.model', 'qwen')
+    config.override('translator.api_key', 'test')
+    config.override('translator.ws_url', server.url)
+    yield server
+    server.stop()
+
+
+def test_srt_cues_follow_audio(qwen_server, tmp_path):
+    input_path = tmp_path / 'input.wav'
+    output_path = tmp_path / 'output.srt'
+    write_wav(input_path)
+    service = OfflineSubtitleService(concurrency=2, target_language='zh', settle_time=0.3, segment_timeout=10)
+    stats = service.run(str(input_path), str(output_path))
+    assert stats['segments'] == len(BURSTS)
+    assert stats['cues'] == len(BURSTS)
+
+    blocks = output_path.read_text(encoding='utf-8').strip().split('\n\n')
+    assert len(blocks) == len(BURSTS)
+    cues = []
+    for number, block in enumerate(blocks, 1):
+        lines = block.split('\n')
+        assert lines[0] == str(number)
+        match = TIMESTAMP.fullmatch(lines[1])
+        assert match
+        cues.append((seconds(*match.groups()[:4]), seconds(*match.groups()[4:]), lines[2]))
+    # 每条字幕落在对应片段的时间范围内，按时间顺序排列、互不重叠
+    for (start, end, text), (burst_start, burst_end) in zip(cues, BURSTS):
+        assert burst_start - 0.15 <= start < end <= burst_end + 0.15
+        assert text.startswith('sentence ')
+    assert all(previous[1] <= cue[0] for previous, cue in zip(cues, cues[1:]))
+    assert qwen_server.connections == 2
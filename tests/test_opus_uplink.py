@@ -0,0 +1,89 @@
+import struct
+
+import numpy as np
+import pytest
+
+pytest.importorskip('av')
+
+from benchmark.bench_opus_uplink import RATE, StandInReceiver, snr_db  # noqa: E402
+from benchmark.synthetic_signals import speech  # noqa: E402
+from translator.opus_uplink import OpusUplink  # noqa: E402
+
+
+def encode(pcm: np.ndarray, flush: bool = True, bitrate: int = 24000, frame_ms: float = 20):
+    uplink = OpusUplink(RATE, bitrate, frame_ms)
+    receiver = StandInReceiver()
+    data = pcm.tobytes()
+    chunk_bytes = RATE // 5 * 2
+    for offset in range(0, len(data), chunk_bytes):
+        out = uplink.encode(data[offset:offset + chunk_bytes])
+        if out:
+            receiver.receive(out)
+    if flush:
+        receiver.receive(uplink.flush())
+    return uplink, receiver
+
+
+def last_page(receiver: StandInReceiver):
+    """最后一个 Ogg 页的 (header_type, granule position)"""
+    stream = b''.join(receiver.chunks)
+    offset = stream.rfind(b'OggS')
+    return stream[offset + 5], struct.unpack_from('<q', stream, offset + 6)[0]
+
+
+@pytest.mark.parametrize('frame_ms', [10, 20, 40])
+def test_round_trip(frame_ms):
+    pcm, _ = speech(2.0, RATE, seed=1)
+    uplink, receiver = encode(pcm, frame_ms=frame_ms)
+    assert receiver.errors == []
+    decoded = receiver.decode()
+    assert len(decoded) == len(pcm)
+    header_type, granule = last_page(receiver)
+    assert header_type & 0x04
+    # granule 以 48kHz 计，包含 pre-skip，最后一帧可能补齐
+    samples_48k = len(pcm) * 48000 // RATE
+    assert samples_48k <= granule - uplink.pre_skip < samples_48k + 48 * frame_ms
+    assert snr_db(pcm, decoded) >= 10
+
+
+def test_flush_sends_held_back_samples():
+    pcm, _ = speech(2.0, RATE, seed=2)
+    _, unflushed = encode(pcm, flush=False)
+    header_type, _ = last_page(unflushed)
+    assert not header_type & 0x04
+    assert len(unflushed.decode()) < len(pcm)
+    uplink, flushed = encode(pcm)
+    assert len(flushed.decode()) == len(pcm)
+    assert uplink.flush() == b''
+
+
+def test_gummy_close_sends_uplink_tail(monkeypatch):
+    pytest.importorskip('dashscope')
+    from translator import gummy_translator
+
+    class FakeRecognizer:
+        def __init__(self, **kwargs):
+            self.frames = []
+
+        def start(self):
+            pass
+
+        def stop(self):
+            self.frames.append(None)
+
+        def send_audio_frame(self, data):
+            self.frames.append(data)
+
+        def get_last_package_delay(self):
+            return 0
+
+    monkeypatch.setattr(gummy_translator, 'TranslationRecognizerRealtime', FakeRecognizer)
+    translator = gummy_translator.GummyTranslator(api_key='test', uplink='opus')
+    pcm, _ = speech(1.0, RATE, seed=3)
+    translator.send_data(pcm.tobytes())
+    translator.close()
+    frames = translator.translator.frames
+    # 停止前发出了带结束标记的最后一页
+    assert frames[-1] is None
+    tail = frames[-2]
+    assert tail[tail.rfind(b'OggS') + 5] & 0x04
@@ -0,0 +1,42 @@
+import socket
+import time
+
+from model.event import TranslationEvent
+from service.subtitle_broadcast import SubtitleBroadcastServer
+
+
+def test_start_stop_without_clients(thread_errors):
+    server = SubtitleBroadcastServer(port=0)
+    server.start()
+    assert server.port != 0
+    server.stop()
+    assert server.loop is None
+    assert server.thread is None
+    assert thread_errors == []
+
+
+def test_stop_closes_connected_clients(thread_errors):
+    server = SubtitleBroadcastServer(port=0)
+    server.start()
+    client = socket.create_connection(('127.0.0.1', server.port), timeout=5)
+    client.sendall(b'GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    event = TranslationEvent()
+    event.sentence_id = 1
+    event.sentence = 'hello'
+    event.is_sentence_ended = True
+    event.source = 'test'
+    event.target_language = 'zh'
+    received = b''
+    deadline = time.monotonic() + 5
+    while b'hello' not in received and time.monotonic() < deadline:
+        server.on_events([event])
+        received += client.recv(65536)
+    assert b'hello' in received
+    server.stop()
+    assert server.loop is None
+    # 服务器关闭连接后读到 EOF
+    client.settimeout(5)
+    while client.recv(65536):
+        pass
+    client.close()
+    assert thread_errors == []
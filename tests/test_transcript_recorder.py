@@ -0,0 +1,35 @@
+from model.event import TranslationEvent
+from service.transcript_recorder import TranscriptRecorder
+
+
+def event(sentence_id: int, create_time: float, ended: bool = False) -> TranslationEvent:
+    result = TranslationEvent()
+    result.sentence_id = sentence_id
+    result.sentence = f'sentence {sentence_id}'
+    result.is_sentence_ended = ended
+    result.create_time = create_time
+    result.source = 'loopback'
+    result.target_language = 'zh'
+    return result
+
+
+def cue_starts(recorder: TranscriptRecorder) -> dict:
+    starts = {}
+    while not recorder.queue.empty():
+        cue, _ = recorder.queue.get_nowait()
+        starts[cue.sentence_id] = cue.start
+    return starts
+
+
+def test_first_seen_evicts_oldest_sentence(tmp_path):
+    recorder = TranscriptRecorder(directory=str(tmp_path), max_pending=3)
+    # 句子 1、2 永远等不到整句，不能让后来的句子记不下开始时间
+    for sentence_id in range(1, 6):
+        recorder.on_translate_event(event(sentence_id, 100.0 + sentence_id))
+        recorder.on_translate_event(event(sentence_id, 100.5 + sentence_id))
+    assert list(recorder.first_seen) == [('loopback', 'zh', 3), ('loopback', 'zh', 4), ('loopback', 'zh', 5)]
+    for sentence_id in (1, 5):
+        recorder.on_translate_event(event(sentence_id, 110.0 + sentence_id, ended=True))
+    # 被淘汰的句子用整句到达的时间，新句子仍然用第一次出现的时间
+    assert cue_starts(recorder) == {1: 111.0, 5: 105.0}
+    assert list(recorder.first_seen) == [('loopback', 'zh', 3), ('loopback', 'zh', 4)]
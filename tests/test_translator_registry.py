@@ -0,0 +1,32 @@
+import pytest
+from loguru import logger
+
+from translator.base import get_translator_spec
+from translator.registry import get_spec
+
+
+@pytest.fixture
+def warnings():
+    messages = []
+    handler = logger.add(messages.append, level='WARNING', format='{message}')
+    yield messages
+    logger.remove(handler)
+
+
+def test_unknown_model_falls_back_to_gummy(config, warnings):
+    config.override('translator.model', 'no-such-model')
+    assert get_translator_spec().name == 'gummy'
+    assert len(warnings) == 1
+    assert 'no-such-model' in warnings[0] and 'available: ' in warnings[0]
+
+
+def test_known_model(config, warnings):
+    config.override('translator.model', 'qwen')
+    assert get_translator_spec().name == 'qwen'
+    assert warnings == []
+
+
+def test_get_spec_rejects_unknown_model():
+    # 对冲翻译的 provider 等直接按名称查找的地方仍然报错
+    with pytest.raises(ValueError, match='no-such-model'):
+        get_spec('no-such-model')
@@ -1,56 +1,138 @@
-from typing import Callable, Optional
+import bisect
+from typing import Callable, List, Optional
 from loguru import logger
 from model.event import  TranslationEvent
 
 class ITranslator():
-    def send_data(self, data: bytes):...
+    def send_data(self, data: bytes, capture_time: Optional[float] = None):...
+    def start(self):
+        """Connect ahead of the first send_data, e.g. when resuming after close; a no-op for lazy backends"""
     def close(self):...
+    def detach(self) -> Callable[[], None]:
+        """Stop using the current connection and return a function that finishes closing it
+
+        start() may be called as soon as this returns, while the returned function
+        runs on another thread; backends that cannot reconnect before the old
+        connection is gone close it here and return a no-op.
+        """
+        self.close()
+        return lambda: None
     def register_callback(self, cb :Callable[[TranslationEvent],None]):...
+    def get_response_latency(self) -> Optional[float]:
+        """Most recent server round-trip latency in seconds, None if not measured yet"""
+        return None
+    def commit(self) -> bool:
+        """End the current sentence at the audio sent so far, False when the backend cannot"""
+        return False
+
+class AudioClock:
+    """Maps audio offsets within a translator session back to capture time
+
+    Servers report sentence timing relative to the first audio byte of the
+    session, and silent chunks are not sent, so every sent chunk records
+    (session offset, capture time) and offsets are interpolated from the
+    nearest preceding mark.
+    """
+
+    def __init__(self, sample_rate: int = 16000, max_marks: int = 4096):
+        self.sample_rate = sample_rate
+        self.max_marks = max_marks
+        self.offsets: List[int] = []
+        self.times: List[float] = []
+        self.sent_samples = 0
+
+    def reset(self):
+        self.offsets = []
+        self.times = []
+        self.sent_samples = 0
+
+    def mark(self, n_bytes: int, capture_time: Optional[float]):
+        """Record a sent chunk of 16 bit mono audio"""
+        if capture_time is not None:
+            if len(self.offsets) >= self.max_marks * 2:
+                del self.offsets[:self.max_marks]
+                del self.times[:self.max_marks]
+            self.offsets.append(self.sent_samples)
+            self.times.append(capture_time)
+        self.sent_samples += n_bytes // 2
+
+    def to_capture_time(self, offset_ms: Optional[float]) -> Optional[float]:
+        """Capture time of the audio at offset_ms in the session, None if unknown"""
+        if offset_ms is None or not self.offsets:
+            return None
+        offset = int(offset_ms * self.sample_rate / 1000)
+        index = max(0, bisect.bisect_right(self.offsets, offset) - 1)
+        return self.times[index] + (offset - self.offsets[index]) / self.sample_rate
+
+    def latest(self) -> Optional[float]:
+        """Capture time of the end of the audio sent so far"""
+        if not self.offsets:
+            return None
+        return self.times[-1] + (self.sent_samples - self.offsets[-1]) / self.sample_rate
+
+def get_target_languages() -> List[str]:
+    """Return the configured target languages
+
+    `translator.target_languages` lists every language shown at the same time;
+    when it is absent the single `translator.target_language` is used.
+    """
+    from config import Config
 
-def create_translator() -> Optional[ITranslator]:
+    config = Config()
+    languages = config.get('translator.target_languages')
+    if isinstance(languages, str):
+        languages = [languages]
+    if not languages:
+        languages = [config.get('translator.target_language', 'zh')]
+    # 去重但保持顺序，顺序决定字幕的显示位置
+    return list(dict.fromkeys(languages))
+
+def get_translator_spec():
+    """Return the registered backend selected by translator.model
+
+    An unknown model logs a warning and falls back to gummy, as before the
+    registry existed.
+    """
+    from config import Config
+    from translator.registry import get_spec
+
+    # Default to gummy for backward compatibility
+    model_name = Config().get('translator.model', 'gummy')
+    try:
+        return get_spec(model_name)
+    except ValueError as e:
+        logger.warning(f"{e}, falling back to gummy")
+        return get_spec('gummy')
+
+def create_translator(target_language: Optional[str] = None,
+                      sample_rate: Optional[int] = None) -> Optional[ITranslator]:
     """Factory function to create translator instance based on configuration
-    
+
+    The backend is looked up in translator.registry and its module is imported
+    only here, so unused backends and their SDKs are never loaded.
+
     Args:
-        config_data: Configuration dictionary, if None will load from config.yaml
-        
+        target_language: Target language of this translator session, if None will load from config.yaml
+        sample_rate: Sample rate of the audio that will be sent, negotiated with
+            translator.registry.negotiate; None uses the backend's preferred rate
+
     Returns:
         ITranslator instance or None if creation fails
     """
     from config import Config
 
     config = Config()
+    spec = get_translator_spec()
 
-    # Get translator configuration using Config's get method for nested access
-    model_name = config.get('translator.model', 'gummy')  # Default to gummy for backward compatibility
-    
     # Common parameters - use Config's get method for nested keys
     api_key = config.get('translator.api_key')  # Will be None if not set, letting each translator handle it
-    target_language = config.get('translator.target_language', 'zh')
+    if target_language is None:
+        target_language = config.get('translator.target_language', 'zh')
     source_language = config.get('translator.source_language', 'auto')
-    
+
     try:
-        if model_name == 'qwen':
-            from translator.qwen_translator import QwenTranslator
-            return QwenTranslator(
-                api_key=api_key,
-                target_language=target_language,
-                source_language=source_language
-            )
-        elif model_name == 'gummy':
-            from translator.gummy_translator import GummyTranslator
-            return GummyTranslator(
-                api_key=api_key,
-                target_language=target_language,
-                source_language=source_language
-            )
-        else:
-            logger.warning(f"Unknown translator model: {model_name}, falling back to gummy")
-            from translator.gummy_translator import GummyTranslator
-            return GummyTranslator(
-                api_key=api_key,
-                target_language=target_language,
-                source_language=source_language
-            )
+        return spec.create(config, api_key=api_key, target_language=target_language,
+                           source_language=source_language, sample_rate=sample_rate)
     except Exception as e:
-        logger.error(f"Failed to create translator {model_name}: {e}")
+        logger.error(f"Failed to create translator {spec.name}: {e}")
         raise
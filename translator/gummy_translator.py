@@ -2,20 +2,28 @@ import time
 
 import dashscope
 from dashscope.audio.asr import *
-from typing import Callable
+from typing import Callable, Optional
 
 from loguru import logger
 
 from model.event import TranslationEvent
-from translator.base import ITranslator
+from service.span_tracer import tracer
+from translator.base import AudioClock, ITranslator
+from translator.opus_uplink import OpusUplink
 
 class GummyTranslator(ITranslator):
-    def __init__(self, api_key: str = None, target_language: str = "zh",source_language: str = "auto"):
+    def __init__(self, api_key: str = None, target_language: str = "zh",source_language: str = "auto",
+                 sample_rate: int = 16000, uplink: str = 'pcm', uplink_bitrate: int = 24000,
+                 uplink_frame_ms: float = 20):
         """Initialize GummyTranslator with dashscope configuration
         
         Args:
             api_key: Dashscope API key. If None, will use environment variable or config
             target_language: Target language for translation (default: Chinese)
+            sample_rate: Sample rate of the pcm16 audio passed to send_data, 16000 or above
+            uplink: pcm sends the audio as is, opus compresses it to an Ogg Opus stream before sending
+            uplink_bitrate: Opus bitrate in bit/s
+            uplink_frame_ms: Opus frame duration in milliseconds
         """
         if api_key is None:
             raise RuntimeError('empty api_key')
@@ -26,13 +34,28 @@ class GummyTranslator(ITranslator):
         self.callback = None
         self.translator = None
         self.is_running = False
+        # 会话内音频偏移与采集时间的对应关系
+        self.audio_clock = AudioClock(sample_rate)
+        # SDK 的 sentence_id 每个会话从头编号，重连后加上偏移，避免与字幕中等待删除的旧句子重复
+        self.sentence_id_base = 0
+        self.last_sentence_id = -1
+        self.uplink_options = (uplink_bitrate, uplink_frame_ms)
+        self.uplink = None
+        audio_format = 'pcm'
+        if uplink == 'opus':
+            # 压缩后约为 PCM 的十分之一，弱网下发送不再排队；每个会话（含重连）使用新的 Ogg 流
+            self.uplink = OpusUplink(sample_rate, uplink_bitrate, uplink_frame_ms)
+            audio_format = 'opus'
+            sample_rate = self.uplink.rate
+        elif uplink != 'pcm':
+            raise ValueError(f'Unknown uplink codec: {uplink}')
 
         # 创建回调实例
         self.recognition_callback = self.RecognitionCallback(self)
         self.translator = TranslationRecognizerRealtime(
             model="gummy-realtime-v1",
-            format="pcm",
-            sample_rate=16000,
+            format=audio_format,
+            sample_rate=sample_rate,
             transcription_enabled=False,
             translation_enabled=True,
             source_language=source_language,
@@ -68,6 +91,7 @@ class GummyTranslator(ITranslator):
             usage, 
         ) -> None:
             """Handle translation and transcription results"""
+            start = time.perf_counter()
             logger.debug(f'on_event: {request_id}, {usage}')
             
             # 处理翻译结果
@@ -78,29 +102,68 @@ class GummyTranslator(ITranslator):
                     # 创建翻译事件并触发回调
                     if self.parent.callback:
                         event = TranslationEvent()
-                        event.sentence_id = english_translation.sentence_id
+                        event.sentence_id = self.parent.sentence_id_base + english_translation.sentence_id
+                        self.parent.last_sentence_id = max(self.parent.last_sentence_id, event.sentence_id)
                         event.sentence = english_translation.text
                         event.is_sentence_ended = english_translation.is_sentence_end
                         event.create_time=time.time()
+                        event.target_language = self.parent.target_language
+                        # begin_time/end_time 为句子在会话音频中的毫秒偏移
+                        clock = self.parent.audio_clock
+                        event.audio_start = clock.to_capture_time(getattr(english_translation, 'begin_time', None))
+                        event.audio_end = clock.to_capture_time(getattr(english_translation, 'end_time', None))
+                        if event.audio_end is None and event.is_sentence_ended:
+                            event.audio_end = clock.latest()
                         self.parent.callback(event)
             
             # 处理转录结果
             if transcription_result is not None:
                 print("sentence id:", transcription_result.sentence_id)
                 print("transcription:", transcription_result.text)
+            tracer.complete('translator.response', start)
 
-    def send_data(self, data: bytes):
+    def send_data(self, data: bytes, capture_time: Optional[float] = None):
         if not self.is_running:
             self.start()
         if self.translator and self.is_running:
             logger.debug(f'data_len {len(data)},delay: {self.translator.get_last_package_delay()}')
-            self.translator.send_audio_frame(data)
+            payload = self.uplink.encode(data) if self.uplink else data
+            # 编码器攒不满一帧时没有输出
+            if payload:
+                self.translator.send_audio_frame(payload)
+            self.audio_clock.mark(len(data), capture_time)
 
     def close(self):
         """Close the translator and cleanup resources"""
-        self.is_running = False
         if self.translator:
+            if self.uplink:
+                self._flush_uplink()
+                logger.info(self.uplink.report())
             self.translator.stop()
+        self.is_running = False
+
+    def _flush_uplink(self):
+        """Send the samples the Opus encoder still holds and the end-of-stream page"""
+        if not self.uplink.started:
+            return
+        try:
+            tail = self.uplink.flush()
+            if tail:
+                self.translator.send_audio_frame(tail)
+        except Exception as e:
+            # 服务端已经关闭了会话时发不出去
+            logger.warning(f'Failed to flush Opus uplink: {e}')
+
+    def get_response_latency(self):
+        """Delay of the last audio package reported by the SDK"""
+        if self.translator and self.is_running:
+            try:
+                delay = self.translator.get_last_package_delay()
+            except Exception:
+                return None
+            if delay is not None and delay >= 0:
+                return delay / 1000
+        return None
 
     def register_callback(self, cb: Callable[[TranslationEvent], None]):
         """Register callback function for translation events
@@ -114,5 +177,12 @@ class GummyTranslator(ITranslator):
         """Start the translation service"""
         if not self.is_running:
             self.is_running = True
+            self.audio_clock.reset()
+            self.sentence_id_base = self.last_sentence_id + 1
+            if self.uplink and self.uplink.started:
+                # 重新连接后服务端从头解析，需要一个带 Ogg 头的新流；旧流没有结束时先发完
+                self._flush_uplink()
+                logger.info(self.uplink.report())
+                self.uplink = OpusUplink(self.uplink.input_rate, *self.uplink_options)
             self.translator.start()
             print("翻译服务已启动，等待音频数据...")
\ No newline at end of file
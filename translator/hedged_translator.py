@@ -0,0 +1,374 @@
+import collections
+import functools
+import queue
+import threading
+import time
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from model.event import TranslationEvent
+from translator.base import ITranslator
+
+# 发送队列中的 commit 标记，排在它之前的音频发出后再 commit
+COMMIT = object()
+
+
+class Provider:
+    """One backend of a hedged translator with its own send queue and win counters
+
+    Audio is sent from a dedicated thread so a provider that blocks (for
+    example while reconnecting) does not delay the others.
+
+    Args:
+        name: Label used in metrics and config (prefer)
+        translator: The wrapped translator session
+        budget_seconds: Audio seconds this provider may receive per budget_window, None for no limit
+        budget_window: Length of the rolling budget window in seconds
+        max_queue: Chunks waiting to be sent before new ones are dropped
+    """
+
+    def __init__(self, name: str, translator: ITranslator, budget_seconds: Optional[float] = None,
+                 budget_window: float = 3600.0, max_queue: int = 50):
+        self.name = name
+        self.translator = translator
+        self.budget_seconds = budget_seconds
+        self.budget_window = budget_window
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.thread: Optional[threading.Thread] = None
+        # 预算窗口内每次发送的 (时间, 音频秒数)
+        self.sent: Deque[Tuple[float, float]] = collections.deque()
+        self.sent_seconds = 0.0
+        self.over_budget_seconds = 0.0
+        self.dropped = 0
+        self.first_wins = 0
+        self.final_wins = 0
+        # 本 provider 的整句结果比另一个早到的时间（秒），以及整句结果相对音频结束的延迟
+        self.leads: Deque[float] = collections.deque(maxlen=200)
+        self.latencies: Deque[float] = collections.deque(maxlen=200)
+
+    def within_budget(self, now: float, seconds: float) -> bool:
+        if self.budget_seconds is None:
+            return True
+        while self.sent and now - self.sent[0][0] > self.budget_window:
+            self.sent_seconds -= self.sent.popleft()[1]
+        if self.sent_seconds + seconds > self.budget_seconds:
+            return False
+        self.sent.append((now, seconds))
+        self.sent_seconds += seconds
+        return True
+
+    def send(self, data: bytes, capture_time: Optional[float]):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name=f'HedgeSend-{self.name}', daemon=True)
+            self.thread.start()
+        try:
+            self.queue.put_nowait((data, capture_time))
+        except queue.Full:
+            self.dropped += 1
+
+    def commit(self) -> bool:
+        """Commit after the audio already queued for this provider has been sent"""
+        if self.thread is None:
+            return self.translator.commit()
+        try:
+            self.queue.put_nowait(COMMIT)
+        except queue.Full:
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                if item is COMMIT:
+                    self.translator.commit()
+                else:
+                    self.translator.send_data(*item)
+            except Exception as e:
+                logger.error(f'Hedged provider {self.name} failed to send audio: {e}')
+
+    def close(self):
+        if self.thread is not None:
+            # 队列满时丢掉积压的音频，保证结束标记能放进去
+            while True:
+                try:
+                    self.queue.put_nowait(None)
+                    break
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                    except queue.Empty:
+                        pass
+            self.thread.join(timeout=5)
+            self.thread = None
+        self.translator.close()
+
+
+class Segment:
+    """One sentence on screen, made of the matching sentences of each provider"""
+
+    __slots__ = ('sentence_id', 'start', 'end', 'owner', 'final_provider', 'final_time', 'upgraded',
+                 'members', 'last_event', 'ended')
+
+    def __init__(self, sentence_id: int, start: Optional[float]):
+        self.sentence_id = sentence_id
+        self.start = start
+        self.end: Optional[float] = None
+        # 正在显示其中间结果的 provider，以及最先给出整句结果的 provider
+        self.owner: Optional[str] = None
+        self.final_provider: Optional[str] = None
+        self.final_time = 0.0
+        self.upgraded = False
+        # provider -> 对应到本句的该 provider 的 sentence_id
+        self.members: Dict[str, List[int]] = {}
+        self.last_event: Dict[str, float] = {}
+        self.ended = set()
+
+    def shown_by(self) -> Optional[str]:
+        return self.final_provider or self.owner
+
+
+class HedgedTranslator(ITranslator):
+    """Streams the same audio to several backends and shows whichever result arrives first
+
+    Sentences of the providers are aligned by audio time: a provider sentence
+    joins the segment whose audio start is within align_tolerance seconds of
+    its own; a sentence starting inside a segment the provider already
+    contributed to is a split of that sentence, shown on its own only when
+    that provider is the one on screen. Per segment the first provider to
+    produce a partial owns the display until it stalls for stall_timeout
+    seconds, and the first final result wins. When prefer names a provider
+    and its final arrives within upgrade_window seconds after another
+    provider won, the sentence is re-sent with the preferred text.
+
+    Args:
+        providers: Backends as model names or dicts with "model", optional
+            "name", "api_key" and constructor options such as "ws_url";
+            the first one is the primary and is never limited by budget
+        prefer: Provider whose final text replaces an earlier winner's
+        upgrade_window: Seconds after the first final during which an upgrade is still shown
+        stall_timeout: Seconds without partials before another provider takes over a sentence
+        align_tolerance: Maximum audio start difference of matching sentences in seconds
+        budget_minutes: Audio minutes per budget_window sent to each non-primary provider, None for no limit
+        budget_window: Length of the rolling budget window in seconds
+        report_interval: Seconds between win metrics in the log
+    """
+
+    def __init__(self, api_key: str = None, target_language: str = "zh", source_language: str = "auto",
+                 sample_rate: int = 16000, providers: Optional[list] = None, prefer: Optional[str] = None,
+                 upgrade_window: float = 3.0, stall_timeout: float = 1.0, align_tolerance: float = 0.8,
+                 budget_minutes: Optional[float] = None, budget_window: float = 3600.0,
+                 report_interval: float = 60.0, max_segments: int = 64):
+        from config import Config
+        from translator.registry import get_spec
+
+        config = Config()
+        providers = providers or ['qwen', 'gummy']
+        if len(providers) < 2:
+            raise ValueError('hedged translator needs at least two providers')
+        self.target_language = target_language
+        self.sample_rate = sample_rate
+        self.prefer = prefer
+        self.upgrade_window = upgrade_window
+        self.stall_timeout = stall_timeout
+        self.align_tolerance = align_tolerance
+        self.report_interval = report_interval
+        self.callback = None
+        self.lock = threading.Lock()
+        self.providers: List[Provider] = []
+        for index, item in enumerate(providers):
+            options = dict(item) if isinstance(item, dict) else {'model': item}
+            model = options.pop('model')
+            name = options.pop('name', None) or model
+            if any(provider.name == name for provider in self.providers):
+                name = f'{name}{index}'
+            translator = get_spec(model).create(config, options.pop('api_key', api_key), target_language,
+                                                source_language, sample_rate, **options)
+            budget = budget_minutes * 60 if budget_minutes is not None and index > 0 else None
+            provider = Provider(name, translator, budget, budget_window)
+            translator.register_callback(functools.partial(self._on_event, provider))
+            self.providers.append(provider)
+        self.segments: Deque[Segment] = collections.deque()
+        self.max_segments = max_segments
+        self.mapping: Dict[Tuple[str, int], Tuple[Segment, bool]] = {}
+        self.sentence_id_counter = 0
+        self.upgrades = 0
+        self.takeovers = 0
+        self.suppressed = 0
+        self.last_report = time.monotonic()
+        logger.info(f'Hedged translator over {", ".join(provider.name for provider in self.providers)}')
+
+    def send_data(self, data: bytes, capture_time: Optional[float] = None):
+        seconds = len(data) / 2 / self.sample_rate
+        now = time.monotonic()
+        for provider in self.providers:
+            if provider.within_budget(now, seconds):
+                provider.send(data, capture_time)
+            else:
+                provider.over_budget_seconds += seconds
+
+    def _on_event(self, provider: Provider, event: TranslationEvent):
+        with self.lock:
+            now = time.time()
+            key = (provider.name, event.sentence_id)
+            if key not in self.mapping:
+                self.mapping[key] = self._align(provider, event)
+            segment, shadow = self.mapping[key]
+            latency = event.latency() if event.is_sentence_ended else None
+            if latency is not None:
+                provider.latencies.append(latency)
+            if shadow:
+                # 另一个 provider 已经显示了这段音频
+                return
+            segment.last_event[provider.name] = now
+            if event.audio_end is not None and event.is_sentence_ended:
+                segment.end = max(segment.end or event.audio_end, event.audio_end)
+            if segment.final_provider is None:
+                self._before_final(provider, segment, event, now)
+            elif event.is_sentence_ended and provider.name not in segment.ended:
+                self._after_final(provider, segment, event, now)
+            if event.is_sentence_ended:
+                segment.ended.add(provider.name)
+            self._maybe_report()
+
+    def _before_final(self, provider: Provider, segment: Segment, event: TranslationEvent, now: float):
+        if segment.owner is None:
+            segment.owner = provider.name
+            provider.first_wins += 1
+        if event.is_sentence_ended:
+            segment.final_provider = provider.name
+            segment.final_time = now
+            provider.final_wins += 1
+            self._emit(segment, event)
+            return
+        if segment.owner != provider.name:
+            # 显示中的 provider 卡住时由另一个接手
+            if now - segment.last_event.get(segment.owner, 0.0) < self.stall_timeout:
+                return
+            logger.debug(f'Hedged sentence {segment.sentence_id}: {provider.name} takes over from {segment.owner}')
+            segment.owner = provider.name
+            self.takeovers += 1
+        self._emit(segment, event)
+
+    def _after_final(self, provider: Provider, segment: Segment, event: TranslationEvent, now: float):
+        lead = now - segment.final_time
+        winner = self._provider(segment.final_provider)
+        if winner is not None and winner is not provider:
+            winner.leads.append(lead)
+        if (provider.name == self.prefer and segment.final_provider != provider.name and not segment.upgraded
+                and lead <= self.upgrade_window):
+            segment.upgraded = True
+            self.upgrades += 1
+            self._emit(segment, event)
+
+    def _align(self, provider: Provider, event: TranslationEvent) -> Tuple[Segment, bool]:
+        """Find the segment a new provider sentence belongs to, returns (segment, suppressed)"""
+        name = provider.name
+        start = event.audio_start
+        best = None
+        if start is not None:
+            distance = self.align_tolerance
+            for segment in self.segments:
+                if name in segment.members or segment.start is None:
+                    continue
+                if abs(segment.start - start) <= distance:
+                    best, distance = segment, abs(segment.start - start)
+        else:
+            # 没有音频时间时按顺序对齐到最早的、该 provider 还没有对应句子的未完成句
+            best = next((segment for segment in self.segments
+                         if name not in segment.members and segment.final_provider is None), None)
+        if best is not None:
+            best.members[name] = [event.sentence_id]
+            return best, False
+        if start is not None:
+            for segment in reversed(self.segments):
+                inside = segment.start is not None and segment.start <= start and (
+                    segment.end is None or start < segment.end)
+                if inside and name in segment.members:
+                    # 该 provider 把一句拆成了几句；显示中的是它自己时单独显示，否则已被另一个覆盖
+                    if segment.shown_by() == name:
+                        break
+                    segment.members[name].append(event.sentence_id)
+                    self.suppressed += 1
+                    return segment, True
+        self.sentence_id_counter += 1
+        segment = Segment(self.sentence_id_counter, start)
+        segment.members[name] = [event.sentence_id]
+        self.segments.append(segment)
+        if len(self.segments) > self.max_segments:
+            old = self.segments.popleft()
+            for member, sentence_ids in old.members.items():
+                for sentence_id in sentence_ids:
+                    self.mapping.pop((member, sentence_id), None)
+        return segment, False
+
+    def _emit(self, segment: Segment, source: TranslationEvent):
+        if not self.callback:
+            return
+        event = TranslationEvent()
+        event.sentence_id = segment.sentence_id
+        event.sentence = source.sentence
+        event.is_sentence_ended = source.is_sentence_ended
+        event.create_time = source.create_time or time.time()
+        event.target_language = self.target_language
+        event.audio_start = source.audio_start
+        event.audio_end = source.audio_end
+        self.callback(event)
+
+    def _provider(self, name: Optional[str]) -> Optional[Provider]:
+        return next((provider for provider in self.providers if provider.name == name), None)
+
+    def stats(self) -> dict:
+        result = {'upgrades': self.upgrades, 'takeovers': self.takeovers, 'suppressed': self.suppressed}
+        for provider in self.providers:
+            leads = sorted(provider.leads)
+            latencies = sorted(provider.latencies)
+            result[provider.name] = {
+                'first': provider.first_wins,
+                'final': provider.final_wins,
+                'lead_p50': round(leads[len(leads) // 2], 3) if leads else None,
+                'latency_p50': round(latencies[len(latencies) // 2], 3) if latencies else None,
+                'over_budget_seconds': round(provider.over_budget_seconds, 1),
+                'dropped': provider.dropped,
+            }
+        return result
+
+    def _maybe_report(self):
+        now = time.monotonic()
+        if now - self.last_report >= self.report_interval:
+            self.last_report = now
+            logger.info(f'Hedged translator wins: {self.stats()}')
+
+    def start(self):
+        for provider in self.providers:
+            try:
+                provider.translator.start()
+            except Exception as e:
+                # 发送时会再尝试连接
+                logger.error(f'Failed to start hedged provider {provider.name}: {e}')
+
+    def close(self):
+        for provider in self.providers:
+            try:
+                provider.close()
+            except Exception as e:
+                logger.error(f'Failed to close hedged provider {provider.name}: {e}')
+        logger.info(f'Hedged translator wins: {self.stats()}')
+        with self.lock:
+            self.segments.clear()
+            self.mapping.clear()
+
+    def commit(self) -> bool:
+        # 每个 provider 各自断句，都要通知
+        return any([provider.commit() for provider in self.providers])
+
+    def get_response_latency(self) -> Optional[float]:
+        latencies = [latency for latency in (provider.translator.get_response_latency()
+                                             for provider in self.providers) if latency is not None]
+        return min(latencies) if latencies else None
+
+    def register_callback(self, cb: Callable[[TranslationEvent], None]):
+        self.callback = cb
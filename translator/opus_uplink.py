@@ -0,0 +1,182 @@
+import struct
+import time
+from typing import List
+
+import numpy as np
+
+# Opus 编码器只支持这些采样率，其他采样率先重采样到不低于它的最近一个
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+OPUS_FRAME_MS = (2.5, 5, 10, 20, 40, 60)
+
+
+def _crc_table() -> List[int]:
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04c11db7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xffffffff)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def ogg_crc(data: bytes) -> int:
+    """Ogg page checksum: CRC-32, polynomial 0x04c11db7, not reflected, zero initial value"""
+    crc = 0
+    table = _CRC_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xffffffff) ^ table[(crc >> 24) ^ byte]
+    return crc
+
+
+class OggOpusStream:
+    """Minimal Ogg muxer for a single Opus stream (RFC 7845)
+
+    Every call to page() emits one complete page right away, so the packets of
+    one send_data call leave the process immediately instead of waiting for a
+    page to fill up as with a general purpose muxer.
+    """
+
+    PAGE_HEADER = struct.Struct('<4sBBqIIIB')
+
+    def __init__(self, opus_head: bytes, serial: int = 0x41535542):
+        self.serial = serial
+        self.sequence = 0
+        self.opus_head = opus_head
+
+    def headers(self) -> bytes:
+        tags = b'OpusTags' + struct.pack('<I', 13) + b'auto_subtitle' + struct.pack('<I', 0)
+        return self._page([self.opus_head], 0, 0x02) + self._page([tags], 0, 0x00)
+
+    def page(self, packets: List[bytes], granule: int, last: bool = False) -> bytes:
+        # 一页最多 255 个分段，包很多时拆成几页
+        pages = []
+        batch: List[bytes] = []
+        segments = 0
+        for packet in packets:
+            needed = len(packet) // 255 + 1
+            if batch and segments + needed > 255:
+                pages.append(self._page(batch, granule, 0))
+                batch, segments = [], 0
+            batch.append(packet)
+            segments += needed
+        pages.append(self._page(batch, granule, 0x04 if last else 0))
+        return b''.join(pages)
+
+    def _page(self, packets: List[bytes], granule: int, header_type: int) -> bytes:
+        lacing = bytearray()
+        for packet in packets:
+            lacing += b'\xff' * (len(packet) // 255) + bytes((len(packet) % 255,))
+        header = self.PAGE_HEADER.pack(b'OggS', 0, header_type, granule, self.serial, self.sequence, 0,
+                                       len(lacing))
+        self.sequence += 1
+        page = bytearray(header + lacing + b''.join(packets))
+        struct.pack_into('<I', page, 22, ogg_crc(page))
+        return bytes(page)
+
+
+class OpusUplink:
+    """Streaming Opus encoder for the translator uplink
+
+    Takes the pcm16 mono chunks the pipeline would send and returns Ogg Opus
+    bytes that can be sent in their place. Encoding runs in the calling
+    thread; every call returns the complete pages for the audio encoded so
+    far, the encoder holds back at most its lookahead (2.5 ms in lowdelay
+    mode) plus a partial frame.
+
+    Requires PyAV (av), already used for reading audio files.
+
+    Args:
+        sample_rate: Rate of the pcm16 input
+        bitrate: Target bitrate in bit/s
+        frame_ms: Opus frame duration, one of 2.5, 5, 10, 20, 40, 60
+        application: libopus application, lowdelay / voip / audio
+    """
+
+    def __init__(self, sample_rate: int = 16000, bitrate: int = 24000, frame_ms: float = 20,
+                 application: str = 'lowdelay'):
+        import av
+
+        if frame_ms not in OPUS_FRAME_MS:
+            raise ValueError(f'Opus frame duration must be one of {OPUS_FRAME_MS} ms, got {frame_ms}')
+        self.av = av
+        self.input_rate = sample_rate
+        self.rate = next((rate for rate in OPUS_SAMPLE_RATES if rate >= sample_rate), OPUS_SAMPLE_RATES[-1])
+        self.bitrate = bitrate
+        self.frame_ms = frame_ms
+        self.codec = av.CodecContext.create('libopus', 'w')
+        self.codec.sample_rate = self.rate
+        self.codec.layout = 'mono'
+        self.codec.format = 's16'
+        self.codec.bit_rate = bitrate
+        self.codec.options = {'application': application, 'frame_duration': str(frame_ms)}
+        self.codec.open()
+        self.resampler = (av.AudioResampler(format='s16', layout='mono', rate=self.rate)
+                          if self.rate != sample_rate else None)
+        head = bytes(self.codec.extradata or b'')
+        # Ogg Opus 的 granule position 以 48kHz 计，包含 pre-skip
+        self.pre_skip = struct.unpack_from('<H', head, 10)[0] if len(head) >= 19 else 0
+        self.ogg = OggOpusStream(head)
+        self.pts = 0
+        self.granule = 0
+        self.started = False
+        self.finished = False
+        # 统计：输入的 PCM 字节数、输出的字节数、编码耗时（CPU 秒）
+        self.pcm_bytes = 0
+        self.sent_bytes = 0
+        self.encode_seconds = 0.0
+
+    def encode(self, data: bytes) -> bytes:
+        """Encode one pcm16 mono chunk, returns the Ogg bytes ready to send (may be empty)"""
+        started = time.thread_time()
+        frame = self.av.AudioFrame.from_ndarray(np.frombuffer(data, dtype=np.int16).reshape(1, -1),
+                                                format='s16', layout='mono')
+        frame.sample_rate = self.input_rate
+        frame.pts = self.pts
+        self.pts += len(data) // 2
+        frames = self.resampler.resample(frame) if self.resampler else [frame]
+        packets = [packet for item in frames for packet in self.codec.encode(item)]
+        out = self._pages(packets)
+        self.pcm_bytes += len(data)
+        self.sent_bytes += len(out)
+        self.encode_seconds += time.thread_time() - started
+        return out
+
+    def flush(self) -> bytes:
+        """Encode the held back samples and end the stream"""
+        if self.finished:
+            return b''
+        self.finished = True
+        packets = []
+        if self.resampler:
+            for item in self.resampler.resample(None):
+                packets.extend(self.codec.encode(item))
+        packets.extend(self.codec.encode(None))
+        out = self._pages(packets, last=True)
+        self.sent_bytes += len(out)
+        return out
+
+    def _pages(self, packets, last: bool = False) -> bytes:
+        out = b''
+        if not self.started:
+            self.started = True
+            out = self.ogg.headers()
+        if packets or last:
+            for packet in packets:
+                self.granule = self.pre_skip + (packet.pts + packet.duration) * 48000 // self.rate
+            out += self.ogg.page([bytes(packet) for packet in packets], self.granule, last)
+        return out
+
+    def audio_seconds(self) -> float:
+        return self.pcm_bytes / 2 / self.input_rate
+
+    def report(self) -> str:
+        seconds = self.audio_seconds()
+        if not seconds:
+            return 'Opus uplink: no audio sent'
+        saved = 1 - self.sent_bytes / self.pcm_bytes
+        return (f'Opus uplink: {self.sent_bytes * 8 / seconds / 1000:.1f} kbit/s vs '
+                f'{self.pcm_bytes * 8 / seconds / 1000:.0f} kbit/s PCM ({saved:.0%} saved), '
+                f'encoder CPU {self.encode_seconds / seconds:.2%} of audio time')
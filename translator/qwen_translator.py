@@ -3,24 +3,30 @@ import json
 import os
 import threading
 import time
-from typing import Callable
+from typing import Callable, Optional
 
 import websocket
 from loguru import logger
 
 from model.event import TranslationEvent
-from translator.base import ITranslator
+from service.span_tracer import tracer
+from translator.base import AudioClock, ITranslator
 from config import Config
 
 
 class QwenTranslator(ITranslator):
-    def __init__(self, api_key: str = None, target_language: str = "zh", source_language: str = "auto"):
+    DEFAULT_WS_URL = "wss://dashscope.aliyuncs.com/api-ws/v1/realtime?model=qwen3-livetranslate-flash-realtime"
+
+    def __init__(self, api_key: str = None, target_language: str = "zh", source_language: str = "auto",
+                 ws_url: str = None, sample_rate: int = 16000):
         """Initialize QwenTranslator with Qwen3 live translate flash realtime model
         
         Args:
             api_key: Dashscope API key. If None, will use environment variable or config
             target_language: Target language for translation (default: Chinese)
             source_language: Source language for input audio (default: English)
+            ws_url: WebSocket endpoint, defaults to the Dashscope realtime service
+            sample_rate: Sample rate of the pcm16 audio passed to send_data, the service only accepts 16000
         """
         # 优先级：构造函数参数 > 配置文件 > 环境变量
         if api_key is None:
@@ -36,10 +42,18 @@ class QwenTranslator(ITranslator):
         self.startup_lock = threading.Lock()
         self.current_item_id = None
         self.current_sentence = ""
-        self.sentence_id_counter = 0  # 自增的sentence_id计数器
+        # 自增的sentence_id计数器；重连后不清零，避免与字幕中等待删除的旧句子重复
+        self.sentence_id_counter = 0
+        self.response_latency = None  # 最近一次 ping/pong 往返时间
+        # 服务端拒绝 input_audio_buffer.commit 后不再发送
+        self.commit_supported = True
+        self.commit_event_ids = set()
+        # 会话内音频偏移与采集时间的对应关系，以及每个 item 对应音频的 [开始, 结束] 采集时间
+        self.audio_clock = AudioClock(sample_rate)
+        self.item_audio_times = {}
         
         # WebSocket配置
-        self.ws_url = "wss://dashscope.aliyuncs.com/api-ws/v1/realtime?model=qwen3-livetranslate-flash-realtime"
+        self.ws_url = ws_url or self.DEFAULT_WS_URL
         
         # 会话配置 - 只输出文本
         self.session_config = {
@@ -71,7 +85,8 @@ class QwenTranslator(ITranslator):
             )
             
             logger.info("Connecting to Qwen3 live translate service...")
-            self.ws.run_forever()
+            # 定期 ping 既能保活，也能测量往返延迟
+            self.ws.run_forever(ping_interval=5)
             
         except Exception as e:
             logger.error(f"WebSocket connection error: {e}")
@@ -79,6 +94,8 @@ class QwenTranslator(ITranslator):
 
     def _on_open(self, ws):
         """Handle WebSocket connection opened"""
+        if self._is_stale(ws):
+            return
         logger.info("WebSocket connection established")
         self.is_running = True
         
@@ -94,6 +111,9 @@ class QwenTranslator(ITranslator):
 
     def _on_message(self, ws, message):
         """Handle incoming WebSocket messages"""
+        if self._is_stale(ws):
+            return
+        start = time.perf_counter()
         try:
             data = json.loads(message)
             logger.debug(f"Received event: {data.get('type', 'unknown')}")
@@ -106,6 +126,14 @@ class QwenTranslator(ITranslator):
             elif event_type == 'session.updated':
                 logger.info("Session updated successfully")
                 
+            elif event_type == 'input_audio_buffer.speech_started':
+                self._item_audio_times(data.get('item_id'))[0] = self.audio_clock.to_capture_time(
+                    data.get('audio_start_ms'))
+
+            elif event_type == 'input_audio_buffer.speech_stopped':
+                self._item_audio_times(data.get('item_id'))[1] = self.audio_clock.to_capture_time(
+                    data.get('audio_end_ms'))
+
             elif event_type == 'response.text.text':
                 # 处理句子中的部分翻译结果（未完成）
                 self._handle_text_partial_response(data)
@@ -115,12 +143,17 @@ class QwenTranslator(ITranslator):
                 self._handle_text_response(data)
                 
             elif event_type == 'error':
-                logger.error(f"Server error: {data.get('error', {})}")
+                error = data.get('error', {})
+                logger.error(f"Server error: {error}")
+                if isinstance(error, dict) and error.get('event_id') in self.commit_event_ids:
+                    logger.warning('Server does not accept input_audio_buffer.commit, relying on server endpointing')
+                    self.commit_supported = False
                 
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse message: {e}")
         except Exception as e:
             logger.error(f"Error processing message: {e}")
+        tracer.complete('translator.response', start)
 
     def _handle_text_partial_response(self, data):
         """Handle partial text translation response (sentence not complete)"""
@@ -149,7 +182,8 @@ class QwenTranslator(ITranslator):
             self._create_translation_event(
                 sentence_id=self.sentence_id_counter,
                 text=text,
-                is_sentence_end=False
+                is_sentence_end=False,
+                item_id=item_id
             )
 
     def _handle_text_response(self, data):
@@ -178,35 +212,60 @@ class QwenTranslator(ITranslator):
             self._create_translation_event(
                 sentence_id=self.sentence_id_counter,
                 text=text,
-                is_sentence_end=True
+                is_sentence_end=True,
+                item_id=item_id
             )
 
-    def _create_translation_event(self, sentence_id: int, text: str, is_sentence_end: bool):
+    def _item_audio_times(self, item_id: Optional[str]) -> list:
+        if len(self.item_audio_times) > 256:
+            # 服务端没有为某些 item 发送结束事件时避免无限增长
+            self.item_audio_times.clear()
+        return self.item_audio_times.setdefault(item_id, [None, None])
+
+    def _create_translation_event(self, sentence_id: int, text: str, is_sentence_end: bool,
+                                  item_id: Optional[str] = None):
         """Create and trigger translation event"""
+        # 服务端没有推送 speech_started/speech_stopped 时，用已发送音频的末尾近似
+        audio_times = self._item_audio_times(item_id)
+        if audio_times[0] is None:
+            audio_times[0] = self.audio_clock.latest()
+        audio_end = audio_times[1]
+        if is_sentence_end:
+            self.item_audio_times.pop(item_id, None)
+            if audio_end is None:
+                audio_end = self.audio_clock.latest()
         if self.callback:
             event = TranslationEvent()
             event.sentence_id = sentence_id
             event.sentence = text
             event.is_sentence_ended = is_sentence_end
             event.create_time = time.time()
+            event.target_language = self.target_language
+            event.audio_start = audio_times[0]
+            event.audio_end = audio_end
             self.callback(event)
             logger.debug(f"Translation event: {text}")
 
     def _on_error(self, ws, error):
         """Handle WebSocket errors"""
+        if self._is_stale(ws):
+            return
         logger.error(f"WebSocket error: {error}")
         self.is_running = False
 
     def _on_close(self, ws, close_status_code, close_msg):
         """Handle WebSocket connection closed"""
+        if self._is_stale(ws):
+            return
         logger.info(f"WebSocket connection closed: {close_status_code} - {close_msg}")
         self.is_running = False
 
-    def send_data(self, data: bytes):
+    def send_data(self, data: bytes, capture_time: Optional[float] = None):
         """Send audio data to the translation service
         
         Args:
             data: PCM16 audio data bytes
+            capture_time: Capture time of the first sample, used to timestamp the resulting sentences
         """
         if not self.is_running:
             self.start()
@@ -224,29 +283,71 @@ class QwenTranslator(ITranslator):
                 }
                 
                 self.ws.send(json.dumps(audio_event))
+                self.audio_clock.mark(len(data), capture_time)
                 logger.debug(f"Sent audio data: {len(data)} bytes")
                 
             except Exception as e:
                 logger.error(f"Failed to send audio data: {e}")
 
+    def commit(self) -> bool:
+        """Ask the server to end the current sentence now instead of waiting for its own pause detection"""
+        if not (self.commit_supported and self.ws and self.is_running):
+            return False
+        event_id = f"event_commit_{int(time.time() * 1000)}"
+        try:
+            self.ws.send(json.dumps({"event_id": event_id, "type": "input_audio_buffer.commit"}))
+        except Exception as e:
+            logger.error(f"Failed to commit audio buffer: {e}")
+            return False
+        if len(self.commit_event_ids) > 64:
+            self.commit_event_ids.clear()
+        self.commit_event_ids.add(event_id)
+        return True
+
     def close(self):
         """Close the translator and cleanup resources"""
-        logger.info("Closing QwenTranslator...")
-        self.is_running = False
-        
-        # 重置当前句子状态
-        self.current_item_id = None
-        self.current_sentence = ""
-        self.sentence_id_counter = 0
-        
-        if self.ws:
-            try:
-                self.ws.close()
-            except Exception as e:
-                logger.error(f"Error closing WebSocket: {e}")
-        
-        if self.ws_thread and self.ws_thread.is_alive():
-            self.ws_thread.join(timeout=5)
+        self.detach()()
+
+    def detach(self) -> Callable[[], None]:
+        """Drop the current connection and return a function that closes it
+
+        Closing waits up to 5s for the WebSocket thread to exit, start() can
+        open a new connection in the meantime.
+        """
+        with self.startup_lock:
+            logger.info("Closing QwenTranslator...")
+            self.is_running = False
+
+            # 重置当前句子状态
+            self.current_item_id = None
+            self.current_sentence = ""
+            self.audio_clock.reset()
+            self.item_audio_times = {}
+            # 旧连接之后的回调不再影响本会话，见 _is_stale
+            ws, ws_thread = self.ws, self.ws_thread
+            self.ws = None
+            self.ws_thread = None
+
+        def finish():
+            if ws:
+                try:
+                    ws.close()
+                except Exception as e:
+                    logger.error(f"Error closing WebSocket: {e}")
+            if ws_thread and ws_thread.is_alive() and ws_thread is not threading.current_thread():
+                ws_thread.join(timeout=5)
+        return finish
+
+    def _is_stale(self, ws) -> bool:
+        """ws 是 detach 之后还没关闭的旧连接"""
+        return ws is not None and ws is not self.ws
+
+    def get_response_latency(self):
+        """Round-trip time of the latest WebSocket ping/pong"""
+        ws = self.ws
+        if ws and ws.last_pong_tm and ws.last_pong_tm >= ws.last_ping_tm:
+            self.response_latency = ws.last_pong_tm - ws.last_ping_tm
+        return self.response_latency
 
     def register_callback(self, cb: Callable[[TranslationEvent], None]):
         """Register callback function for translation events
@@ -265,7 +366,8 @@ class QwenTranslator(ITranslator):
                 # 重置状态
                 self.current_item_id = None
                 self.current_sentence = ""
-                self.sentence_id_counter = 0
+                self.audio_clock.reset()
+                self.item_audio_times = {}
                 
                 # 启动WebSocket连接线程
                 self.ws_thread = threading.Thread(target=self._connect_ws, daemon=True)
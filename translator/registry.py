@@ -0,0 +1,171 @@
+import importlib
+from importlib import metadata
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# 第三方翻译后端通过该入口点组注册，入口点指向一个 TranslatorSpec 实例
+ENTRY_POINT_GROUP = 'auto_subtitle.translators'
+
+
+class AudioCapabilities:
+    """Audio a translator backend accepts
+
+    Args:
+        sample_rates: Accepted sample rates, the first one is preferred when the
+            capture rate is not accepted
+        channels: Accepted channel counts
+        formats: Accepted sample formats, the pipeline produces pcm16
+        min_chunk_ms: Smallest chunk worth sending in one send_data call, None for no preference
+        max_chunk_ms: Largest chunk the backend accepts in one send_data call, None for no limit
+    """
+
+    def __init__(self, sample_rates: Tuple[int, ...] = (16000,), channels: Tuple[int, ...] = (1,),
+                 formats: Tuple[str, ...] = ('pcm16',), min_chunk_ms: Optional[float] = None,
+                 max_chunk_ms: Optional[float] = None):
+        self.sample_rates = tuple(sample_rates)
+        self.channels = tuple(channels)
+        self.formats = tuple(formats)
+        self.min_chunk_ms = min_chunk_ms
+        self.max_chunk_ms = max_chunk_ms
+
+    def __repr__(self):
+        return (f'AudioCapabilities(sample_rates={self.sample_rates}, channels={self.channels}, '
+                f'formats={self.formats}, chunk_ms=[{self.min_chunk_ms}, {self.max_chunk_ms}])')
+
+
+class TranslatorSpec:
+    """A translator backend that can be created by name
+
+    The backend module is imported only when a translator is created, so
+    listing or selecting backends does not pull in their SDKs.
+
+    Args:
+        name: Value of translator.model that selects this backend
+        target: Backend class as "module:Class"
+        capabilities: Audio the backend accepts
+        options: Extra constructor arguments read from the config, argument name -> config key
+        description: Shown when listing backends
+    """
+
+    def __init__(self, name: str, target: str, capabilities: Optional[AudioCapabilities] = None,
+                 options: Optional[Dict[str, str]] = None, description: str = ''):
+        self.name = name
+        self.target = target
+        self.capabilities = capabilities or AudioCapabilities()
+        self.options = options or {}
+        self.description = description
+
+    def load(self) -> type:
+        module_name, _, attr = self.target.partition(':')
+        return getattr(importlib.import_module(module_name), attr)
+
+    def create(self, config, api_key: Optional[str], target_language: str, source_language: str,
+               sample_rate: Optional[int] = None, **overrides):
+        """Create a translator session, sample_rate defaults to the preferred rate
+
+        overrides replace the options read from the config, e.g. a different
+        ws_url for one provider of a hedged translator.
+        """
+        kwargs = {option: config.get(key) for option, key in self.options.items() if config.get(key) is not None}
+        kwargs.update(overrides)
+        return self.load()(api_key=api_key, target_language=target_language, source_language=source_language,
+                           sample_rate=sample_rate or self.capabilities.sample_rates[0], **kwargs)
+
+
+_specs: Dict[str, TranslatorSpec] = {}
+# 入口点只在用到时才加载，列出名称不会导入插件模块
+_entry_points: Optional[Dict[str, metadata.EntryPoint]] = None
+
+
+def register(spec: TranslatorSpec):
+    _specs[spec.name] = spec
+
+
+def _plugin_entry_points() -> Dict[str, metadata.EntryPoint]:
+    global _entry_points
+    if _entry_points is None:
+        try:
+            found = metadata.entry_points(group=ENTRY_POINT_GROUP)
+        except TypeError:
+            # Python 3.9 及以下不支持 group 参数
+            found = metadata.entry_points().get(ENTRY_POINT_GROUP, [])
+        _entry_points = {ep.name: ep for ep in found}
+    return _entry_points
+
+
+def get_spec(name: str) -> TranslatorSpec:
+    """Look up a backend by name, loading its entry point on first use
+
+    Raises:
+        ValueError: No backend is registered under this name
+    """
+    spec = _specs.get(name)
+    if spec is not None:
+        return spec
+    ep = _plugin_entry_points().get(name)
+    if ep is None:
+        raise ValueError(f'Unknown translator model: {name}, available: {", ".join(available())}')
+    loaded = ep.load()
+    if not isinstance(loaded, TranslatorSpec):
+        # 入口点也可以直接指向翻译器类，能力取类属性 capabilities
+        loaded = TranslatorSpec(name, f'{loaded.__module__}:{loaded.__qualname__}',
+                                getattr(loaded, 'capabilities', None))
+    logger.info(f'Loaded translator plugin {name} from {ep.value}')
+    _specs[name] = loaded
+    return loaded
+
+
+def available() -> List[str]:
+    return sorted(set(_specs) | set(_plugin_entry_points()))
+
+
+def negotiate(capabilities: AudioCapabilities, input_rate: Optional[int]) -> int:
+    """Choose the sample rate sent to a backend
+
+    The capture rate is used as is when the backend accepts it, so the audio
+    only needs downmixing; otherwise it is resampled to the preferred rate.
+    The pipeline always sends pcm16 mono.
+
+    Raises:
+        ValueError: The backend does not accept pcm16 mono
+    """
+    if 'pcm16' not in capabilities.formats or 1 not in capabilities.channels:
+        raise ValueError(f'Translator backend does not accept pcm16 mono audio: {capabilities}')
+    if input_rate in capabilities.sample_rates:
+        return input_rate
+    return capabilities.sample_rates[0]
+
+
+register(TranslatorSpec(
+    'qwen', 'translator.qwen_translator:QwenTranslator',
+    AudioCapabilities(sample_rates=(16000,)),
+    options={'ws_url': 'translator.ws_url'},
+    description='qwen3-livetranslate-flash-realtime',
+))
+register(TranslatorSpec(
+    'gummy', 'translator.gummy_translator:GummyTranslator',
+    # gummy-realtime-v1 接受 16kHz 及以上的采样率，常见声卡采样率可以直接发送
+    AudioCapabilities(sample_rates=(16000, 22050, 24000, 32000, 44100, 48000)),
+    # 可以改为发送 Ogg Opus，带宽约为 PCM 的十分之一
+    options={
+        'uplink': 'translator.uplink.codec',
+        'uplink_bitrate': 'translator.uplink.bitrate',
+        'uplink_frame_ms': 'translator.uplink.frame_ms',
+    },
+    description='gummy-realtime-v1',
+))
+register(TranslatorSpec(
+    'hedged', 'translator.hedged_translator:HedgedTranslator',
+    # 同一份音频发给所有 provider，只用内置后端都接受的 16kHz
+    AudioCapabilities(sample_rates=(16000,)),
+    options={
+        'providers': 'translator.hedge.providers',
+        'prefer': 'translator.hedge.prefer',
+        'upgrade_window': 'translator.hedge.upgrade_window',
+        'stall_timeout': 'translator.hedge.stall_timeout',
+        'align_tolerance': 'translator.hedge.align_tolerance',
+        'budget_minutes': 'translator.hedge.budget_minutes',
+    },
+    description='streams to several backends and shows the earliest result',
+))
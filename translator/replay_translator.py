@@ -0,0 +1,92 @@
+import time
+from typing import Callable, Optional
+
+from loguru import logger
+
+from model.event import TranslationEvent
+from translator.base import ITranslator
+
+
+class _NullSocket:
+    """Stands in for the WebSocket of a replayed session, sends go nowhere"""
+
+    last_ping_tm = 0
+    last_pong_tm = 0
+
+    def send(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+class ReplayTranslator(ITranslator):
+    """Translator session replayed from a session capture, no network
+
+    Created through the replay backend that service.session_capture.ReplaySession
+    installs. Each instance claims the next recorded session with the same
+    target language; ReplaySession.run then delivers that session's inbound
+    records in recorded order.
+
+    When the raw server messages were recorded (qwen), an instance of the
+    recorded translator class is built around a null socket and the messages
+    are fed to its _on_message, so send_data encoding, message parsing and
+    audio timing run exactly as in the live session. Otherwise the recorded
+    TranslationEvents are re-emitted with their audio times mapped to the
+    replay clock.
+
+    Args:
+        path: Session capture file, from translator.replay.path
+    """
+
+    def __init__(self, api_key: str = None, target_language: str = "zh", source_language: str = "auto",
+                 sample_rate: int = 16000, path: str = None):
+        from service.session_capture import get_replay_session
+        from translator.registry import TranslatorSpec
+
+        if path is None:
+            raise RuntimeError('translator.replay.path is not set')
+        self.target_language = target_language
+        self.callback = None
+        self.sent_bytes = 0
+        self.session = get_replay_session(path)
+        self.key = self.session.attach(target_language, self)
+        self.translator: Optional[ITranslator] = None
+        if self.session.stream_messages[self.key]:
+            # 用录制时的翻译器类解析原始消息，WebSocket 换成不发送的空实现
+            translator_cls = TranslatorSpec('recorded', self.session.stream_targets[self.key]).load()
+            self.translator = translator_cls(api_key=api_key or 'replay', target_language=target_language,
+                                             source_language=source_language, sample_rate=sample_rate)
+            self.translator.ws = _NullSocket()
+            self.translator.is_running = True
+            self.translator.register_callback(self._on_event)
+        logger.info(f'Replaying {self.key[0]}/{self.key[1]} from {path}')
+
+    def deliver(self, record):
+        """Called by ReplaySession.run with a KIND_MESSAGE or KIND_EVENT record of this session"""
+        from service.session_capture import decode_event
+
+        if self.translator is not None:
+            self.translator._on_message(self.translator.ws, record.payload.decode('utf-8'))
+            return
+        event = decode_event(record.payload)
+        event.create_time = time.time()
+        event.audio_start = self.session.map_time(event.audio_start)
+        event.audio_end = self.session.map_time(event.audio_end)
+        self._on_event(event)
+
+    def _on_event(self, event: TranslationEvent):
+        if self.callback:
+            self.callback(event)
+
+    def send_data(self, data: bytes, capture_time: Optional[float] = None):
+        self.sent_bytes += len(data)
+        if self.translator is not None:
+            self.translator.send_data(data, capture_time)
+
+    def close(self):
+        if self.translator is not None:
+            self.translator.is_running = False
+
+    def register_callback(self, cb: Callable[[TranslationEvent], None]):
+        self.callback = cb
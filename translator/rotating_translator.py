@@ -0,0 +1,290 @@
+import functools
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from loguru import logger
+
+from model.event import TranslationEvent
+from translator.base import ITranslator
+
+
+class Session:
+    """One translator session of a rotating translator and the sentences it has open"""
+
+    def __init__(self, generation: int, translator: ITranslator):
+        self.generation = generation
+        self.translator = translator
+        # 显示中、还没有整句结果的句子：会话内 sentence_id -> (全局 sentence_id, 最近一次事件)
+        self.shown: Dict[int, tuple] = {}
+        # 与另一个会话重复、不显示的句子：会话内 sentence_id -> 最近一次事件
+        self.hidden: Dict[int, TranslationEvent] = {}
+        self.last_final_end: Optional[float] = None
+        self.switched_at = 0.0
+
+    def is_open(self) -> bool:
+        return bool(self.shown or self.hidden)
+
+
+class RotatingTranslator(ITranslator):
+    """Replaces the translator session on a schedule or on demand without a gap in the subtitles
+
+    Make before break: a new session is created and connected on a
+    background thread while the current one keeps translating, then both
+    receive the same audio (overlap) until neither has a sentence in
+    progress. At that boundary the new session takes over the display and
+    the old one is closed in the background; results of the new session
+    from the overlap are duplicates and are not shown. When no common
+    boundary is reached within max_overlap seconds the switch is forced:
+    the old session keeps receiving audio until its open sentences end (at
+    most drain_timeout seconds, then their last text is shown as final) and
+    new sentences that started after its last final are shown right away.
+
+    Sentence ids of all sessions are mapped to one counter that is never
+    reset, so ids stay unique across rotations, reconnects and close/start.
+
+    Args:
+        factory: Creates a new, unconnected translator session
+        interval: Seconds between scheduled rotations, None or 0 for on demand only
+        max_overlap: Seconds to wait for a sentence boundary before forcing the switch
+        drain_timeout: Seconds the old session may take to finish its open sentences after a forced switch
+        retry_interval: Seconds before trying again when the new session fails to connect
+    """
+
+    def __init__(self, factory: Callable[[], ITranslator], interval: Optional[float] = None,
+                 max_overlap: float = 10.0, drain_timeout: float = 5.0, retry_interval: float = 60.0):
+        self.factory = factory
+        self.interval = interval or None
+        self.max_overlap = max_overlap
+        self.drain_timeout = drain_timeout
+        self.retry_interval = retry_interval
+        self.callback = None
+        self.lock = threading.Lock()
+        self.generations = itertools.count()
+        self.sentence_id_counter = 0
+        self.current = self._session(factory())
+        # 正在重叠的新会话，以及强制切换后还在结束未完成句子的旧会话
+        self.incoming: Optional[Session] = None
+        self.outgoing: Optional[Session] = None
+        self.connecting = False
+        # close 时递增，close 之前发起、之后才连上的新会话直接关掉
+        self.epoch = 0
+        self.rotate_at: Optional[float] = None
+        self.overlap_since = 0.0
+        # 统计
+        self.rotations = 0
+        self.forced = 0
+        self.failures = 0
+        self.overlap_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, factory: Callable[[], ITranslator]) -> Optional['RotatingTranslator']:
+        """Created when translator.rotation.enabled is true"""
+        from config import Config
+
+        config = Config()
+        if not config.get('translator.rotation.enabled', False):
+            return None
+        return cls(factory, interval=float(config.get('translator.rotation.interval', 1500)),
+                   max_overlap=float(config.get('translator.rotation.max_overlap', 10)),
+                   drain_timeout=float(config.get('translator.rotation.drain_timeout', 5)))
+
+    def _session(self, translator: ITranslator) -> Session:
+        session = Session(next(self.generations), translator)
+        translator.register_callback(functools.partial(self._on_event, session))
+        return session
+
+    def rotate(self):
+        """Rotate at the next send_data, ignored while a rotation is in progress"""
+        self.rotate_at = 0.0
+
+    def send_data(self, data: bytes, capture_time: Optional[float] = None):
+        now = time.monotonic()
+        if self.rotate_at is None:
+            self.rotate_at = now + self.interval if self.interval else float('inf')
+        if now >= self.rotate_at:
+            self._begin_rotation()
+        with self.lock:
+            sessions = [session for session in (self.current, self.incoming, self.outgoing) if session]
+        for session in sessions:
+            try:
+                session.translator.send_data(data, capture_time)
+            except Exception as e:
+                if session is sessions[0]:
+                    raise
+                logger.error(f'Failed to send audio to rotating session {session.generation}: {e}')
+        if len(sessions) > 1:
+            with self.lock:
+                self._advance(now)
+
+    def _begin_rotation(self):
+        with self.lock:
+            if self.connecting or self.incoming or self.outgoing:
+                return
+            self.connecting = True
+            self.rotate_at = float('inf')
+        threading.Thread(target=self._connect, args=(self.epoch,), name='SessionRotate', daemon=True).start()
+
+    def _connect(self, epoch: int):
+        started = time.monotonic()
+        try:
+            session = self._session(self.factory())
+            session.translator.start()
+        except Exception as e:
+            logger.error(f'Failed to open a new translator session, keeping the current one: {e}')
+            with self.lock:
+                self.failures += 1
+                self.connecting = False
+                self.rotate_at = time.monotonic() + self.retry_interval
+            return
+        with self.lock:
+            self.connecting = False
+            if epoch == self.epoch:
+                self.incoming = session
+                self.overlap_since = time.monotonic()
+                logger.info(f'Translator session {session.generation} connected in '
+                            f'{(self.overlap_since - started) * 1000:.0f}ms, overlapping until a sentence boundary')
+                return
+        self._close_session(session)
+
+    def _advance(self, now: float):
+        """Switch to the incoming session or finish the outgoing one when possible, called with the lock held"""
+        incoming = self.incoming
+        if incoming is not None:
+            boundary = not self.current.is_open() and not incoming.is_open()
+            if boundary or now - self.overlap_since >= self.max_overlap:
+                self._switch(now, forced=not boundary)
+        outgoing = self.outgoing
+        if outgoing is not None and (not outgoing.shown or now - outgoing.switched_at >= self.drain_timeout):
+            for sentence_id, event in list(outgoing.shown.values()):
+                # 旧会话没来得及给出整句结果，按最后的文本结束这句
+                self._emit(sentence_id, event, ended=True)
+            outgoing.shown.clear()
+            self.outgoing = None
+            self._close_later(outgoing)
+
+    def _switch(self, now: float, forced: bool):
+        old, new = self.current, self.incoming
+        if forced and old.last_final_end is not None:
+            # 新会话中从旧会话最后一句结束后才开始的句子是新内容，直接接着显示
+            for session_id, event in list(new.hidden.items()):
+                if event.audio_start is not None and event.audio_start >= old.last_final_end:
+                    del new.hidden[session_id]
+                    new.shown[session_id] = (self._next_id(), event)
+                    self._emit(new.shown[session_id][0], event)
+        self.current = new
+        self.incoming = None
+        self.rotations += 1
+        self.forced += forced
+        self.overlap_seconds += now - self.overlap_since
+        self.rotate_at = now + self.interval if self.interval else float('inf')
+        logger.info(f'Switched to translator session {new.generation} after {now - self.overlap_since:.1f}s '
+                    f'overlap{" (forced)" if forced else ""}, {self.rotations} rotations')
+        old.switched_at = now
+        if old.shown:
+            self.outgoing = old
+        else:
+            self._close_later(old)
+
+    def _on_event(self, session: Session, event: TranslationEvent):
+        with self.lock:
+            session_id = event.sentence_id
+            ended = event.is_sentence_ended
+            if session_id in session.shown:
+                sentence_id = session.shown[session_id][0]
+            elif session_id not in session.hidden and session is self.current:
+                sentence_id = self._next_id()
+            else:
+                # 重叠期间新会话的结果、切换后旧会话的新句子与另一个会话重复
+                sentence_id = None
+            if sentence_id is None:
+                if ended:
+                    session.hidden.pop(session_id, None)
+                else:
+                    session.hidden[session_id] = event
+            else:
+                if ended:
+                    session.shown.pop(session_id, None)
+                    session.last_final_end = event.audio_end
+                else:
+                    session.shown[session_id] = (sentence_id, event)
+                self._emit(sentence_id, event)
+            if self.incoming is not None or self.outgoing is not None:
+                self._advance(time.monotonic())
+
+    def _next_id(self) -> int:
+        self.sentence_id_counter += 1
+        return self.sentence_id_counter
+
+    def _emit(self, sentence_id: int, source: TranslationEvent, ended: Optional[bool] = None):
+        if not self.callback:
+            return
+        event = TranslationEvent()
+        event.sentence_id = sentence_id
+        event.sentence = source.sentence
+        event.is_sentence_ended = source.is_sentence_ended if ended is None else ended
+        event.create_time = source.create_time or time.time()
+        event.target_language = source.target_language
+        event.audio_start = source.audio_start
+        event.audio_end = source.audio_end
+        self.callback(event)
+
+    def _close_later(self, session: Session):
+        # 关闭 WebSocket 可能要等几秒，不阻塞发送和回调线程
+        threading.Thread(target=self._close_session, args=(session,), name='SessionClose', daemon=True).start()
+
+    def _close_session(self, session: Session):
+        try:
+            session.translator.close()
+        except Exception as e:
+            logger.error(f'Failed to close translator session {session.generation}: {e}')
+
+    def start(self):
+        self.current.translator.start()
+
+    def close(self):
+        self.detach()()
+
+    def detach(self) -> Callable[[], None]:
+        with self.lock:
+            self.epoch += 1
+            sessions = [session for session in (self.current, self.incoming, self.outgoing) if session]
+            self.incoming = self.outgoing = None
+            self.rotate_at = None
+        finishers = []
+        for session in sessions:
+            try:
+                finishers.append((session, session.translator.detach()))
+            except Exception as e:
+                logger.error(f'Failed to close translator session {session.generation}: {e}')
+        with self.lock:
+            # 同一个会话对象可以再次 start，未完成的句子不再有后续结果
+            self.current = self._session(self.current.translator)
+
+        def finish():
+            for session, finish_session in finishers:
+                try:
+                    finish_session()
+                except Exception as e:
+                    logger.error(f'Failed to close translator session {session.generation}: {e}')
+            if self.rotations or self.failures:
+                logger.info(self.report())
+        return finish
+
+    def report(self) -> str:
+        average = self.overlap_seconds / self.rotations if self.rotations else 0.0
+        return (f'Translator sessions rotated {self.rotations} times ({self.forced} forced, {self.failures} failed '
+                f'to connect), average overlap {average:.1f}s')
+
+    def get_response_latency(self) -> Optional[float]:
+        return self.current.translator.get_response_latency()
+
+    def commit(self) -> bool:
+        # 重叠中的会话也在同一处断句，切换时两边的句子边界一致
+        with self.lock:
+            sessions = [session for session in (self.current, self.incoming, self.outgoing) if session]
+        return any([session.translator.commit() for session in sessions])
+
+    def register_callback(self, cb: Callable[[TranslationEvent], None]):
+        self.callback = cb
@@ -0,0 +1,129 @@
+import collections
+import unicodedata
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .subtitle_layout import TEXT_ALPHA
+
+
+def simple_char(char: str) -> bool:
+    """能否逐字绘制：组合字符、零宽字符、从右到左书写和 BMP 以外的字符（emoji 等）需要完整的文字排版"""
+    if ord(char) > 0xFFFF:
+        return False
+    category = unicodedata.category(char)
+    if category in ('Mn', 'Me', 'Cf', 'Cc'):
+        return False
+    return unicodedata.bidirectional(char) not in ('R', 'AL')
+
+
+class GlyphAtlas:
+    """字形图集：每个字符渲染一次覆盖率（0-255）缓存在固定大小的槽位中，按行拼出字幕
+
+    槽位数量固定，满了按最近最少使用淘汰，CJK 字符集很大也不会无限增长。
+    拼行时先把字形覆盖率拷到行缓冲，再一次查表得到带 alpha 的预乘 BGRA 像素写入 DIB，
+    不需要 GDI 绘制和事后修补 alpha。
+
+    Args:
+        render_glyph: 渲染单个字符，返回 (height, advance) 的 uint8 覆盖率数组；无法渲染时返回 None
+        height: 字形高度（像素），即字体的行高
+        max_advance: 单个字形的最大宽度，超过的字符交给 GDI 绘制
+        capacity: 槽位数量
+        background_alpha: 背景的 alpha，与 GDI 路径的 TEXT_ALPHA 一致
+    """
+
+    def __init__(self, render_glyph: Callable[[str], Optional[np.ndarray]], height: int, max_advance: int,
+                 capacity: int = 2048, background_alpha: int = TEXT_ALPHA >> 24):
+        self.render_glyph = render_glyph
+        self.height = height
+        self.max_advance = max_advance
+        self.capacity = capacity
+        self.slots = np.zeros((capacity, height, max_advance), dtype=np.uint8)
+        # 字符 -> (槽位, 宽度)，按使用先后排序；宽度为 -1 表示无法渲染
+        self.glyphs: 'collections.OrderedDict[str, Tuple[int, int]]' = collections.OrderedDict()
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.misses = 0
+        self.evictions = 0
+        self._line = np.zeros((height, 0), dtype=np.uint8)
+        self.lut = self.make_lut(background_alpha)
+
+    @staticmethod
+    def make_lut(background_alpha: int) -> np.ndarray:
+        """覆盖率 -> 白色文字叠加在半透明黑色背景上的预乘 BGRA 像素"""
+        coverage = np.arange(256, dtype=np.uint32)
+        alpha = background_alpha + (coverage * (255 - background_alpha) + 127) // 255
+        return (alpha << 24) | (coverage << 16) | (coverage << 8) | coverage
+
+    def glyph(self, char: str) -> Optional[Tuple[int, int]]:
+        """返回字符的 (槽位, 宽度)，不能用图集绘制时返回 None"""
+        entry = self.glyphs.get(char)
+        if entry is not None:
+            self.glyphs.move_to_end(char)
+            return entry if entry[1] >= 0 else None
+        self.misses += 1
+        coverage = self.render_glyph(char) if simple_char(char) else None
+        if coverage is None or coverage.shape[0] != self.height or coverage.shape[1] > self.max_advance:
+            # 不能渲染的字符也记下来，不反复尝试；不占用槽位
+            self._remember(char, (-1, -1))
+            return None
+        while not self.free_slots:
+            self._evict()
+        slot = self.free_slots.pop()
+        advance = coverage.shape[1]
+        self.slots[slot, :, :advance] = coverage
+        entry = (slot, advance)
+        self._remember(char, entry)
+        return entry
+
+    def _remember(self, char: str, entry: Tuple[int, int]):
+        self.glyphs[char] = entry
+        # 无法渲染的记录不占槽位，但也限制数量
+        while len(self.glyphs) > self.capacity * 2:
+            self._evict()
+
+    def _evict(self):
+        _, (slot, _) = self.glyphs.popitem(last=False)
+        if slot >= 0:
+            self.free_slots.append(slot)
+            self.evictions += 1
+
+    def _entries(self, text: str) -> Optional[List[Tuple[int, int]]]:
+        entries = []
+        for char in text:
+            entry = self.glyph(char)
+            if entry is None:
+                return None
+            entries.append(entry)
+        return entries
+
+    def measure(self, text: str) -> Optional[int]:
+        """整行宽度，含有不能用图集绘制的字符时返回 None，此时整行交给 GDI"""
+        entries = self._entries(text)
+        return None if entries is None else sum(advance for _, advance in entries)
+
+    def draw_line(self, image: np.ndarray, rect: Tuple[int, int, int, int], text: str) -> bool:
+        """在 image (uint32 的二维 BGRA 视图) 的 rect 中绘制背景和居中的文字，返回 False 表示需要 GDI 绘制"""
+        left, top, right, bottom = rect
+        entries = self._entries(text)
+        if entries is None:
+            return False
+        width = sum(advance for _, advance in entries)
+        region = image[top:bottom, left:right]
+        region.fill(self.lut[0])
+        width = min(width, right - left)
+        if len(self._line[0]) < width:
+            self._line = np.zeros((self.height, max(width, 2 * len(self._line[0]))), dtype=np.uint8)
+        line = self._line[:, :width]
+        x = 0
+        for slot, advance in entries:
+            advance = min(advance, width - x)
+            if advance <= 0:
+                break
+            line[:, x:x + advance] = self.slots[slot, :, :advance]
+            x += advance
+        # 与 DrawTextW 的 DT_CENTER | DT_VCENTER 一致：水平、垂直居中
+        x0 = (right - left - width) // 2
+        y0 = max(0, (bottom - top - self.height) // 2)
+        rows = min(self.height, bottom - top - y0)
+        np.take(self.lut, line[:rows], out=region[y0:y0 + rows, x0:x0 + width], mode='clip')
+        return True
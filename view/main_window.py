@@ -1,33 +1,96 @@
 import threading
 import time
 import os
+from typing import List
 
 from PyQt6.QtWidgets import QMainWindow, QApplication, QPushButton, QWidget, QHBoxLayout, QComboBox, QLabel, QMessageBox
 from PyQt6.QtGui import QIcon
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QTimer, QObject, pyqtSignal
 from loguru import logger
 
 from service.audio_translate_service import AudioTranslateService
+from service.process_translate_service import ProcessTranslateService
+from service.latency_metrics import LatencyMetrics
+from service.span_tracer import tracer
+from service.subtitle_broadcast import SubtitleBroadcastServer
+from service.transcript_recorder import TranscriptRecorder
+from translator.base import get_target_languages
 from model.event import TranslationEvent
+from model.subtitle_data import SubTitleData
 from .subtitle_rect import SubtitleRect
 from config import Config
 
+
+class EventBridge(QObject):
+    """把事件总线分发线程上的一批事件通过队列连接的信号转交给 Qt 主线程"""
+    events = pyqtSignal(list)
+
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.config = Config()
-        self.translate_service = AudioTranslateService()
-        self.translate_service.register_callback(self.on_translate_event)
+        # audio.isolation 为 process 时音频处理和翻译在独立进程中运行，避免界面重绘拖慢采集回调
+        if self.config.get('audio.isolation', 'thread') == 'process':
+            self.translate_service = ProcessTranslateService()
+        else:
+            self.translate_service = AudioTranslateService()
+        # 翻译事件每 50ms 成批发给主线程一次，字幕状态只在主线程上修改
+        self.event_bridge = EventBridge()
+        self.event_bridge.events.connect(self.on_translate_events)
+        event_bus = self.translate_service.event_bus
+        event_bus.subscribe(self.event_bridge.events.emit, window=0.05, name='ui')
+        self.latency_metrics = LatencyMetrics()
+        event_bus.subscribe(self.latency_metrics.on_events, window=1.0, name='latency')
+        # broadcast.enabled 时把字幕推送给 OBS 浏览器源等客户端，服务器在整个程序运行期间保持监听
+        self.broadcast_server = SubtitleBroadcastServer.from_config()
+        if self.broadcast_server:
+            try:
+                self.broadcast_server.start()
+                event_bus.subscribe(self.broadcast_server.on_events, window=0.05, name='broadcast')
+            except RuntimeError as e:
+                logger.error(e)
+                self.broadcast_server = None
+        self.recorder_subscription = None
         self.is_translating = False
         self.setup_ui()
         font_size = self.config.get('subtitle.font_size', 24)
         screen_width, screen_height = self.get_real_screen_size()
         subtitle_x = screen_width // 2
         subtitle_y = screen_height // 100 * 85
-        self.subtitle_rect=SubtitleRect(font_size,subtitle_x,subtitle_y)
-        self.subtitle_data=SubTitleData()
+        self.subtitle_rect=SubtitleRect(font_size,subtitle_x,subtitle_y,
+                                        rasterizer=self.config.get('subtitle.rasterizer', 'gdi'))
+        # 每个音频源的每个目标语言一条字幕轨道，key为(音频源, 目标语言)
+        self.subtitle_lanes = {}
+        self.transcript_recorder = None
         self.display_timer = QTimer(self)
         self.display_timer.timeout.connect(self.update_display)
+        # trace.enabled 时按快捷键把最近的 span 导出为 Chrome trace
+        if tracer.enabled:
+            hotkey = self.config.get('trace.hotkey', 'ctrl+alt+t')
+            try:
+                self.subtitle_rect.register_hotkey(hotkey, self.dump_trace)
+                logger.info(f'Press {hotkey} to dump a trace')
+            except ValueError as e:
+                logger.error(e)
+        # archive.enabled 时按快捷键重新翻译最近 archive.recaption_seconds 秒的音频
+        if self.config.get('archive.enabled', False):
+            hotkey = self.config.get('archive.hotkey', 'ctrl+alt+r')
+            try:
+                self.subtitle_rect.register_hotkey(hotkey, self.recaption)
+                logger.info(f'Press {hotkey} to re-caption recent audio')
+            except ValueError as e:
+                logger.error(e)
+
+    def recaption(self):
+        try:
+            self.translate_service.recaption(self.config.get('archive.recaption_seconds', 30))
+        except Exception as e:
+            logger.exception(f'Re-caption failed: {e}')
+
+    def dump_trace(self):
+        # 快捷键回调在字幕窗口线程上，写文件放到单独的线程
+        threading.Thread(target=tracer.dump, name='TraceDump', daemon=True).start()
 
     def setup_ui(self):
         # 创建中央widget和布局
@@ -127,6 +190,11 @@ class MainWindow(QMainWindow):
 
     def start_translate(self):
         try:
+            self.transcript_recorder = TranscriptRecorder.from_config()
+            if self.transcript_recorder:
+                self.transcript_recorder.start()
+                self.recorder_subscription = self.translate_service.event_bus.subscribe(
+                    self.on_record_events, window=1.0, name='transcript')
             self.translate_service.start()
             self.is_translating = True
             self.play_button.setIcon(QIcon("icon/pause.png"))
@@ -138,10 +206,19 @@ class MainWindow(QMainWindow):
     def stop_translate(self):
         try:
             self.translate_service.stop()
+            if self.recorder_subscription:
+                self.translate_service.event_bus.unsubscribe(self.recorder_subscription)
+                self.recorder_subscription = None
+            if self.transcript_recorder:
+                self.transcript_recorder.stop()
+                self.transcript_recorder = None
             self.is_translating = False
             self.play_button.setIcon(QIcon("icon/play.png"))
             self.subtitle_rect.clean()
-            self.subtitle_data.clean()
+            if self.broadcast_server:
+                self.broadcast_server.clear()
+            for subtitle_data in self.subtitle_lanes.values():
+                subtitle_data.clean()
             self.display_timer.stop()
         except Exception as e:
             logger.exception(f"停止翻译失败: {e}")
@@ -153,15 +230,54 @@ class MainWindow(QMainWindow):
         else:
             self.start_translate()
 
-    def on_translate_event(self, event: TranslationEvent):
-        logger.debug('translate_event is {}'.format(event))
-        self.subtitle_data.set(event.sentence_id,event.sentence)
-        if event.is_sentence_ended:
-            suspend_time = self.config.get('subtitle.suspend_time', 5)
-            self.subtitle_data.delay_del(event.sentence_id, suspend_time)
+    def on_record_events(self, events: List[TranslationEvent]):
+        recorder = self.transcript_recorder
+        if recorder:
+            for event in events:
+                recorder.on_translate_event(event)
+
+    def on_translate_events(self, events: List[TranslationEvent]):
+        # 通过 EventBridge 的信号在主线程上执行
+        with tracer.span('ui.apply_events', {'events': len(events)}):
+            self.apply_events(events)
+
+    def apply_events(self, events: List[TranslationEvent]):
+        suspend_time = self.config.get('subtitle.suspend_time', 5)
+        for event in events:
+            logger.debug('translate_event is {}'.format(event))
+            subtitle_data = self.subtitle_lanes.setdefault((event.source, event.target_language), SubTitleData())
+            subtitle_data.set(event.sentence_id,event.sentence)
+            if event.speculative_end:
+                # 本地检测到停顿，不等服务端的整句结果先开始计时；这句话继续时 set 会取消
+                subtitle_data.delay_del(event.sentence_id, suspend_time)
+            if event.is_sentence_ended:
+                subtitle_data.delay_del(event.sentence_id, suspend_time)
+                latency = event.latency()
+                if latency is not None:
+                    logger.debug(f'sentence {event.source}/{event.target_language}#{event.sentence_id} '
+                                 f'capture-to-display latency {latency * 1000:.0f}ms')
 
     def update_display(self):
-        texts=self.subtitle_data.get_list()
+        with tracer.span('ui.update_display'):
+            self.draw_lanes()
+
+    def draw_lanes(self):
+        # 按配置顺序排列轨道，第一个音频源的第一个目标语言显示在最下方
+        sources = self.config.get('audio.sources', ['loopback'])
+        languages = get_target_languages()
+
+        def lane_order(item):
+            source, language = item[0]
+            return (sources.index(source) if source in sources else len(sources),
+                    languages.index(language) if language in languages else len(languages))
+
+        lanes = sorted(list(self.subtitle_lanes.items()), key=lane_order)
+        # 多个音频源时给字幕加上音频源标签
+        labeled = len({source for source, _ in self.subtitle_lanes}) > 1
+        texts = []
+        for (source, language), subtitle_data in reversed(lanes):
+            for text in subtitle_data.get_list():
+                texts.append(f'[{source}] {text}' if labeled else text)
         if len(texts)>0:
             self.subtitle_rect.draw(texts)
 
@@ -192,32 +308,3 @@ class MainWindow(QMainWindow):
         """目标语言改变时更新配置"""
         self.config.update_config('translator.target_language', language)
 
-
-class SubTitleData():
-    def __init__(self):
-        self.data={}
-        self.lock=threading.Lock()
-
-    def set(self,id,text):
-        with self.lock:
-            if id in self.data and self.data[id]==text:
-                return False
-            self.data[id]=text
-            return True
-
-    def get_list(self):
-        with self.lock:
-            sorted_keys = sorted(self.data.keys())
-            return [self.data[key] for key in sorted_keys]
-
-    def delay_del(self, id, delay_sec):
-        def delayed_delete():
-            with self.lock:
-                if id in self.data:
-                    del self.data[id]
-
-        timer = threading.Timer(delay_sec, delayed_delete)
-        timer.start()
-    def clean(self):
-        with self.lock:
-            self.data.clear()
@@ -0,0 +1,97 @@
+import re
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# 汉字单独成词，英文和数字连续的为一个词，标点和空白各自成词
+TOKEN_PATTERN = re.compile(r'[\u4e00-\u9fff]|[a-zA-Z0-9]+|[^\u4e00-\u9fff\s\w]|\s')
+
+TEXT_ALPHA = 0x80000000
+BUTTON_ALPHA = 0xAA000000
+
+
+def wrap_text(text: str, max_width: int, half_width: int, full_width: int, padding_x: int = 0) -> List[str]:
+    """按字符宽度折行，ASCII 字符按 half_width 计，其余按 full_width 计
+
+    与 GDI 无关，SubtitleRect 只负责量出半角和全角字符的宽度。返回的行自下而上排列。
+    """
+    if not text:
+        return []
+
+    def calc_text_width(s):
+        """根据字符类型计算文本宽度"""
+        width = 0
+        for char in s:
+            if ord(char) < 128:  # 半角字符 (ASCII)
+                width += half_width
+            else:  # 全角字符
+                width += full_width
+        return width
+
+    wrapped_lines = []
+    current_line = ""
+    current_width = 0
+
+    for token in TOKEN_PATTERN.findall(text):
+        token_width = calc_text_width(token)
+        new_width = current_width + token_width
+
+        if new_width + padding_x * 2 <= max_width:
+            # 可以添加到当前行
+            current_line += token
+            current_width = new_width
+        else:
+            # 当前行已满，保存并开始新行
+            if current_line:
+                wrapped_lines.append(current_line)
+            current_line = token
+            current_width = token_width
+
+    # 添加最后一行
+    if current_line:
+        wrapped_lines.append(current_line)
+    wrapped_lines.reverse()
+    return wrapped_lines
+
+
+def apply_alpha(pixels: np.ndarray, width: int, rects: Sequence[Tuple[int, int, int, int, int]]):
+    """GDI 绘制的文字没有 alpha，按矩形补上：白色文字不透明，其余背景半透明
+
+    Args:
+        pixels: 32 位 BGRA 像素，一维 uint32 数组（与 DIB 共享内存）
+        width: 位图宽度
+        rects: (left, top, right, bottom, alpha) 列表，alpha 为 TEXT_ALPHA 或 BUTTON_ALPHA
+    """
+    image = pixels.reshape(-1, width)
+    for left, top, right, bottom, alpha in rects:
+        # 切片是视图，直接在 DIB 上原地修改
+        region = image[top:bottom, left:right]
+        is_white = (region & 0x00FFFFFF) == 0x00FFFFFF
+        region |= np.uint32(alpha)
+        region[is_white] = 0xFFFFFFFF
+
+
+HOTKEY_MODIFIERS = {'alt': 0x0001, 'ctrl': 0x0002, 'control': 0x0002, 'shift': 0x0004, 'win': 0x0008}
+
+
+def parse_hotkey(hotkey: str) -> Tuple[int, int]:
+    """把 "ctrl+alt+t" 形式的快捷键解析为 RegisterHotKey 的 (修饰键, 虚拟键码)
+
+    按键支持字母、数字和 F1-F24。
+    """
+    modifiers = 0
+    key = None
+    for part in hotkey.lower().replace(' ', '').split('+'):
+        if part in HOTKEY_MODIFIERS:
+            modifiers |= HOTKEY_MODIFIERS[part]
+        elif key is None and part:
+            key = part
+        else:
+            raise ValueError(f'Invalid hotkey: {hotkey}')
+    if key is None:
+        raise ValueError(f'Invalid hotkey: {hotkey}')
+    if len(key) == 1 and key.isalnum():
+        return modifiers, ord(key.upper())
+    if key[0] == 'f' and key[1:].isdigit() and 1 <= int(key[1:]) <= 24:
+        return modifiers, 0x70 + int(key[1:]) - 1  # VK_F1
+    raise ValueError(f'Invalid hotkey: {hotkey}')
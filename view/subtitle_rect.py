@@ -9,6 +9,10 @@ import numpy as np
 from sympy.strategies.core import switch
 from win32con import DT_WORDBREAK
 
+from service.span_tracer import tracer
+from .glyph_atlas import GlyphAtlas
+from .subtitle_layout import BUTTON_ALPHA, TEXT_ALPHA, apply_alpha, parse_hotkey, wrap_text
+
 # --- Constants ---
 WS_EX_LAYERED = 0x00080000
 WS_EX_TOPMOST = 0x00000008
@@ -29,6 +33,7 @@ WM_NCLBUTTONDOWN  = 0x00A1
 WM_MOVING = 0x0216
 WM_EXITSIZEMOVE = 0x0232
 WM_TIMER = 0x0113
+WM_HOTKEY = 0x0312
 WM_USER = 0x0400
 WM_APP = 0x8000
 
@@ -40,6 +45,8 @@ SWP_NOACTIVATE = 0x0010
 SWP_SHOWWINDOW = 0x0040
 SWP_HIDEWINDOW = 0x0080
 
+MOD_NOREPEAT = 0x4000
+
 HTCAPTION = 2
 HTCLIENT = 1
 HTTRANSPARENT = -1
@@ -58,6 +65,7 @@ DT_CENTER = 0x00000001
 DT_VCENTER = 0x00000004
 DT_SINGLELINE = 0x00000020
 DT_CALCRECT = 0x00000400
+DT_NOPREFIX = 0x00000800
 
 BI_RGB = 0
 DIB_RGB_COLORS = 0
@@ -197,6 +205,9 @@ user32.SetWindowPos.restype = wintypes.BOOL
 user32.SetTimer.argtypes = [HWND, ULONG_PTR, ctypes.c_uint, ctypes.c_void_p]
 user32.SetTimer.restype = ULONG_PTR
 
+user32.RegisterHotKey.argtypes = [HWND, ctypes.c_int, ctypes.c_uint, ctypes.c_uint]
+user32.RegisterHotKey.restype = wintypes.BOOL
+
 user32.UpdateLayeredWindow.argtypes = [
     HWND, HDC, ctypes.POINTER(POINT), ctypes.POINTER(SIZE),
     HDC, ctypes.POINTER(POINT), ctypes.c_uint, ctypes.POINTER(BLENDFUNCTION), ctypes.c_uint
@@ -263,6 +274,67 @@ gdi32.SetTextColor.restype = ctypes.c_uint
 gdi32.GetDeviceCaps.argtypes = [HDC, ctypes.c_int]
 gdi32.GetDeviceCaps.restype = ctypes.c_int
 
+gdi32.GdiFlush.argtypes = []
+gdi32.GdiFlush.restype = wintypes.BOOL
+
+
+def create_subtitle_font(font_height):
+    return gdi32.CreateFontW(font_height, 0, 0, 0, FW_BOLD, 0, 0, 0,
+                             ANSI_CHARSET, OUT_DEFAULT_PRECIS, CLIP_DEFAULT_PRECIS,
+                             NONANTIALIASED_QUALITY, DEFAULT_PITCH | FF_DONTCARE, "Cambria")
+
+
+class GdiGlyphRenderer:
+    """在独立的内存 DC 上逐字渲染，供 GlyphAtlas 使用
+
+    DrawTextW 会做字体链接，Cambria 中没有的 CJK 字形也能由系统的后备字体渲染出来。
+    """
+
+    def __init__(self, font_height):
+        self.font_height = font_height
+        self.dc = gdi32.CreateCompatibleDC(None)
+        self.font = create_subtitle_font(font_height)
+        self.old_font = gdi32.SelectObject(self.dc, self.font)
+        size = SIZE()
+        gdi32.GetTextExtentPoint32W(self.dc, "中", 1, ctypes.byref(size))
+        self.height = size.cy
+        self.max_advance = size.cx * 2
+
+        bmi = BITMAPINFO()
+        bmi.bmiHeader.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+        bmi.bmiHeader.biWidth = self.max_advance
+        bmi.bmiHeader.biHeight = -self.height  # Top-down
+        bmi.bmiHeader.biPlanes = 1
+        bmi.bmiHeader.biBitCount = 32
+        bmi.bmiHeader.biCompression = BI_RGB
+        bits = ctypes.c_void_p()
+        self.bitmap = gdi32.CreateDIBSection(self.dc, ctypes.byref(bmi), DIB_RGB_COLORS, ctypes.byref(bits), None, 0)
+        self.old_bitmap = gdi32.SelectObject(self.dc, self.bitmap)
+        n_pixels = self.max_advance * self.height
+        pixel_arr = ctypes.cast(bits, ctypes.POINTER(ctypes.c_uint32 * n_pixels)).contents
+        self.pixels = np.ctypeslib.as_array(pixel_arr).reshape(self.height, self.max_advance)
+        gdi32.SetBkMode(self.dc, 1)  # TRANSPARENT
+        gdi32.SetTextColor(self.dc, 0xFFFFFF)
+
+    def render(self, char):
+        size = SIZE()
+        gdi32.GetTextExtentPoint32W(self.dc, char, 1, ctypes.byref(size))
+        if size.cx <= 0 or size.cx > self.max_advance or size.cy != self.height:
+            return None
+        self.pixels.fill(0)
+        r = RECT(0, 0, size.cx, self.height)
+        user32.DrawTextW(self.dc, char, 1, ctypes.byref(r), DT_SINGLELINE | DT_NOPREFIX)
+        gdi32.GdiFlush()
+        # 白色文字，任一颜色通道即为覆盖率
+        return (self.pixels[:, :size.cx] & 0xFF).astype(np.uint8)
+
+    def close(self):
+        gdi32.SelectObject(self.dc, self.old_bitmap)
+        gdi32.SelectObject(self.dc, self.old_font)
+        gdi32.DeleteObject(self.bitmap)
+        gdi32.DeleteObject(self.font)
+        gdi32.DeleteDC(self.dc)
+
 
 # --- Class Implementation ---
 
@@ -273,7 +345,7 @@ class SubtitleRect:
     BTN_KEY_HIDDEN='hidden'
     BTN_KEY_DRAG= 'drag'
 
-    def __init__(self, font_size=24,x=200,y=200):
+    def __init__(self, font_size=24,x=200,y=200,rasterizer='gdi'):
         self.hwnd = None
         self.texts = []
         self.pos_x = x
@@ -288,6 +360,13 @@ class SubtitleRect:
         self.subtitle_visible = True  # 字幕可见状态
         self.button_font_size = 10
         self.button_items = []  # 按钮位置
+        # atlas: 字幕文字用 GlyphAtlas 拼接，不能逐字绘制的行仍走 GDI；gdi: 全部用 DrawTextW
+        self.rasterizer = rasterizer
+        self._glyph_renderer = None
+        self._glyph_atlas = None
+        # 全局快捷键，id -> (快捷键, 回调)；RegisterHotKey 必须在窗口线程上调用，注册请求经消息转交
+        self.hotkeys = {}
+        self._pending_hotkeys = []
 
         # Keep references to prevent GC
         self._wnd_proc_cb = WNDPROC(self._wnd_proc)
@@ -312,9 +391,29 @@ class SubtitleRect:
         if self.hwnd:
             user32.PostMessageW(self.hwnd, WM_APP + 1, 0, 0)
 
+    def register_hotkey(self, hotkey, callback):
+        """注册全局快捷键（例如 "ctrl+alt+t"），callback 在字幕窗口线程上调用，耗时的操作应另开线程"""
+        modifiers, vk = parse_hotkey(hotkey)
+        with self.lock:
+            hotkey_id = len(self.hotkeys) + len(self._pending_hotkeys) + 1
+            self._pending_hotkeys.append((hotkey_id, hotkey, modifiers, vk, callback))
+        if self.hwnd:
+            user32.PostMessageW(self.hwnd, WM_APP + 2, 0, 0)
+
+    def _register_pending_hotkeys(self):
+        with self.lock:
+            pending, self._pending_hotkeys = self._pending_hotkeys, []
+        for hotkey_id, hotkey, modifiers, vk, callback in pending:
+            if user32.RegisterHotKey(self.hwnd, hotkey_id, modifiers | MOD_NOREPEAT, vk):
+                self.hotkeys[hotkey_id] = (hotkey, callback)
+            else:
+                # 已被其他程序占用
+                print(f"RegisterHotKey {hotkey} failed: {kernel32.GetLastError()}")
+
     def _run_thread(self):
         try:
             self._create_window()
+            self._register_pending_hotkeys()
             self._message_loop()
         except Exception as e:
             print(f"Error in SubtitleRect thread: {e}")
@@ -360,7 +459,16 @@ class SubtitleRect:
     def _wnd_proc(self, hwnd, msg, wParam, lParam):
         try:
             if msg == WM_APP + 1:
-                self._update_layered_window()
+                with tracer.span('overlay.render'):
+                    self._update_layered_window()
+                return 0
+            elif msg == WM_APP + 2:
+                self._register_pending_hotkeys()
+                return 0
+            elif msg == WM_HOTKEY:
+                hotkey = self.hotkeys.get(wParam)
+                if hotkey:
+                    hotkey[1]()
                 return 0
             elif msg == WM_NCHITTEST:
                 return self._handle_nchittest(lParam)
@@ -410,59 +518,13 @@ class SubtitleRect:
     def _wrap_text(self, hdc, text, max_width):
         if not text:
             return []
-        
-        import re
-        
+
         # 只调用两次GDI：分别计算半角和全角字符宽度
         half_size = SIZE()
         full_size = SIZE()
         gdi32.GetTextExtentPoint32W(hdc, "a", 1, ctypes.byref(half_size))
         gdi32.GetTextExtentPoint32W(hdc, "中", 1, ctypes.byref(full_size))
-        half_width = half_size.cx
-        full_width = full_size.cx
-        
-        def calc_text_width(s):
-            """根据字符类型计算文本宽度"""
-            width = 0
-            for char in s:
-                if ord(char) < 128:  # 半角字符 (ASCII)
-                    width += half_width
-                else:  # 全角字符
-                    width += full_width
-            return width
-
-        tokens = re.findall(r'[\u4e00-\u9fff]|[a-zA-Z0-9]+|[^\u4e00-\u9fff\s\w]|\s', text)
-
-        wrapped_lines = []
-        current_line = ""
-        current_width = 0
-        
-        for token in tokens:
-            token_width = calc_text_width(token)
-            
-            # 检查添加这个token后是否超过最大宽度
-            # 注意：如果不是第一个token，需要加一个半角空格宽度
-            new_width = current_width + token_width
-            
-            if new_width + self.padding_x * 2 <= max_width:
-                # 可以添加到当前行
-                if current_line:
-                    current_line += token
-                else:
-                    current_line = token
-                current_width = new_width
-            else:
-                # 当前行已满，保存并开始新行
-                if current_line:
-                    wrapped_lines.append(current_line)
-                current_line = token
-                current_width = token_width
-        
-        # 添加最后一行
-        if current_line:
-            wrapped_lines.append(current_line)
-        wrapped_lines.reverse()
-        return wrapped_lines
+        return wrap_text(text, max_width, half_size.cx, full_size.cx, self.padding_x)
 
     def _update_layered_window(self):
         start=time.time()
@@ -477,9 +539,7 @@ class SubtitleRect:
 
         # Create Font
         font_height = -int(self.font_size * gdi32.GetDeviceCaps(hdc, 90) / 72)
-        hfont = gdi32.CreateFontW(font_height, 0, 0, 0, FW_BOLD, 0, 0, 0,
-                                  ANSI_CHARSET, OUT_DEFAULT_PRECIS, CLIP_DEFAULT_PRECIS,
-                                  NONANTIALIASED_QUALITY, DEFAULT_PITCH | FF_DONTCARE, "Cambria")
+        hfont = create_subtitle_font(font_height)
         # Create button font
         button_font_height = -int(self.button_font_size * gdi32.GetDeviceCaps(hdc, 90) / 72)
         button_hfont = gdi32.CreateFontW(button_font_height, 0, 0, 0, FW_BOLD, 0, 0, 0,
@@ -487,6 +547,7 @@ class SubtitleRect:
                                          NONANTIALIASED_QUALITY, DEFAULT_PITCH | FF_DONTCARE, "Cambria")
 
         old_font = gdi32.SelectObject(mem_dc, hfont)
+        atlas = self._get_glyph_atlas(font_height) if self.rasterizer == 'atlas' else None
 
         # Get screen width for text wrapping
         screen_width = user32.GetSystemMetrics(0)  # SM_CXSCREEN
@@ -516,10 +577,15 @@ class SubtitleRect:
 
         max_text=''
         for text in wrapped_texts:
-            size = SIZE()
-            gdi32.GetTextExtentPoint32W(mem_dc, text, len(text), ctypes.byref(size))
-            w = size.cx + self.padding_x * 2
-            h = size.cy + self.padding_y * 2
+            width = atlas.measure(text) if atlas else None
+            if width is not None:
+                w = width + self.padding_x * 2
+                h = atlas.height + self.padding_y * 2
+            else:
+                size = SIZE()
+                gdi32.GetTextExtentPoint32W(mem_dc, text, len(text), ctypes.byref(size))
+                w = size.cx + self.padding_x * 2
+                h = size.cy + self.padding_y * 2
             lines_info.append({'text': text, 'w': w, 'h': h})
             total_w = max(total_w, w)
             total_h += h
@@ -596,12 +662,20 @@ class SubtitleRect:
         n_pixels = total_w * total_h
         p_pixels = ctypes.cast(bits, ctypes.POINTER(ctypes.c_uint32 * n_pixels))
         pixel_arr = p_pixels.contents
+        # 将ctypes数组转换为numpy数组（零拷贝）
+        pixel_np = np.ctypeslib.as_array(pixel_arr)
 
         bg_color = 0x000000
         brush = gdi32.CreateSolidBrush(bg_color)
 
+        # 图集直接写出带 alpha 的像素，画不了的行再交给 GDI，之后只对 GDI 画的行修补 alpha
+        gdi_items = []
+        image = pixel_np.reshape(total_h, total_w)
         for item in new_text_items:
             r = item['rect']
+            if atlas and atlas.draw_line(image, (r.left, r.top, r.right, r.bottom), item['text']):
+                continue
+            gdi_items.append(item)
             user32.FillRect(mem_dc, ctypes.byref(r), brush)
             user32.DrawTextW(mem_dc, item['text'], -1, ctypes.byref(r), DT_CENTER | DT_VCENTER | DT_SINGLELINE)
 
@@ -615,39 +689,12 @@ class SubtitleRect:
         gdi32.DeleteObject(brush)
         gdi32.DeleteObject(button_hfont)
         # Fix Alpha Channel - 使用NumPy向量化优化
-        width = total_w
-        # 将ctypes数组转换为numpy数组（零拷贝）
-        pixel_np = np.ctypeslib.as_array(pixel_arr)
-        draw_items=[]
-        draw_items.extend(new_text_items)
-        draw_items.extend(btn_items)
-
-        for item in draw_items:
-            r = item['rect']
-            # 提取矩形区域
-            top, bottom = r.top, r.bottom
-            left, right = r.left, r.right
-
-            # 计算切片索引
-            row_starts = np.arange(top, bottom) * width
-            # 创建二维索引网格
-            indices = row_starts[:, np.newaxis] + np.arange(left, right)
-
-            # 获取当前区域的像素值
-            vals = pixel_np[indices.ravel()]
-
-            # 向量化条件处理
-            is_white = (vals & 0x00FFFFFF) == 0x00FFFFFF
-
-            # 预计算alpha值
-            alpha_val = 0xAA000000 if item['rect_type'] == 'button' else 0x80000000
-
-            # 向量化赋值
-            pixel_np[indices.ravel()] = np.where(
-                is_white,
-                0xFFFFFFFF,
-                vals | alpha_val
-            )
+        # GDI 可能批量延迟绘制，读写 DIB 前先刷新
+        gdi32.GdiFlush()
+        alpha_rects = [(item['rect'].left, item['rect'].top, item['rect'].right, item['rect'].bottom,
+                        BUTTON_ALPHA if item['rect_type'] == 'button' else TEXT_ALPHA)
+                       for item in gdi_items + btn_items]
+        apply_alpha(pixel_np, total_w, alpha_rects)
         with self.lock:
             self.text_items = new_text_items
             self.button_items = btn_items
@@ -680,6 +727,16 @@ class SubtitleRect:
         print(f'_update_layered_window end : {self.pos_x}, {self.pos_y} {win_x}, {win_y} elapse {time.time()-start}')
 
 
+    def _get_glyph_atlas(self, font_height):
+        """字体（字号或 DPI）变化时重建图集"""
+        if self._glyph_atlas is None or self._glyph_renderer.font_height != font_height:
+            if self._glyph_renderer:
+                self._glyph_renderer.close()
+            self._glyph_renderer = GdiGlyphRenderer(font_height)
+            self._glyph_atlas = GlyphAtlas(self._glyph_renderer.render, self._glyph_renderer.height,
+                                           self._glyph_renderer.max_advance)
+        return self._glyph_atlas
+
     def _in_button(self,x,y):
         for item in self.button_items:
             rect = item['rect']